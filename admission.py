@@ -0,0 +1,232 @@
+"""Admission control: bounded concurrency and queue wait, fast 503s under overload."""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+import metrics
+from config import Config
+from metrics import REGISTRY, Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+RETRY_AFTER_HEADER = "Retry-After"
+DEGRADED_HEADER = "X-Degraded"
+
+REJECTED = REGISTRY.register(
+    Counter(
+        "recommender_admission_rejected_total",
+        "Requests refused by admission control by reason",
+        ("reason",),
+    )
+)
+DEGRADED = REGISTRY.register(
+    Counter(
+        "recommender_degraded_responses_total",
+        "Refused or unencodable requests answered with degraded results by source",
+        ("source",),
+    )
+)
+
+# Live controllers (the Flask and ASGI apps each create one per process)
+_controllers = weakref.WeakSet()
+
+
+class Overloaded(Exception):
+    """Raised when a request is not admitted; retry_after is in whole seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Server overloaded ({reason}); retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Admission:
+    """Limits and bookkeeping shared by the thread and asyncio controllers"""
+
+    def __init__(self, max_concurrency=None, max_queue=None, max_wait=None):
+        self.max_concurrency = (
+            Config.ADMISSION_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        )
+        self.max_queue = Config.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self.max_wait = Config.ADMISSION_MAX_WAIT if max_wait is None else max_wait
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        # EWMA of admitted request time, for Retry-After
+        self._service_time = 0.1
+        _controllers.add(self)
+
+    @property
+    def enabled(self):
+        return self.max_concurrency > 0
+
+    def retry_after(self):
+        """Seconds for the current queue to drain, at least 1"""
+        drain = (self.waiting + 1) * self._service_time / max(self.max_concurrency, 1)
+        return max(1, math.ceil(drain))
+
+    def _reject(self, reason):
+        self.rejected += 1
+        REJECTED.inc(reason)
+        # Counted in REJECTED; a warning per refusal would flood logs under overload
+        logger.debug(
+            f"Admission refused ({reason}): {self.active} active, {self.waiting} queued"
+        )
+        return Overloaded(reason, self.retry_after())
+
+    def _admitted(self, queued_since):
+        metrics.record("queue", time.perf_counter() - queued_since)
+
+    def _finished(self, seconds):
+        self._service_time += 0.2 * (seconds - self._service_time)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+class AdmissionController(_Admission):
+    """
+    Thread-based admission for threaded servers: at most max_concurrency
+    requests run, up to max_queue wait (FIFO wake-ups are not guaranteed)
+    for at most max_wait seconds, and the rest raise Overloaded at once.
+    max_concurrency 0 disables the limit.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def admit(self):
+        queued_since = time.perf_counter()
+        self._enter(queued_since)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._finished(time.perf_counter() - started)
+                self._cond.notify()
+
+    def _enter(self, queued_since):
+        with self._cond:
+            if not self.enabled or (self.active < self.max_concurrency and not self.waiting):
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise self._reject("queue_full")
+            deadline = queued_since + self.max_wait
+            self.waiting += 1
+            try:
+                while self.active >= self.max_concurrency:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise self._reject("timeout")
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+        self._admitted(queued_since)
+
+
+class AsyncAdmissionController(_Admission):
+    """Admission for the ASGI app; same limits, waiters queue on a semaphore"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._semaphore = asyncio.Semaphore(max(self.max_concurrency, 1))
+
+    @asynccontextmanager
+    async def admit(self):
+        queued_since = time.perf_counter()
+        if self.enabled:
+            await self._enter(queued_since)
+        self.active += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._finished(time.perf_counter() - started)
+            if self.enabled:
+                self._semaphore.release()
+
+    async def _enter(self, queued_since):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return
+        if self.waiting >= self.max_queue:
+            raise self._reject("queue_full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            raise self._reject("timeout") from None
+        finally:
+            self.waiting -= 1
+        self._admitted(queued_since)
+
+
+class ResultCache:
+    """Small LRU of recent result sets by request key, for degraded answers"""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = Config.ADMISSION_RESULT_CACHE if maxsize is None else maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            results = self._entries.get(key)
+            if results is not None:
+                self._entries.move_to_end(key)
+        return results
+
+    def put(self, key, results):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def shrink(self, fraction):
+        """Evict the least recently used fraction of entries; returns the count"""
+        with self._lock:
+            count = int(len(self._entries) * fraction)
+            for _ in range(count):
+                self._entries.popitem(last=False)
+        return count
+
+
+REGISTRY.register(
+    Gauge(
+        "recommender_admission_queue_depth",
+        "Requests waiting for an admission slot",
+        lambda: sum(c.waiting for c in list(_controllers)),
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "recommender_admission_active",
+        "Admitted requests currently running",
+        lambda: sum(c.active for c in list(_controllers)),
+    )
+)
@@ -0,0 +1,174 @@
+"""Versioned embedding artifacts: one directory per version plus a manifest."""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from blocked_scoring import write_unit_embeddings
+from config import Config
+from projection import PCAProjection
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+EMBEDDINGS = "embeddings.npy"
+MOVIES = "movies.pkl"
+PCA_ARRAYS = ("pca_mean", "pca_components", "pca_scale")
+LEGACY_PCA = "pca.pkl"  # Pickled sklearn PCA in artifacts written before PCA_ARRAYS
+
+
+def artifact_root(root=None):
+    """Resolve the artifact root (Config.ARTIFACT_DIR, relative to this repo)."""
+    root = root or Config.ARTIFACT_DIR
+    if os.path.isabs(root):
+        return root
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), root)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _atomic_write_text(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_artifact(embeddings, movies_data, pca=None, root=None, version=None):
+    """
+    Write a new artifact version and point CURRENT at it.
+
+    The directory is complete (files + manifest with per-file sha256, row
+    count and dims) before CURRENT is atomically replaced, so readers never
+    see a half-written version. Returns the version directory.
+    """
+    root = artifact_root(root)
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    directory = os.path.join(root, version)
+    os.makedirs(directory, exist_ok=False)
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    np.save(os.path.join(directory, EMBEDDINGS), embeddings)
+    write_unit_embeddings(embeddings, os.path.join(directory, Config.EMBEDDINGS_MMAP_FILE))
+    movies_data.to_pickle(os.path.join(directory, MOVIES))
+    pca = PCAProjection.from_sklearn(pca)
+    if pca is not None:
+        for name, array in pca.arrays().items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    files = {
+        name: file_sha256(os.path.join(directory, name))
+        for name in sorted(os.listdir(directory))
+    }
+    manifest = {
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "rows": int(embeddings.shape[0]),
+        "dims": int(embeddings.shape[1]),
+        "files": files,
+        "checksum": hashlib.sha256(
+            "".join(f"{k}:{v}\n" for k, v in files.items()).encode()
+        ).hexdigest(),
+    }
+    _atomic_write_text(
+        os.path.join(directory, MANIFEST), json.dumps(manifest, indent=2)
+    )
+    logger.info(f"Wrote artifact version {version} to {directory}")
+    publish_version(version, root)
+    return directory
+
+
+def publish_version(version, root=None):
+    """
+    Point CURRENT at an existing version (ValueError if it has no manifest),
+    first writing its unit-normalized .npy for blocked scoring if missing.
+    Every serving process watching CURRENT then reloads it.
+    """
+    root = artifact_root(root)
+    directory = os.path.join(root, version)
+    if not os.path.isfile(os.path.join(directory, MANIFEST)):
+        raise ValueError(f"Unknown artifact version {version!r}")
+    unit_path = os.path.join(directory, Config.EMBEDDINGS_MMAP_FILE)
+    if not os.path.exists(unit_path):
+        # Versions written before the unit file existed; streamed from the mmap
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS), mmap_mode="r")
+        write_unit_embeddings(embeddings, unit_path)
+    _atomic_write_text(os.path.join(root, CURRENT), version)
+
+
+def current_version(root=None):
+    """Version named by CURRENT, or None when no artifact has been published."""
+    path = os.path.join(artifact_root(root), CURRENT)
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_dir(version, root=None):
+    return os.path.join(artifact_root(root), version)
+
+
+def read_manifest(directory, verify=True):
+    """Load a manifest, checking file hashes when verify is set (ValueError on mismatch)."""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if verify:
+        for name, expected in manifest["files"].items():
+            actual = file_sha256(os.path.join(directory, name))
+            if actual != expected:
+                raise ValueError(
+                    f"Artifact {manifest['version']}: checksum mismatch for {name}"
+                )
+    return manifest
+
+
+def read_artifact(directory, verify=True, mmap=False):
+    """
+    Load an artifact directory into {"manifest", "embeddings", "movies_data", "pca"}.
+    mmap memory-maps the embedding matrix read-only instead of loading it.
+    """
+    manifest = read_manifest(directory, verify)
+    embeddings = np.load(os.path.join(directory, EMBEDDINGS), mmap_mode="r" if mmap else None)
+    movies_data = pd.read_pickle(os.path.join(directory, MOVIES))
+    if embeddings.shape != (manifest["rows"], manifest["dims"]):
+        raise ValueError(
+            f"Artifact {manifest['version']}: embeddings {embeddings.shape} do not "
+            f"match manifest ({manifest['rows']}, {manifest['dims']})"
+        )
+    if len(movies_data) != manifest["rows"]:
+        raise ValueError(
+            f"Artifact {manifest['version']}: {len(movies_data)} movies for "
+            f"{manifest['rows']} embedding rows"
+        )
+    pca = PCAProjection.from_arrays(
+        {
+            name: np.load(os.path.join(directory, f"{name}.npy"))
+            for name in PCA_ARRAYS
+            if os.path.exists(os.path.join(directory, f"{name}.npy"))
+        }
+    )
+    legacy_path = os.path.join(directory, LEGACY_PCA)
+    if pca is None and os.path.exists(legacy_path):
+        with open(legacy_path, "rb") as f:
+            pca = PCAProjection.from_sklearn(pickle.load(f))
+    return {
+        "manifest": manifest,
+        "embeddings": embeddings,
+        "movies_data": movies_data,
+        "pca": pca,
+    }
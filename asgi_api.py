@@ -0,0 +1,518 @@
+"""
+ASGI entry point exposing the same routes as flask_api.
+
+Run with: uvicorn asgi_api:app --host 0.0.0.0 --port 5000
+
+Embedding calls go through a shared httpx.AsyncClient, so requests waiting
+on the HF Space do not hold a worker; CPU-bound scoring and engine builds
+run in a thread pool so they never block the event loop.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+
+import metrics
+import profiling
+import tracing
+from config import Config
+from admission import (
+    DEGRADED_HEADER,
+    RETRY_AFTER_HEADER,
+    AsyncAdmissionController,
+    Overloaded,
+)
+from embedding_client import EmbeddingUnavailable
+from results import encode_results
+from singleflight import AsyncSingleFlight, flight_key
+from serving import (
+    admin_token_valid,
+    capture_memory_diff,
+    degraded_results,
+    engine_manager,
+    normalize,
+    recent_results,
+    request_filters,
+    response_format,
+    start_warmup,
+    warmup,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Scoring and engine builds; NumPy releases the GIL in the matmuls
+_scoring_pool = ThreadPoolExecutor(
+    max_workers=Config.ASGI_SCORING_THREADS, thread_name_prefix="scoring"
+)
+# Only one coroutine waits on the first engine build; the rest await this lock
+_engine_init_lock = asyncio.Lock()
+query_flights = AsyncSingleFlight()
+# Bounds concurrent /api/recommendations/* work (see admission.py)
+admission = AsyncAdmissionController()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.http = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=Config.ASGI_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.ASGI_MAX_CONNECTIONS,
+        )
+    )
+    start_warmup()
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        _scoring_pool.shutdown(wait=False)
+
+
+app = FastAPI(title="Movie Recommendation API", lifespan=lifespan)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_headers=["Content-Type", "Authorization"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+)
+
+
+@app.middleware("http")
+async def _request_timing(request: Request, call_next):
+    started = time.perf_counter()
+    timings = metrics.start_request()
+    forced = request.headers.get(profiling.PROFILE_HEADER) == "1"
+    # Samples every thread: the event loop and the scoring pool
+    profiler = (
+        profiling.start_profile()
+        if profiling.should_profile(forced and _admin_authorized(request))
+        else None
+    )
+    trace = tracing.start_trace(
+        "request",
+        trace_id=request.headers.get(tracing.TRACE_HEADER),
+        path=request.url.path,
+        method=request.method,
+    )
+    try:
+        response = await call_next(request)
+    except Exception:
+        if profiler is not None:
+            profiler.stop()
+        tracing.finish_trace(trace, status=500)
+        raise
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    label = route.path if route is not None else "unmatched"
+    if profiler is not None:
+        path = await asyncio.to_thread(profiling.finish_profile, profiler, label)
+        if path:
+            response.headers["X-Profile-File"] = os.path.basename(path)
+    if tracing.finish_trace(trace, status=response.status_code):
+        response.headers[tracing.TRACE_HEADER] = trace.trace.trace_id
+    if Config.METRICS_ENABLED:
+        metrics.finish_request(label, response.status_code, elapsed)
+        timing = metrics.server_timing(timings)
+        total = f"total;dur={elapsed * 1000:.2f}"
+        response.headers["Server-Timing"] = f"{timing}, {total}" if timing else total
+    return response
+
+
+async def _in_pool(fn, *args):
+    """Run a blocking call on the scoring pool, in the request's context"""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _scoring_pool, partial(context.run, fn, *args)
+    )
+
+
+async def _ensure_engine():
+    """Build the engine once, off the event loop, however many requests race"""
+    if engine_manager.loaded:
+        return
+    async with _engine_init_lock:
+        if not engine_manager.loaded:
+            await _in_pool(engine_manager.current)
+
+
+async def _json_body(request):
+    try:
+        data = await request.json()
+    except Exception:
+        data = None
+    if not data:
+        # Fallback to form data if sent as form-encoded
+        try:
+            data = dict(await request.form())
+        except Exception:
+            data = {}
+    return data if isinstance(data, dict) else {}
+
+
+def _error(message, status_code, **extra):
+    return JSONResponse({"error": message, **extra}, status_code=status_code)
+
+
+def _overloaded(error):
+    """503 for a request admission control refused, with Retry-After"""
+    return JSONResponse(
+        {"error": str(error), "reason": error.reason},
+        status_code=503,
+        headers={RETRY_AFTER_HEADER: str(error.retry_after)},
+    )
+
+
+def _embedding_unavailable(error):
+    """503 for a query the embedding backend could not encode, with Retry-After"""
+    return JSONResponse(
+        {"error": str(error), "reason": "embedding_unavailable"},
+        status_code=503,
+        headers={RETRY_AFTER_HEADER: str(max(1, int(Config.BREAKER_RESET_TIMEOUT)))},
+    )
+
+
+def _response_format(request, requested=None):
+    return response_format(requested, request.headers.get("Accept", ""))
+
+
+def _admin_authorized(request):
+    token = request.headers.get("X-Admin-Token", "")
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        token = token or auth[len("Bearer ") :]
+    return admin_token_valid(token)
+
+
+@app.get("/")
+async def index():
+    """Root endpoint - API status"""
+    return {
+        "service": "Movie Recommendation API",
+        "status": "running",
+        "version": "1.0",
+        "endpoints": {
+            "health": "/api/health",
+            "ready": "/api/ready",
+            "recommendations": "/api/recommendations/query",
+            "similar": "/api/recommendations/similar",
+            "search": "/api/search",
+            "facets": "/api/facets",
+            "autocomplete": "/api/autocomplete",
+        },
+    }
+
+
+@app.get("/api/health")
+async def health_check():
+    """Health check endpoint"""
+    return {"status": "healthy", "imdb_available": Config.validate_config()}
+
+
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness: 200 once warm-up has loaded and warmed the engine, else 503"""
+    warmup.start()
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+async def _recommend(query, top_k, filters, mode, http):
+    """Encode on the event loop (non-blocking), then score in the pool"""
+    await _ensure_engine()
+    with engine_manager.acquire() as engine:
+        query_embedding = None
+        if (mode or Config.RETRIEVAL_MODE) in ("dense", "hybrid"):
+            try:
+                encoded = await engine.bert_processor.encode_async([query], http)
+                query_embedding = encoded[0]
+            except Exception as e:
+                if not Config.SPARSE_FALLBACK or engine.sparse_index is None:
+                    raise
+                logger.warning(f"Dense scoring unavailable ({e}); using BM25 only")
+                mode = "sparse"
+        return await _in_pool(
+            partial(
+                engine.recommend_by_query,
+                query,
+                top_k,
+                filters,
+                mode,
+                query_embedding,
+                columnar=True,
+            )
+        )
+
+
+@app.api_route("/api/recommendations/query", methods=["GET", "POST"])
+async def get_recommendations_by_query(request: Request):
+    """Get recommendations based on natural language query"""
+    try:
+        parse_started = time.perf_counter()
+        if request.method == "GET":
+            data = None
+            source = request.query_params
+        else:
+            data = source = await _json_body(request)
+        query = (source.get("query", "") or "").strip()
+        mode = source.get("mode")
+        requested_format = source.get("format")
+
+        try:
+            top_k = int(source.get("top_k", 8))
+        except Exception:
+            return _error("top_k must be an integer", 400)
+
+        try:
+            filters = request_filters(data, request.query_params)
+            fmt = _response_format(request, requested_format)
+        except ValueError as e:
+            return _error(str(e), 400)
+
+        logger.info(f"Query: {query}, Top K: {top_k}")
+        if not query:
+            return _error("Query is required", 400)
+        if top_k <= 0:
+            return _error("top_k must be positive", 400)
+        metrics.record("parse", time.perf_counter() - parse_started)
+
+        compute = partial(
+            _recommend, query, top_k, filters, mode, request.app.state.http
+        )
+        key = flight_key(query, top_k, filters, mode or Config.RETRIEVAL_MODE)
+        degraded = None
+        try:
+            async with admission.admit():
+                if Config.SINGLE_FLIGHT:
+                    # Identical concurrent queries share one encode and scan
+                    recommendations = await query_flights.do(key, compute)
+                else:
+                    recommendations = await compute()
+            recent_results.put(key, recommendations)
+        except Overloaded as e:
+            degraded = degraded_results(key, top_k, filters)
+            if degraded is None:
+                return _overloaded(e)
+            degraded, recommendations = degraded
+        except EmbeddingUnavailable as e:
+            # Breaker open, deadline spent or every replica down, with no
+            # BM25 fallback: answer like a refused request
+            degraded = degraded_results(key, top_k, filters)
+            if degraded is None:
+                return _embedding_unavailable(e)
+            degraded, recommendations = degraded
+        except ValueError as e:
+            # Unknown genre names in filters or retrieval mode
+            return _error(str(e), 400)
+
+        logger.info(f"Found {len(recommendations)} recommendations")
+        with metrics.stage("serialization"):
+            body, content_type = encode_results(recommendations, "recommendations", fmt)
+        headers = {DEGRADED_HEADER: degraded} if degraded else None
+        return Response(content=body, media_type=content_type, headers=headers)
+
+    except Exception as e:
+        logger.error(f"Error in query recommendations: {e}", exc_info=True)
+        return _error(str(e), 500, type=type(e).__name__)
+
+
+@app.post("/api/recommendations/similar")
+async def get_similar_movies(request: Request):
+    """Get similar movies based on movie ID"""
+    try:
+        data = await _json_body(request)
+        movie_id = data.get("movie_id")
+        top_k = data.get("top_k", 10)
+        if not movie_id:
+            return _error("Movie ID is required", 400)
+
+        key = ("similar", movie_id, top_k)
+        degraded = None
+        try:
+            async with admission.admit():
+                await _ensure_engine()
+                with engine_manager.acquire() as engine:
+                    recommendations = normalize(
+                        await _in_pool(engine.recommend_similar_movies, movie_id, top_k)
+                    )
+            recent_results.put(key, recommendations)
+        except Overloaded as e:
+            degraded = degraded_results(key)
+            if degraded is None:
+                return _overloaded(e)
+            degraded, recommendations = degraded
+        return JSONResponse(
+            {
+                "success": True,
+                "recommendations": recommendations,
+                "count": len(recommendations),
+            },
+            headers={DEGRADED_HEADER: degraded} if degraded else None,
+        )
+
+    except Exception as e:
+        logger.exception(f"Error in similar movies: {e}")
+        return _error(str(e), 500, type=type(e).__name__)
+
+
+@app.post("/api/search")
+async def search_movies(request: Request):
+    """Search movies by title or keyword"""
+    try:
+        data = await _json_body(request)
+        search_term = (data.get("search_term", "") or "").strip()
+        top_k = data.get("top_k", 20)
+        if not search_term:
+            return _error("Search term is required", 400)
+
+        try:
+            filters = request_filters(data)
+            fmt = _response_format(request, data.get("format"))
+            await _ensure_engine()
+            with engine_manager.acquire() as engine:
+                results = await _in_pool(
+                    partial(
+                        engine.search_movies,
+                        search_term,
+                        top_k,
+                        filters,
+                        data.get("mode"),
+                        columnar=True,
+                    )
+                )
+        except ValueError as e:
+            return _error(str(e), 400)
+
+        with metrics.stage("serialization"):
+            body, content_type = encode_results(results, "movies", fmt)
+        return Response(content=body, media_type=content_type)
+
+    except Exception as e:
+        logger.error(f"Error in movie search: {e}")
+        return _error(str(e), 500)
+
+
+@app.get("/api/autocomplete")
+async def autocomplete(request: Request):
+    """Title suggestions for a typed prefix, most-rated first"""
+    try:
+        prefix = (request.query_params.get("q", "") or "").strip()
+        try:
+            limit = int(request.query_params.get("limit", 8))
+        except ValueError:
+            return _error("limit must be an integer", 400)
+        if not prefix:
+            return {"success": True, "suggestions": [], "count": 0}
+
+        await _ensure_engine()
+        with engine_manager.acquire() as engine:
+            # Microsecond index lookup; cheaper inline than a pool hop
+            suggestions = engine.autocomplete(prefix, max(1, min(limit, 50)))
+        return {
+            "success": True,
+            "suggestions": suggestions,
+            "count": len(suggestions),
+        }
+
+    except Exception as e:
+        logger.error(f"Error in autocomplete: {e}")
+        return _error(str(e), 500)
+
+
+@app.api_route("/api/facets", methods=["GET", "POST"])
+async def get_facets(request: Request):
+    """Genre and decade counts for the movies matching the given filters"""
+    try:
+        data = await _json_body(request) if request.method == "POST" else None
+        try:
+            filters = request_filters(data, request.query_params)
+            await _ensure_engine()
+            with engine_manager.acquire() as engine:
+                facets = await _in_pool(engine.facet_counts, filters)
+        except ValueError as e:
+            return _error(str(e), 400)
+        return {"success": True, "facets": facets}
+
+    except Exception as e:
+        logger.error(f"Error computing facets: {e}")
+        return _error(str(e), 500)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition of latency histograms and counters"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.post("/api/admin/reload")
+async def reload_artifacts(request: Request):
+    """
+    Publish an artifact version (default: reload CURRENT) and swap it in.
+    Other workers follow the CURRENT change through their artifact watcher.
+    """
+    if not _admin_authorized(request):
+        return _error("Forbidden", 403)
+    data = await _json_body(request)
+    wait = bool(data.get("wait"))
+    try:
+        if data.get("version"):
+            started = await _in_pool(engine_manager.publish, data["version"], wait)
+        else:
+            started = await _in_pool(engine_manager.reload, None, wait)
+    except ValueError as e:
+        return _error(str(e), 400)
+    status = engine_manager.status()
+    if not started:
+        return _error("Reload already in progress", 409, **status)
+    return JSONResponse({"success": True, **status}, status_code=202)
+
+
+@app.post("/api/admin/memory-diff")
+async def memory_diff(request: Request):
+    """tracemalloc allocation diff around one query or engine load"""
+    if not _admin_authorized(request):
+        return _error("Forbidden", 403)
+    data = await _json_body(request)
+    await _ensure_engine()
+    try:
+        return await _in_pool(capture_memory_diff, data)
+    except ValueError as e:
+        return _error(str(e), 400)
+
+
+@app.get("/api/admin/artifacts")
+async def artifact_status(request: Request):
+    """Live/retired artifact versions and in-flight request counts"""
+    if not _admin_authorized(request):
+        return _error("Forbidden", 403)
+    return engine_manager.status()
+
+
+@app.post("/api/imdb/search")
+async def search_imdb_movies():
+    return _error("IMDB features disabled", 400)
+
+
+@app.get("/api/imdb/trending")
+async def get_trending_movies():
+    return _error("IMDB features disabled", 400)
+
+
+@app.exception_handler(404)
+async def not_found(request, exc):
+    return _error("Endpoint not found", 404)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=5000)
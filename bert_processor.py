@@ -4,19 +4,37 @@
 import logging
 import os
 import pickle
-from typing import List
-import psutil
+from typing import TYPE_CHECKING, List
 import gc
+from concurrent.futures import ThreadPoolExecutor
 
 from data_prep import normalize_title
+from catalog_index import CatalogIndex
+from title_index import TitleIndex
+from fuzzy_index import FuzzyTitleIndex
+from bm25_index import BM25Index
+from blocked_scoring import open_unit_embeddings, write_unit_embeddings
+from artifacts import EMBEDDINGS, MOVIES, read_artifact, read_manifest, write_artifact
+from projection import PCAProjection
+from results import ResultStore
+from movie_store import MovieStore
+from embedding_cache import EmbeddingCache
+from memory_governor import LoadingPlan, release_memory
+from tracing import traced
+from metrics import stage
+from embedding_client import Deadline, endpoint, space_pool
+from encoders import build_encoder
 
 import numpy as np
 import pandas as pd
-from sentence_transformers import SentenceTransformer
-from sklearn.decomposition import PCA
 
 from config import Config
 
+# sentence_transformers (torch) and sklearn are only needed by the offline
+# embedding build, so they are imported where used to keep serving imports fast
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,151 +46,154 @@ class MovieBERTProcessor:
         self.movie_embeddings = None
         self.movies_data = None
         self.use_external = True
-        self.pca = None  # PCA transformer for 32D query encoding
-
-    def _get_memory_mb(self):
-        """Get current process memory usage in MB"""
-        try:
-            process = psutil.Process()
-            return process.memory_info().rss / (1024 * 1024)
-        except Exception:
-            return 0
-
-    def _can_safely_load_model(self, max_total_mb=400):
-        """
-        Check if we can safely load BERT model without exceeding limits.
-        With TinyBERT (~60MB), threshold 400MB keeps us below 512MB cap.
-
-        Args:
-            max_total_mb: Maximum total memory allowed (default 450MB for safety)
-
-        Returns:
-            True if current + model_overhead <= max_total_mb
-        """
-        # If keyword-only mode is enabled, never load BERT
-        if Config.KEYWORD_ONLY_MODE:
-            logger.info("KEYWORD_ONLY_MODE enabled - skipping BERT model loading")
-            return False
-
-        current_mb = self._get_memory_mb()
-        # TinyBERT overhead: 2MB if already loaded, ~60MB if loading fresh
-        model_overhead = 2 if self._model is not None else 60
-        projected_mb = current_mb + model_overhead
-        safe = projected_mb <= max_total_mb
-
-        logger.info(
-            f"Memory check: {current_mb:.1f}MB current, "
-            f"{projected_mb:.1f}MB projected (overhead: {model_overhead}MB), "
-            f"{'SAFE' if safe else 'UNSAFE'} (limit: {max_total_mb}MB)"
-        )
-
-        return safe
+        self.pca = None  # PCAProjection for 32D query encoding
+        self.catalog_index = None  # Genre/year/rating filter bitmaps
+        self.title_index = None  # Trigram/prefix title search index
+        self.fuzzy_index = None  # Typo-tolerant title index
+        self.sparse_index = None  # BM25 keyword index (local retrieval path)
+        self.result_store = None  # Response fields as arrays
+        self._embeddings_file = None
+        self._embeddings_memmap = None  # Unit rows for blocked scoring
+        self._embeddings_shape = None
+        self.artifact_version = None  # Set when loaded from a versioned artifact
+        self.plan = LoadingPlan()  # Replaced by the memory governor's plan on load
+        self.query_cache = EmbeddingCache(self.plan.query_cache_size)
+        self._session = None  # Keep-alive connection pool to the embedding endpoint
+        self._session_pid = None
+        self._encoder = None  # Built on first encode, once the PCA is loaded
+        self._encoder_pca = None
 
     @property
-    def model(self) -> SentenceTransformer:
+    def model(self) -> "SentenceTransformer":
         """Local model disabled when using external embeddings."""
         raise RuntimeError("Local BERT model is disabled; using external embeddings")
 
-    def encode(self, texts: List[str], force_semantic=False):
+    @property
+    def encoder(self):
+        """Query encoder backend(s) from Config.ENCODER_BACKENDS"""
+        # A local backend holds (or has fused in) the PCA it was built with
+        if self._encoder is None or self._encoder_pca is not self.pca:
+            self._encoder = build_encoder(self)
+            self._encoder_pca = self.pca
+        return self._encoder
+
+    @traced("encode")
+    def encode(self, texts: List[str], force_semantic=False, deadline=None):
         """
-        Encode texts using external HF Space embeddings. No local or keyword fallback.
-        Raises if HF_SPACE_ENDPOINT is missing or if external embedding fails.
+        Encode texts with the configured backends (remote HF Space by default,
+        or the in-process ONNX model). No keyword fallback: raises if every
+        backend fails. deadline (embedding_client.Deadline) bounds remote calls
+        and defaults to Config.EMBED_DEADLINE.
         """
         if not isinstance(texts, list):
             texts = [texts]
 
-        if not Config.HF_SPACE_ENDPOINT:
-            raise RuntimeError(
-                "HF_SPACE_ENDPOINT is not set; external embeddings unavailable"
-            )
+        # Single query texts are served from the LRU when seen recently
+        cacheable = len(texts) == 1
+        if cacheable:
+            with stage("cache_lookup"):
+                cached = self.query_cache.get(texts[0])
+            if cached is not None:
+                return cached[None, :]
+
+        embeddings = self.encoder.encode(texts, deadline)
+        if cacheable:
+            self._cache_query(texts[0], embeddings)
+        return embeddings
+
+    def _cache_query(self, text, embeddings):
+        vector = np.array(embeddings[0], dtype=np.float32)
+        vector.flags.writeable = False  # Shared by every later hit
+        self.query_cache.put(text, vector)
+
+    def _http_session(self):
+        """Per-process requests.Session so encodes reuse warm connections"""
+        import requests
 
-        logger.info(
-            "External encode start",
-            extra={
-                "endpoint": Config.HF_SPACE_ENDPOINT,
-                "count": len(texts),
-            },
-        )
-        return self._encode_external(texts)
+        if self._session is None or self._session_pid != os.getpid():
+            # Pools inherited across a fork share sockets with the parent
+            self._session = requests.Session()
+            self._session_pid = os.getpid()
+        return self._session
 
-    def _encode_external(self, texts: List[str]):
+    def _encode_external(self, texts: List[str], deadline=None):
         """
         Encode texts using external API.
         Supports both:
         1. HF Inference API (Config.HF_INFERENCE_ENDPOINT)
-        2. Custom HF Space endpoint (Config.HF_SPACE_ENDPOINT)
+        2. Custom HF Space endpoint (Config.HF_SPACE_ENDPOINT), load-balanced
+           when it lists several replicas
+        Retries share one Deadline (Config.EMBED_DEADLINE); while no replica
+        is healthy this raises EmbeddingUnavailable at once, so callers fall
+        back (BM25) instead of waiting.
         """
-        import requests
-        import time
-
-        # Try HF Space endpoint first if configured
-        endpoint = (
-            getattr(Config, "HF_SPACE_ENDPOINT", None) or Config.HF_INFERENCE_ENDPOINT
-        )
+        session = self._http_session()
+        deadline = deadline or Deadline(Config.EMBED_DEADLINE)
         headers = {}
         if Config.HF_API_TOKEN:
             headers["Authorization"] = f"Bearer {Config.HF_API_TOKEN}"
 
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # For HF Space, use /embed endpoint
-                if hasattr(Config, "HF_SPACE_ENDPOINT") and Config.HF_SPACE_ENDPOINT:
-                    url = f"{endpoint.rstrip('/')}/embed"
-                    payload = {"texts": texts}
-                    response = requests.post(
-                        url, json=payload, headers=headers, timeout=30
-                    )
+        # Try HF Space endpoint first if configured
+        if Config.HF_SPACE_ENDPOINT:
+            space = space_pool(Config.space_endpoints())
+            result = space.post(session, {"texts": texts}, headers, deadline)
+            return self._space_embeddings(result)
+
+        # Standard HF Inference API
+        inference = endpoint(Config.HF_INFERENCE_ENDPOINT)
+        payload = {"inputs": texts, "options": {"wait_for_model": True}}
+        embeddings = inference.post(session, payload, headers, deadline)
+        logger.info("HF Inference API success")
+        return np.array(embeddings)
+
+    def _space_embeddings(self, result):
+        """Embeddings from an HF Space /embed response, PCA-projected if needed"""
+        embeddings = result.get("embeddings", [])
+        embeddings_array = np.array(embeddings, dtype=np.float32)
+
+        # If using PCA-reduced embeddings, transform to same dimensionality
+        if self.pca is not None:
+            with stage("pca"):
+                embeddings_reduced = self.pca.transform(embeddings_array)
+            logger.info(
+                f"HF Space API success: encoded {len(embeddings)} texts, "
+                f"reduced to {embeddings_reduced.shape[1]}D using PCA"
+            )
+            return embeddings_reduced
 
-                    if response.status_code == 200:
-                        result = response.json()
-                        embeddings = result.get("embeddings", [])
-                        embeddings_array = np.array(embeddings, dtype=np.float32)
-
-                        # If using PCA-reduced embeddings, transform to same dimensionality
-                        if self.pca is not None:
-                            embeddings_reduced = self.pca.transform(embeddings_array)
-                            logger.info(
-                                f"HF Space API success: encoded {len(embeddings)} texts, "
-                                f"reduced to {embeddings_reduced.shape[1]}D using PCA"
-                            )
-                            return embeddings_reduced
-
-                        logger.info(
-                            f"HF Space API success: encoded {len(embeddings)} texts"
-                        )
-                        return embeddings_array
-                    else:
-                        logger.warning(
-                            f"HF Space error {response.status_code}, retrying..."
-                        )
-                        time.sleep(2**attempt)
-                        continue
-                else:
-                    # Standard HF Inference API
-                    response = requests.post(
-                        endpoint,
-                        headers=headers,
-                        json={"inputs": texts, "options": {"wait_for_model": True}},
-                        timeout=30,
-                    )
-                    if response.status_code == 200:
-                        embeddings = response.json()
-                        logger.info("HF Inference API success")
-                        return np.array(embeddings)
-                    elif response.status_code == 503:
-                        logger.info("HF API 503 (model loading), retrying")
-                        time.sleep(2**attempt)
-                        continue
-                    else:
-                        logger.warning(f"HF API error {response.status_code}")
-                        break
-            except Exception as e:
-                logger.warning(f"External API error: {e}, retrying...")
-                time.sleep(2**attempt)
-
-        # Fallback: return zeros to trigger keyword-only matching (no local model)
-        raise RuntimeError("External embeddings failed after retries")
+        logger.info(f"HF Space API success: encoded {len(embeddings)} texts")
+        return embeddings_array
+
+    @traced("encode")
+    async def encode_async(self, texts: List[str], client):
+        """
+        Non-blocking encode for the ASGI app with the same backends as
+        encode(); the local backend runs in a worker thread.
+        client is the app's shared httpx.AsyncClient.
+        """
+        if not isinstance(texts, list):
+            texts = [texts]
+        cacheable = len(texts) == 1
+        if cacheable:
+            with stage("cache_lookup"):
+                cached = self.query_cache.get(texts[0])
+            if cached is not None:
+                return cached[None, :]
+        embeddings = await self.encoder.encode_async(texts, client)
+        if cacheable:
+            self._cache_query(texts[0], embeddings)
+        return embeddings
+
+    async def _encode_external_async(self, texts: List[str], client, deadline=None):
+        """_encode_external() through the HF Space replicas for an httpx.AsyncClient"""
+        space = space_pool(Config.space_endpoints())
+        headers = {}
+        if Config.HF_API_TOKEN:
+            headers["Authorization"] = f"Bearer {Config.HF_API_TOKEN}"
+        result = await space.post_async(
+            client, {"texts": texts}, headers, deadline or Deadline(Config.EMBED_DEADLINE)
+        )
+        return self._space_embeddings(result)
 
     def prepare_movie_texts(self, movies_df):
         """Combine movie information into text descriptions"""
@@ -201,16 +222,25 @@ class MovieBERTProcessor:
 
         print(f"Generating embeddings for {len(movie_texts)} movies...")
         batch_size = getattr(Config, "ENCODING_BATCH_SIZE", 32) or 32
-        embeddings = []
+        batches = [
+            movie_texts[i : i + batch_size] for i in range(0, len(movie_texts), batch_size)
+        ]
 
-        for i in range(0, len(movie_texts), batch_size):
-            batch = movie_texts[i : i + batch_size]
+        def encode_batch(batch):
             # Force semantic encoding during generation so we persist real vectors
-            batch_embeddings = self.encode(batch, force_semantic=True)
-            embeddings.append(batch_embeddings)
+            return self.encode(
+                batch, force_semantic=True, deadline=Deadline(Config.EMBED_BULK_DEADLINE)
+            )
 
-            if (i // batch_size + 1) % 10 == 0:
-                print(f"Processed {i + len(batch)}/{len(movie_texts)} movies...")
+        # Batches in flight across the replica pool; results keep input order
+        workers = max(1, len(Config.space_endpoints()) * Config.EMBED_BULK_PER_ENDPOINT)
+        embeddings = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for n, batch_embeddings in enumerate(executor.map(encode_batch, batches), 1):
+                embeddings.append(batch_embeddings)
+                if n % 10 == 0:
+                    done = min(n * batch_size, len(movie_texts))
+                    print(f"Processed {done}/{len(movie_texts)} movies...")
 
         self.movie_embeddings = np.vstack(embeddings)
 
@@ -218,24 +248,31 @@ class MovieBERTProcessor:
         print(
             f"Reducing embeddings from {self.movie_embeddings.shape[1]}D to 32D using PCA..."
         )
-        self.pca = PCA(n_components=32)
-        self.movie_embeddings = self.pca.fit_transform(self.movie_embeddings).astype(
+        from sklearn.decomposition import PCA
+
+        pca = PCA(n_components=32)
+        self.movie_embeddings = pca.fit_transform(self.movie_embeddings).astype(
             np.float32
         )
+        # Keep only the projection arrays so serving never needs sklearn
+        self.pca = PCAProjection.from_sklearn(pca)
         print(f"Embeddings reduced to {self.movie_embeddings.shape}")
 
         self.movies_data = movies_df.reset_index(drop=True)
+        self._build_indexes()
 
         print("Embeddings generated successfully!")
         return self.movie_embeddings
 
     def save_embeddings(self, filepath="movie_embeddings.pkl"):
-        """Save embeddings, movie data, and PCA transformer"""
+        """Save embeddings, movie data, and PCA projection arrays"""
         data = {
             "embeddings": self.movie_embeddings,
-            "movies_data": self.movies_data,
-            "pca": self.pca,  # Save PCA transformer for query encoding
+            "movies_data": self._movies_frame(),
         }
+        # PCA mean/components as plain arrays for query encoding (no estimator pickle)
+        if self.pca is not None:
+            data.update(self.pca.arrays())
         resolved_path = (
             filepath
             if os.path.isabs(filepath)
@@ -243,10 +280,66 @@ class MovieBERTProcessor:
         )
         with open(resolved_path, "wb") as f:
             pickle.dump(data, f)
+        write_unit_embeddings(self.movie_embeddings, self._memmap_path(resolved_path))
         print(f"Embeddings saved to {resolved_path}")
 
-    def load_embeddings(self, filepath="movie_embeddings.pkl"):
-        """Load pre-computed embeddings with sparse on-demand loading"""
+    def _memmap_path(self, embeddings_file=None):
+        """Unit-normalized .npy stored next to the embeddings pickle"""
+        embeddings_file = embeddings_file or self._embeddings_file
+        directory = (
+            os.path.dirname(embeddings_file)
+            if embeddings_file
+            else os.path.dirname(os.path.abspath(__file__))
+        )
+        return os.path.join(directory, Config.EMBEDDINGS_MMAP_FILE)
+
+    def embeddings_memmap(self):
+        """
+        Read-only memory map of unit-normalized embeddings for blocked scoring.
+        The .npy is written when embeddings are saved or an artifact is
+        published; artifacts without a current one fail here. A legacy pickle
+        saved before the .npy existed is converted once, and its dense matrix
+        dropped again so blocked scoring stays O(block + k).
+        """
+        if self._embeddings_memmap is None:
+            path = self._memmap_path()
+            if not self._memmap_is_current(path):
+                if self.artifact_version is not None:
+                    raise FileNotFoundError(
+                        f"Artifact {self.artifact_version} has no current {path}; "
+                        "re-publish it (artifacts.publish_version writes the file)"
+                    )
+                loaded_here = self.movie_embeddings is None
+                write_unit_embeddings(self._get_embeddings(), path)
+                if loaded_here:
+                    self.movie_embeddings = None
+                    release_memory()
+            self._embeddings_memmap = open_unit_embeddings(path)
+            logger.info(f"Memory-mapped embeddings {self._embeddings_memmap.shape}")
+        return self._embeddings_memmap
+
+    def _memmap_is_current(self, path):
+        """Whether the .npy at path holds the loaded embeddings (shape, not older)"""
+        if not os.path.exists(path):
+            return False
+        if self.movie_embeddings is not None:
+            shape = self.movie_embeddings.shape
+        else:
+            shape = self._embeddings_shape
+        if open_unit_embeddings(path).shape != tuple(shape):
+            logger.warning(f"{path} does not match the loaded embeddings {shape}")
+            return False
+        source = self._embeddings_file
+        if source and os.path.exists(source) and os.path.getmtime(path) < os.path.getmtime(source):
+            logger.warning(f"{path} is older than {source}")
+            return False
+        return True
+
+    def load_embeddings(self, filepath="movie_embeddings.pkl", planner=None):
+        """
+        Load pre-computed embeddings with sparse on-demand loading. planner
+        (rows, dims, movies_bytes) -> LoadingPlan decides which indexes to build.
+        """
         # Skip if already loaded
         if self.movies_data is not None:
             return
@@ -275,36 +368,126 @@ class MovieBERTProcessor:
         self._embeddings_shape = embeddings.shape
         self._embeddings_dtype = embeddings.dtype
 
-        # Load PCA transformer if present (for query encoding)
-        self.pca = data.get("pca", None)
+        # Load PCA projection if present (for query encoding); files written
+        # before the array format hold a pickled sklearn PCA under "pca"
+        self.pca = PCAProjection.from_arrays(data) or PCAProjection.from_sklearn(
+            data.get("pca")
+        )
         if self.pca is not None:
-            logger.info(f"Loaded PCA transformer: {self.pca.n_components_}D reduction")
+            logger.info(f"Loaded PCA projection: {self.pca.n_components_}D reduction")
 
         # Store only the movie data, not embeddings
         self.movie_embeddings = None
-        self.movies_data = data["movies_data"].copy()
+        self._apply_plan(planner, *embeddings.shape)
+        self.movies_data = self._prepare_movies_data(data["movies_data"])
+        self._build_indexes()
 
-        # Normalize titles (e.g., "Dark Knight, The" -> "The Dark Knight")
-        if "clean_title" in self.movies_data.columns:
-            self.movies_data["clean_title"] = self.movies_data["clean_title"].apply(
-                normalize_title
+        print(
+            f"Embeddings metadata loaded from {candidate_path} (embeddings loaded on-demand)"
+        )
+
+    def save_artifact(self, root=None, version=None):
+        """Publish embeddings, movie data and PCA as a new versioned artifact"""
+        return write_artifact(
+            self.movie_embeddings, self._movies_frame(), self.pca, root, version
+        )
+
+    def load_artifact(self, directory, planner=None):
+        """
+        Load a versioned artifact directory (see artifacts.py), verifying the
+        manifest checksums, row count and dims. The embedding matrix is
+        memory-mapped when the plan scores from a memory map.
+        """
+        manifest = read_manifest(directory, verify=False)
+        self._apply_plan(
+            planner,
+            manifest["rows"],
+            manifest["dims"],
+            os.path.getsize(os.path.join(directory, MOVIES)),
+        )
+        unit_path = os.path.join(directory, Config.EMBEDDINGS_MMAP_FILE)
+        if not self.plan.embeddings_in_memory and not os.path.exists(unit_path):
+            # Fail at load, not on the first query
+            raise FileNotFoundError(
+                f"Artifact {manifest['version']} has no {unit_path} for memory-mapped "
+                "scoring; re-publish it (artifacts.publish_version writes the file)"
             )
-        if "title" in self.movies_data.columns:
-            self.movies_data["title"] = self.movies_data["title"].apply(
+        data = read_artifact(directory, mmap=not self.plan.embeddings_in_memory)
+        self.artifact_version = data["manifest"]["version"]
+        self._embeddings_file = os.path.join(directory, EMBEDDINGS)
+        self._embeddings_memmap = None
+        self.movie_embeddings = data["embeddings"].astype(np.float32, copy=False)
+        self.pca = data["pca"]
+        self.movies_data = self._prepare_movies_data(data["movies_data"])
+        self._build_indexes()
+        logger.info(
+            f"Loaded artifact {self.artifact_version}: "
+            f"{self.movie_embeddings.shape[0]} movies, {self.movie_embeddings.shape[1]}D"
+        )
+
+    def _apply_plan(self, planner, rows, dims, movies_bytes=None):
+        """Adopt the loading plan for this catalog and size caches to it"""
+        if planner is None:
+            return
+        self.plan = planner(rows, dims, movies_bytes)
+        self.query_cache.resize(self.plan.query_cache_size)
+
+    @staticmethod
+    def _prepare_movies_data(movies_data):
+        """Normalize titles and downcast numeric columns of loaded movie data"""
+        movies_data = movies_data.copy()
+
+        # Normalize titles (e.g., "Dark Knight, The" -> "The Dark Knight")
+        if "clean_title" in movies_data.columns:
+            movies_data["clean_title"] = movies_data["clean_title"].apply(
                 normalize_title
             )
+        if "title" in movies_data.columns:
+            movies_data["title"] = movies_data["title"].apply(normalize_title)
 
         # Downcast numeric columns to save metadata memory
-        for col in self.movies_data.columns:
-            col_type = self.movies_data[col].dtype
+        for col in movies_data.columns:
+            col_type = movies_data[col].dtype
             if col_type == "float64":
-                self.movies_data[col] = self.movies_data[col].astype("float32")
+                movies_data[col] = movies_data[col].astype("float32")
             elif col_type == "int64":
-                self.movies_data[col] = self.movies_data[col].astype("int32")
-
-        print(
-            f"Embeddings metadata loaded from {candidate_path} (embeddings loaded on-demand)"
+                movies_data[col] = movies_data[col].astype("int32")
+        return movies_data
+
+    def _build_indexes(self):
+        """Build metadata indexes once so requests only look them up"""
+        self.catalog_index = CatalogIndex(self.movies_data)
+        self.title_index = TitleIndex.from_movies(self.movies_data)
+        self.fuzzy_index = (
+            FuzzyTitleIndex.from_movies(self.movies_data) if self.plan.fuzzy_index else None
+        )
+        self.sparse_index = (
+            BM25Index.from_movies(self.movies_data) if self.plan.sparse_index else None
         )
+        self._compact_movies_data()
+
+    def _compact_movies_data(self):
+        """
+        Swap the object-dtype movies DataFrame for a MovieStore once the
+        indexes are built from it; the store also serves result fields.
+        """
+        if isinstance(self.movies_data, MovieStore):
+            self.result_store = self.movies_data
+            return
+        if Config.COMPACT_METADATA:
+            try:
+                self.movies_data = self.result_store = MovieStore(self.movies_data)
+                release_memory()
+                return
+            except ValueError as e:
+                logger.warning(f"Keeping movie metadata as a DataFrame: {e}")
+        self.result_store = ResultStore(self.movies_data)
+
+    def _movies_frame(self):
+        """movies_data as a DataFrame, for pickles and artifacts"""
+        if isinstance(self.movies_data, MovieStore):
+            return self.movies_data.to_frame()
+        return self.movies_data
 
     def _get_embeddings(self):
         """Lazy load embeddings on-demand"""
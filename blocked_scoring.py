@@ -0,0 +1,94 @@
+"""Bounded-memory top-k cosine scoring over a memory-mapped embedding file."""
+
+import heapq
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def write_unit_embeddings(embeddings, path, block_rows=65536):
+    """
+    Save row-normalized float32 embeddings as .npy so they can be memory-mapped
+    and scored with plain dot products. embeddings may be a memmap: rows are
+    converted one block at a time into a per-process temp file that is then
+    renamed over path, so concurrent writers never expose a partial file.
+    """
+    rows, dims = embeddings.shape
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(rows, dims))
+    try:
+        for start in range(0, rows, block_rows):
+            block = np.asarray(embeddings[start : start + block_rows], dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            out[start : start + len(block)] = block / norms
+        out.flush()
+        del out
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"Wrote unit-normalized embeddings {(rows, dims)} to {path}")
+
+
+def open_unit_embeddings(path):
+    """Memory-map a file written by write_unit_embeddings (read-only)."""
+    return np.load(path, mmap_mode="r")
+
+
+def blocked_top_k(matrix, query, top_k, block_rows=65536, candidates=None):
+    """
+    Top-k dot products of query against matrix rows, one block at a time.
+
+    matrix is typically a read-only np.memmap of unit rows; only one block of
+    block_rows rows is paged in and scored at a time, and block-local top-k
+    results are merged into a running min-heap, so peak extra memory is
+    O(block_rows + top_k) regardless of catalog size.
+
+    candidates, if given, is a sorted array of row ids to restrict scoring to;
+    returned positions then index into candidates (like the dense scorers).
+    Returns (positions, scores), best first.
+    """
+    query = np.asarray(query, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(query)
+    if norm > 0:
+        query = query / norm
+    total = len(matrix)
+    heap = []  # (score, position) with the worst kept score at heap[0]
+
+    for start in range(0, total, block_rows):
+        stop = min(start + block_rows, total)
+        if candidates is None:
+            block = np.asarray(matrix[start:stop])
+            offset_positions = None
+        else:
+            lo, hi = np.searchsorted(candidates, (start, stop))
+            if lo == hi:
+                continue
+            block = np.asarray(matrix[candidates[lo:hi]])
+            offset_positions = np.arange(lo, hi)
+
+        scores = block @ query
+        k = min(top_k, len(scores))
+        if k <= 0:
+            continue
+        local = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(k)
+        if heap and len(heap) >= top_k:
+            # Only block entries beating the current k-th best can enter
+            local = local[scores[local] > heap[0][0]]
+        for i in local.tolist():
+            position = start + i if offset_positions is None else int(offset_positions[i])
+            item = (float(scores[i]), position)
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heappushpop(heap, item)
+
+    ranked = sorted(heap, key=lambda item: (-item[0], item[1]))
+    positions = np.fromiter((p for _, p in ranked), dtype=np.int64, count=len(ranked))
+    scores = np.fromiter((s for s, _ in ranked), dtype=np.float32, count=len(ranked))
+    return positions, scores
@@ -0,0 +1,141 @@
+"""Sparse BM25 keyword retriever over titles, genres and tags, plus score fusion."""
+
+import logging
+from collections import Counter
+
+import numpy as np
+
+from title_index import normalize_text
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it movie movies film films "
+    "of on or s the to with".split()
+)
+
+
+def tokenize(text):
+    return [t for t in normalize_text(text).split() if t not in STOPWORDS]
+
+
+def _as_list(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(v) for v in value if v is not None and v == v]
+    return []
+
+
+class BM25Index:
+    """
+    Term-major BM25 index stored as CSR arrays.
+
+    For term t, indices[indptr[t]:indptr[t + 1]] are the documents containing
+    it and data[...] the precomputed BM25 weight of t in each, so scoring a
+    query is a few vectorized scatter-adds and needs no embedding endpoint.
+    Title words are counted title_weight times so they outrank tag matches.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        """documents: list of token lists, one per catalog row."""
+        self.size = len(documents)
+        counts = [Counter(doc) for doc in documents]
+        lengths = np.fromiter((len(doc) for doc in documents), dtype=np.float32)
+        avg_length = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+
+        vocabulary = {}
+        postings = []
+        for doc_id, counter in enumerate(counts):
+            for term, tf in counter.items():
+                tid = vocabulary.setdefault(term, len(vocabulary))
+                if tid == len(postings):
+                    postings.append(([], []))
+                postings[tid][0].append(doc_id)
+                postings[tid][1].append(tf)
+        self.vocabulary = vocabulary
+
+        sizes = np.fromiter((len(p[0]) for p in postings), dtype=np.int64)
+        self.indptr = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        if postings:
+            self.indices = np.concatenate(
+                [np.asarray(p[0], dtype=np.int32) for p in postings]
+            )
+            tf = np.concatenate([np.asarray(p[1], dtype=np.float32) for p in postings])
+        else:
+            self.indices = np.empty(0, dtype=np.int32)
+            tf = np.empty(0, dtype=np.float32)
+
+        idf = np.log(1.0 + (self.size - sizes + 0.5) / (sizes + 0.5)).astype(np.float32)
+        norm = k1 * (1.0 - b + b * lengths[self.indices] / avg_length)
+        self.data = (np.repeat(idf, sizes) * tf * (k1 + 1.0) / (tf + norm)).astype(
+            np.float32
+        )
+
+        logger.info(
+            f"BM25 index built: {self.size} documents, {len(vocabulary)} terms, "
+            f"{len(self.indices)} postings"
+        )
+
+    @classmethod
+    def from_movies(cls, movies_df, title_weight=2):
+        documents = []
+        columns = movies_df.columns
+        empty = [None] * len(movies_df)
+        # Column-wise: works for DataFrames and movie_store.MovieStore alike
+        genres = movies_df["genres_list"] if "genres_list" in columns else empty
+        tags = movies_df["combined_tags"] if "combined_tags" in columns else empty
+        for title, movie_genres, movie_tags in zip(movies_df["clean_title"], genres, tags):
+            tokens = tokenize(title) * title_weight
+            for genre in _as_list(movie_genres):
+                tokens.extend(tokenize(genre))
+            for tag in _as_list(movie_tags):
+                tokens.extend(tokenize(tag))
+            documents.append(tokens)
+        return cls(documents)
+
+    def scores(self, query, candidates=None):
+        """
+        BM25 score of every row (or of candidates, in that order) for query.
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            tid = self.vocabulary.get(term)
+            if tid is None:
+                continue
+            start, stop = self.indptr[tid], self.indptr[tid + 1]
+            # Document ids are unique within a posting list, so += is safe
+            scores[self.indices[start:stop]] += self.data[start:stop]
+        return scores if candidates is None else scores[candidates]
+
+
+def reciprocal_rank_fusion(score_lists, k=60, depth=100):
+    """
+    Fuse score arrays over the same rows by reciprocal rank.
+
+    Only the top `depth` rows of each list contribute. Rows scored 0 or -inf
+    (no keyword match, pruned by a cascade) are treated as "no opinion".
+    """
+    fused = np.zeros(len(score_lists[0]), dtype=np.float32)
+    for scores in score_lists:
+        depth_k = min(depth, len(scores))
+        if depth_k == 0:
+            continue
+        top = np.argpartition(-scores, depth_k - 1)[:depth_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[np.isfinite(scores[top]) & (scores[top] != 0)]
+        fused[top] += 1.0 / (k + 1.0 + np.arange(len(top), dtype=np.float32))
+    return fused
+
+
+def weighted_fusion(dense, sparse, sparse_weight=0.3):
+    """Blend min-max normalized dense and sparse scores (-inf counts as the minimum)."""
+
+    def _normalize(scores):
+        finite = np.isfinite(scores)
+        if not finite.any():
+            return np.zeros_like(scores, dtype=np.float32)
+        low, high = float(scores[finite].min()), float(scores[finite].max())
+        if high - low <= 1e-12:
+            return np.zeros_like(scores, dtype=np.float32)
+        return np.where(finite, (scores - low) / (high - low), 0.0).astype(np.float32)
+
+    return (1.0 - sparse_weight) * _normalize(dense) + sparse_weight * _normalize(sparse)
@@ -0,0 +1,261 @@
+"""Bitmap and sorted-array indexes over movie metadata for filter pushdown."""
+
+import logging
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+NO_GENRE = "(no genres listed)"
+
+# Number of set bits for every possible byte value, used to popcount bitmaps
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+FILTER_KEYS = (
+    "genres",
+    "genre_match",
+    "exclude_genres",
+    "year_min",
+    "year_max",
+    "min_rating",
+    "max_rating",
+    "min_votes",
+)
+
+
+def _split_list(value):
+    """Accept a list or a comma-separated string and return a list of names."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def _to_number(value, key, cast=float):
+    if value is None or value == "":
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number")
+
+
+def parse_filters(raw):
+    """
+    Validate a filter spec from a request body or query string.
+
+    Supported keys: genres (list or comma string), genre_match ("any"/"all"),
+    exclude_genres, year_min, year_max, min_rating, max_rating, min_votes.
+    Returns a normalized dict (empty when nothing is filtered).
+    Raises ValueError for malformed values.
+    """
+    if not raw:
+        return {}
+    if not hasattr(raw, "get"):
+        raise ValueError("filters must be an object")
+
+    filters = {}
+    genres = _split_list(raw.get("genres"))
+    if genres:
+        filters["genres"] = genres
+        match = (raw.get("genre_match") or "any").lower()
+        if match not in ("any", "all"):
+            raise ValueError("genre_match must be 'any' or 'all'")
+        filters["genre_match"] = match
+    exclude = _split_list(raw.get("exclude_genres"))
+    if exclude:
+        filters["exclude_genres"] = exclude
+
+    for key, cast in (
+        ("year_min", int),
+        ("year_max", int),
+        ("min_rating", float),
+        ("max_rating", float),
+        ("min_votes", int),
+    ):
+        value = _to_number(raw.get(key), key, cast)
+        if value is not None:
+            filters[key] = value
+    return filters
+
+
+class CatalogIndex:
+    """
+    Per-genre bitsets plus sorted year / avg_rating / rating_count arrays.
+
+    Bitmaps are packed little-endian uint8 arrays with one bit per catalog row,
+    so combining filters is a handful of vectorized AND/OR operations and facet
+    counts are popcounts over the same bitmaps.
+    """
+
+    def __init__(self, movies_df, vote_thresholds=(50, 100, 500, 1000, 5000)):
+        self.size = len(movies_df)
+        self._all = self._pack(np.ones(self.size, dtype=bool))
+
+        genre_rows = defaultdict(list)
+        if "genres_list" in movies_df.columns:
+            for row, genres in enumerate(movies_df["genres_list"]):
+                if not isinstance(genres, (list, tuple)):
+                    continue
+                for genre in genres:
+                    if genre and genre != NO_GENRE:
+                        genre_rows[genre].append(row)
+        self.genre_bitmaps = {
+            genre: self._rows_to_bitmap(np.asarray(rows, dtype=np.int64))
+            for genre, rows in sorted(genre_rows.items())
+        }
+        # Lower-cased lookup so "comedy" and "Comedy" both resolve
+        self._genre_names = {genre.lower(): genre for genre in self.genre_bitmaps}
+
+        self.years = self._numeric_column(movies_df, "year")
+        self.ratings = self._numeric_column(movies_df, "avg_rating")
+        self.votes = self._numeric_column(movies_df, "rating_count")
+        self._year_order, self._year_sorted = self._sort_column(self.years)
+        self._rating_order, self._rating_sorted = self._sort_column(self.ratings)
+        self._votes_order, self._votes_sorted = self._sort_column(self.votes)
+
+        # Popularity thresholds used by most requests are precomputed bitmaps
+        self.vote_bitmaps = {
+            threshold: self._range_bitmap(
+                self._votes_order, self._votes_sorted, threshold, None
+            )
+            for threshold in vote_thresholds
+        }
+
+        logger.info(
+            f"Catalog index built: {self.size} rows, {len(self.genre_bitmaps)} genres"
+        )
+
+    # ------------------------------------------------------------------ build
+
+    @staticmethod
+    def _numeric_column(movies_df, column):
+        if column not in movies_df.columns:
+            return np.full(len(movies_df), np.nan, dtype=np.float64)
+        return pd.to_numeric(movies_df[column], errors="coerce").to_numpy(
+            dtype=np.float64, na_value=np.nan
+        )
+
+    @staticmethod
+    def _sort_column(values):
+        """Return (row order, sorted values) with NaN rows left out."""
+        valid = np.flatnonzero(~np.isnan(values))
+        order = valid[np.argsort(values[valid], kind="stable")]
+        return order, values[order]
+
+    @staticmethod
+    def _pack(mask):
+        return np.packbits(mask, bitorder="little")
+
+    def _unpack(self, bitmap):
+        return np.unpackbits(bitmap, count=self.size, bitorder="little").view(bool)
+
+    def _rows_to_bitmap(self, rows):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return self._pack(mask)
+
+    def _range_bitmap(self, order, sorted_values, low, high):
+        start = 0 if low is None else np.searchsorted(sorted_values, low, "left")
+        stop = (
+            len(sorted_values)
+            if high is None
+            else np.searchsorted(sorted_values, high, "right")
+        )
+        return self._rows_to_bitmap(order[start:stop])
+
+    # ------------------------------------------------------------------ query
+
+    def genre(self, name):
+        """Return the canonical genre name or raise ValueError if unknown."""
+        canonical = self._genre_names.get(str(name).lower())
+        if canonical is None:
+            raise ValueError(f"Unknown genre: {name}")
+        return canonical
+
+    def bitmap(self, filters):
+        """Return the packed bitmap of rows matching filters (None = all rows)."""
+        filters = filters or {}
+        if not any(key in filters for key in FILTER_KEYS):
+            return None
+
+        result = self._all.copy()
+        genres = [self.genre(g) for g in filters.get("genres", [])]
+        if genres:
+            if filters.get("genre_match", "any") == "all":
+                for genre in genres:
+                    result &= self.genre_bitmaps[genre]
+            else:
+                union = np.zeros_like(result)
+                for genre in genres:
+                    union |= self.genre_bitmaps[genre]
+                result &= union
+        for name in filters.get("exclude_genres", []):
+            result &= ~self.genre_bitmaps[self.genre(name)]
+
+        year_min, year_max = filters.get("year_min"), filters.get("year_max")
+        if year_min is not None or year_max is not None:
+            result &= self._range_bitmap(
+                self._year_order, self._year_sorted, year_min, year_max
+            )
+
+        min_rating, max_rating = filters.get("min_rating"), filters.get("max_rating")
+        if min_rating is not None or max_rating is not None:
+            result &= self._range_bitmap(
+                self._rating_order, self._rating_sorted, min_rating, max_rating
+            )
+
+        min_votes = filters.get("min_votes")
+        if min_votes is not None:
+            cached = self.vote_bitmaps.get(min_votes)
+            if cached is None:
+                cached = self._range_bitmap(
+                    self._votes_order, self._votes_sorted, min_votes, None
+                )
+            result &= cached
+        return result
+
+    def mask(self, filters):
+        """Boolean row mask for filters, or None when nothing is filtered."""
+        bitmap = self.bitmap(filters)
+        return None if bitmap is None else self._unpack(bitmap)
+
+    def candidate_rows(self, filters):
+        """Row indices matching filters, or None when nothing is filtered."""
+        mask = self.mask(filters)
+        return None if mask is None else np.flatnonzero(mask)
+
+    def count(self, bitmap):
+        return int(_POPCOUNT[bitmap].sum())
+
+    def facet_counts(self, filters=None):
+        """
+        Count matching rows per genre and per decade for the given filters.
+
+        Genre counts are popcounts of each genre bitmap ANDed with the filter
+        bitmap, so no rows are materialized.
+        """
+        bitmap = self.bitmap(filters)
+        if bitmap is None:
+            bitmap = self._all
+        genres = {
+            genre: self.count(genre_bitmap & bitmap)
+            for genre, genre_bitmap in self.genre_bitmaps.items()
+        }
+
+        # Decades come from the year-sorted order restricted to matching rows
+        selected = self._unpack(bitmap)[self._year_order]
+        decades = {}
+        if selected.any():
+            decade_values = (self._year_sorted[selected] // 10 * 10).astype(np.int64)
+            values, counts = np.unique(decade_values, return_counts=True)
+            decades = {f"{v}s": int(c) for v, c in zip(values, counts)}
+
+        return {
+            "total": self.count(bitmap),
+            "genres": {g: c for g, c in genres.items() if c},
+            "decades": decades,
+        }
@@ -13,6 +13,22 @@ class Config:
     # Use TinyBERT (~60MB) to stay under 512MB on Render
     BERT_MODEL_NAME = "sentence-transformers/paraphrase-TinyBERT-L6-v2"
     EMBEDDINGS_FILE = "movie_embeddings.pkl"
+    # Unit-normalized float32 rows written next to EMBEDDINGS_FILE for mmap scoring
+    EMBEDDINGS_MMAP_FILE = "movie_embeddings_unit.npy"
+    # Versioned artifacts: ARTIFACT_DIR/<version>/ with a manifest, and
+    # ARTIFACT_DIR/CURRENT naming the live version (falls back to EMBEDDINGS_FILE)
+    ARTIFACT_DIR: str = os.getenv("ARTIFACT_DIR", "artifacts")
+    # Seconds between checks of CURRENT for a new version (0 disables watching)
+    ARTIFACT_WATCH_INTERVAL: float = float(os.getenv("ARTIFACT_WATCH_INTERVAL", "0"))
+    # Token for /api/admin/* endpoints (disabled when unset)
+    ADMIN_TOKEN: Optional[str] = os.getenv("ADMIN_TOKEN")
+    # Warm up at boot (load artifacts, touch pages, probe encode) and report
+    # readiness on /api/ready; /api/health stays a plain liveness check
+    WARMUP_ON_START: bool = os.getenv("WARMUP_ON_START", "true").lower() == "true"
+    WARMUP_PROBE_ENCODE: bool = (
+        os.getenv("WARMUP_PROBE_ENCODE", "true").lower() == "true"
+    )
+    WARMUP_PROBE_QUERY: str = "warm up"
     ENCODING_BATCH_SIZE: int = 64
     PREWARM_MODEL: bool = False
 
@@ -26,8 +42,43 @@ class Config:
     )
     HF_API_TOKEN: Optional[str] = os.getenv("HF_API_TOKEN")
 
-    # HF Space endpoint for MiniLM embeddings (e.g., https://username-minilm-space.hf.space)
+    # HF Space endpoint for MiniLM embeddings (e.g., https://username-minilm-space.hf.space);
+    # a comma-separated list load-balances across replicas
     HF_SPACE_ENDPOINT: Optional[str] = os.getenv("HF_SPACE_ENDPOINT")
+    # Replica pool: routing (least_outstanding or ewma), seconds between /health
+    # probes (0 disables), EWMA latency multiple of the fastest replica that
+    # ejects a replica as slow (0 disables) and for how long, and concurrent
+    # generate_embeddings batches per replica
+    EMBED_ROUTING: str = os.getenv("EMBED_ROUTING", "least_outstanding")
+    POOL_HEALTH_INTERVAL: float = float(os.getenv("POOL_HEALTH_INTERVAL", "10"))
+    POOL_SLOW_FACTOR: float = float(os.getenv("POOL_SLOW_FACTOR", "3"))
+    POOL_EJECT_SECONDS: float = float(os.getenv("POOL_EJECT_SECONDS", "30"))
+    EMBED_BULK_PER_ENDPOINT: int = int(os.getenv("EMBED_BULK_PER_ENDPOINT", "1"))
+    # Embedding calls: total seconds per encode across attempts and backoff
+    # (offline generate_embeddings batches get EMBED_BULK_DEADLINE), per-attempt
+    # timeout, attempts, and the first backoff (doubling)
+    EMBED_DEADLINE: float = float(os.getenv("EMBED_DEADLINE", "10"))
+    EMBED_BULK_DEADLINE: float = float(os.getenv("EMBED_BULK_DEADLINE", "120"))
+    EMBED_ATTEMPT_TIMEOUT: float = float(os.getenv("EMBED_ATTEMPT_TIMEOUT", "8"))
+    EMBED_MAX_ATTEMPTS: int = int(os.getenv("EMBED_MAX_ATTEMPTS", "3"))
+    EMBED_BACKOFF: float = float(os.getenv("EMBED_BACKOFF", "0.25"))
+    # Circuit breaker per endpoint: open after this many consecutive failures,
+    # probe again after BREAKER_RESET_TIMEOUT seconds
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_TIMEOUT: float = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+    # Hedged requests: send a second request when the first is slower than the
+    # EMBED_HEDGE_QUANTILE of recent latencies (at least EMBED_HEDGE_MIN_MS)
+    EMBED_HEDGE: bool = os.getenv("EMBED_HEDGE", "false").lower() == "true"
+    EMBED_HEDGE_QUANTILE: float = float(os.getenv("EMBED_HEDGE_QUANTILE", "0.95"))
+    EMBED_HEDGE_MIN_MS: float = float(os.getenv("EMBED_HEDGE_MIN_MS", "50"))
+
+    # Query encoders tried in order: remote (HF Space) and/or local (ONNX export of
+    # the sentence model from scripts/export_onnx_encoder.py, optionally int8, run
+    # with LOCAL_ENCODER_THREADS intra-op threads), e.g. "local,remote"
+    ENCODER_BACKENDS: str = os.getenv("ENCODER_BACKENDS", "remote")
+    LOCAL_ENCODER_PATH: str = os.getenv("LOCAL_ENCODER_PATH", "encoder_onnx")
+    LOCAL_ENCODER_INT8: bool = os.getenv("LOCAL_ENCODER_INT8", "false").lower() == "true"
+    LOCAL_ENCODER_THREADS: int = int(os.getenv("LOCAL_ENCODER_THREADS", "1"))
 
     # HF Inference API endpoint (default or custom)
     HF_INFERENCE_ENDPOINT: str = (
@@ -35,6 +86,83 @@ class Config:
     )
     DEFAULT_TOP_K: int = 8
     MAX_SEARCH_RESULTS: int = 8
+    # Query retrieval: "dense" (embeddings), "sparse" (local BM25) or "hybrid" (fused)
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "dense")
+    # Fall back to BM25 when the embedding endpoint is unreachable
+    SPARSE_FALLBACK: bool = os.getenv("SPARSE_FALLBACK", "true").lower() == "true"
+    # Hybrid fusion: "rrf" (reciprocal rank) or "weighted" (min-max blend)
+    FUSION_METHOD: str = os.getenv("FUSION_METHOD", "rrf")
+    RRF_K: int = 60
+    FUSION_DEPTH: int = 100
+    HYBRID_SPARSE_WEIGHT: float = 0.3
+    # Dense scoring: "exact", "cascade" (score all rows on the leading PCA
+    # dims, re-score the best top_k * CASCADE_MULTIPLIER on all dims) or
+    # "blocked" (stream SCORING_BLOCK_ROWS rows at a time from the mmap file)
+    # or "sharded" (blocked scoring split over SCORING_SHARDS processes)
+    DENSE_SCORING: str = os.getenv("DENSE_SCORING", "exact")
+    SCORING_BLOCK_ROWS: int = int(os.getenv("SCORING_BLOCK_ROWS", "65536"))
+    # "sharded": scoring worker processes per serving process (scatter-gather
+    # top-k); every gunicorn worker starts its own, so the default splits the
+    # cores between WEB_CONCURRENCY workers
+    SCORING_SHARDS: int = int(
+        os.getenv(
+            "SCORING_SHARDS",
+            str(max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", "1")))),
+        )
+    )
+    CASCADE_LEAD_DIMS: int = 8
+    CASCADE_MULTIPLIER: int = 10
+    CASCADE_MIN_CANDIDATES: int = 200
+    # Per-stage latency histograms, /metrics and the Server-Timing header
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Recently encoded query vectors kept in an LRU (0 disables)
+    QUERY_CACHE_SIZE: int = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+    # Request traces: "" (off), "stdout" or a file path for JSON-lines export
+    TRACE_EXPORT: str = os.getenv("TRACE_EXPORT", "")
+    # Fraction of requests traced; requests sending X-Trace-Id are always traced
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+    # Also export any unsampled request slower than this (0 disables)
+    TRACE_SLOW_MS: float = float(os.getenv("TRACE_SLOW_MS", "1000"))
+    # Sampling profiler: profile every Nth request (0 disables; admins can
+    # force one with X-Profile: 1); collapsed stacks go to PROFILE_DIR
+    PROFILE_EVERY_N: int = int(os.getenv("PROFILE_EVERY_N", "0"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", "50"))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    # Per-process memory budget in MB for the loading plan and cache eviction;
+    # 0 uses MEMORY_BUDGET_FRACTION of the memory available at startup
+    MEMORY_BUDGET_MB: float = float(os.getenv("MEMORY_BUDGET_MB", "0"))
+    MEMORY_BUDGET_FRACTION: float = float(os.getenv("MEMORY_BUDGET_FRACTION", "0.8"))
+    # Caches are halved when RSS passes this fraction of the budget
+    MEMORY_HIGH_WATERMARK: float = float(os.getenv("MEMORY_HIGH_WATERMARK", "0.9"))
+    MEMORY_CHECK_INTERVAL: float = float(os.getenv("MEMORY_CHECK_INTERVAL", "10"))
+    # Hold movie metadata in movie_store.MovieStore (packed arrays) instead
+    # of the object-dtype DataFrame once the indexes are built
+    COMPACT_METADATA: bool = os.getenv("COMPACT_METADATA", "true").lower() == "true"
+    # Query/search responses: "records" (list of dicts), "columns" (one JSON
+    # array per field) or "msgpack" (columns as MessagePack); per request via "format"
+    RESPONSE_FORMAT: str = os.getenv("RESPONSE_FORMAT", "records")
+    # Concurrent requests with the same (query, top_k, mode, filters) share
+    # one encode and scan instead of each calling the embedding endpoint
+    SINGLE_FLIGHT: bool = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+    # Admission control for /api/recommendations/*: requests running at once
+    # (0 disables), requests allowed to queue, and seconds one may wait before
+    # a 503 with Retry-After
+    ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+    ADMISSION_MAX_WAIT: float = float(os.getenv("ADMISSION_MAX_WAIT", "2"))
+    # Answer refused requests with a recent identical result or, for queries,
+    # the most-rated matching movies (X-Degraded header) instead of a 503
+    ADMISSION_DEGRADED: bool = os.getenv("ADMISSION_DEGRADED", "true").lower() == "true"
+    ADMISSION_RESULT_CACHE: int = int(os.getenv("ADMISSION_RESULT_CACHE", "256"))
+    # ASGI app (asgi_api.py): threads for scoring/engine builds, and the cap
+    # on pooled connections to the embedding endpoint
+    ASGI_SCORING_THREADS: int = int(
+        os.getenv("ASGI_SCORING_THREADS", str(os.cpu_count() or 1))
+    )
+    ASGI_MAX_CONNECTIONS: int = int(os.getenv("ASGI_MAX_CONNECTIONS", "100"))
+    # Title search: "auto" (substring, fuzzy when nothing matches), "substring", "fuzzy"
+    SEARCH_MODE: str = os.getenv("SEARCH_MODE", "auto")
 
     # API Rate Limiting
     API_REQUEST_DELAY: float = 1.0  # seconds between API requests
@@ -56,6 +184,11 @@ class Config:
             ok = False
         return ok
 
+    @classmethod
+    def space_endpoints(cls) -> list:
+        """HF Space base URLs from HF_SPACE_ENDPOINT"""
+        return [url.strip() for url in (cls.HF_SPACE_ENDPOINT or "").split(",") if url.strip()]
+
     @classmethod
     def get_imdb_config(cls) -> dict:
         """Get IMDB API configuration"""
@@ -0,0 +1,68 @@
+"""Cosine scoring over the PCA-reduced movie embeddings."""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DenseIndex:
+    """
+    Unit-normalized embedding matrix split into leading and trailing blocks.
+
+    PCA components are ordered by explained variance, so the first lead_dims
+    columns carry most of each dot product. Both blocks are stored C-contiguous,
+    which lets the coarse pass of cascade scoring stream only the narrow
+    leading block over the whole catalog; exact scores are lead + tail partial
+    dot products, so nothing is stored twice.
+    """
+
+    def __init__(self, embeddings, lead_dims=8):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        unit = embeddings / norms
+        self.size, self.dims = unit.shape
+        self.lead_dims = min(lead_dims, self.dims)
+        self.lead = np.ascontiguousarray(unit[:, : self.lead_dims])
+        self.tail = np.ascontiguousarray(unit[:, self.lead_dims :])
+
+    def _unit_query(self, query):
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        return query / norm if norm > 0 else query
+
+    def scores(self, query, candidates=None):
+        """Exact cosine similarity of query to every row (or candidates)."""
+        q = self._unit_query(query)
+        if candidates is None:
+            return self.lead @ q[: self.lead_dims] + self.tail @ q[self.lead_dims :]
+        return (
+            self.lead[candidates] @ q[: self.lead_dims]
+            + self.tail[candidates] @ q[self.lead_dims :]
+        )
+
+    def cascade_scores(self, query, top_k, candidates=None, multiplier=10, minimum=100):
+        """
+        Coarse-to-fine cosine scores.
+
+        Every row is scored on the leading block only; the best
+        max(top_k * multiplier, minimum) rows are re-scored exactly and all
+        other rows get -inf. The returned array is aligned like scores().
+        """
+        q = self._unit_query(query)
+        q_lead, q_tail = q[: self.lead_dims], q[self.lead_dims :]
+        lead = self.lead if candidates is None else self.lead[candidates]
+        coarse = lead @ q_lead
+
+        keep = min(len(coarse), max(top_k * multiplier, minimum))
+        if keep < len(coarse):
+            shortlist = np.argpartition(-coarse, keep - 1)[:keep]
+        else:
+            shortlist = np.arange(len(coarse))
+        rows = shortlist if candidates is None else candidates[shortlist]
+
+        result = np.full(len(coarse), -np.inf, dtype=np.float32)
+        result[shortlist] = coarse[shortlist] + self.tail[rows] @ q_tail
+        return result
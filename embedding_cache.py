@@ -0,0 +1,63 @@
+"""LRU cache of query embeddings, keyed on the normalized query text."""
+
+import threading
+from collections import OrderedDict
+
+from metrics import CACHE_REQUESTS
+
+
+def cache_key(text):
+    return " ".join(str(text).lower().split())
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU of projected query vectors. Trending queries skip the
+    embedding endpoint entirely; maxsize 0 disables caching.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, text):
+        if not self.maxsize:
+            return None
+        key = cache_key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc("hit" if vector is not None else "miss")
+        return vector
+
+    def put(self, text, vector):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[cache_key(text)] = vector
+            self._entries.move_to_end(cache_key(text))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def shrink(self, fraction):
+        """Evict the least recently used fraction of entries; returns the count"""
+        with self._lock:
+            count = int(len(self._entries) * fraction)
+            for _ in range(count):
+                self._entries.popitem(last=False)
+        return count
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
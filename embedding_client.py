@@ -0,0 +1,623 @@
+"""
+Calls to embedding endpoints: per-endpoint circuit breakers, a deadline
+across retries, optional hedged requests, and a load-balanced pool of
+replicas.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import numpy as np
+
+from config import Config
+from metrics import (
+    EMBED_ATTEMPT_SECONDS,
+    EMBED_ERRORS,
+    EMBED_RETRIES,
+    REGISTRY,
+    Counter,
+    Gauge,
+    record,
+)
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+BREAKER_TRANSITIONS = REGISTRY.register(
+    Counter(
+        "recommender_breaker_transitions_total",
+        "Embedding endpoint circuit breaker state changes",
+        ("endpoint", "state"),
+    )
+)
+EMBED_HEDGES = REGISTRY.register(
+    Counter(
+        "recommender_embed_hedges_total",
+        "Hedged second embedding requests by which one answered first",
+        ("winner",),
+    )
+)
+POOL_EJECTIONS = REGISTRY.register(
+    Counter(
+        "recommender_pool_ejections_total",
+        "Embedding replicas taken out of their pool by reason",
+        ("endpoint", "reason"),
+    )
+)
+
+# Latency samples a replica needs before it is hedged or judged slow
+MIN_LATENCY_SAMPLES = 20
+
+
+class EmbeddingUnavailable(RuntimeError):
+    """The endpoint's breaker is open or the request deadline ran out"""
+
+
+class EndpointError(RuntimeError):
+    """Non-retryable answer (4xx): the request is at fault, not the endpoint"""
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class Deadline:
+    """Wall-clock budget for one encode, shared by every attempt and backoff"""
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+
+class CircuitBreaker:
+    """
+    Closed: calls flow, consecutive failures are counted. After
+    failure_threshold failures it opens and refuses calls for reset_timeout
+    seconds, then half-opens and lets a single probe through: success
+    closes it, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = (
+            Config.BREAKER_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        )
+        self.reset_timeout = (
+            Config.BREAKER_RESET_TIMEOUT if reset_timeout is None else reset_timeout
+        )
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now (claims the half-open probe)"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def available(self):
+        """Whether allow() would let a call through, without claiming the probe"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at >= self.reset_timeout
+            return not (self.state == HALF_OPEN and self._probing)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED and self.failures >= self.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def _transition(self, state):
+        logger.warning(f"Embedding endpoint {self.name}: circuit {self.state} -> {state}")
+        self.state = state
+        BREAKER_TRANSITIONS.inc(self.name, state)
+
+
+class LatencyWindow:
+    """Recent successful call latencies, for hedging delays and routing"""
+
+    def __init__(self, size=200, alpha=0.3):
+        self._samples = deque(maxlen=size)
+        self._alpha = alpha
+        self.ewma = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+        self.ewma = seconds if self.ewma is None else self.ewma + self._alpha * (seconds - self.ewma)
+
+    def reset(self):
+        self._samples.clear()
+        self.ewma = None
+
+    def quantile(self, q):
+        return float(np.quantile(list(self._samples), q)) if self._samples else None
+
+
+@contextmanager
+def _attempt(attempt):
+    """Time one endpoint call (the "encode" stage, per attempt)"""
+    started = time.perf_counter()
+    try:
+        with span("encode_attempt", attempt=attempt + 1):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        record("encode", elapsed)
+        EMBED_ATTEMPT_SECONDS.observe(elapsed, str(attempt + 1))
+
+
+def _check(response):
+    """JSON body of a 200; retryable statuses raise, other errors are final"""
+    if response.status_code == 200:
+        return response.json()
+    EMBED_ERRORS.inc(f"http_{response.status_code}")
+    if response.status_code == 429 or response.status_code >= 500:
+        raise _RetryableStatus(response.status_code)
+    raise EndpointError(f"Embedding endpoint returned HTTP {response.status_code}")
+
+
+def _backoff(attempt, deadline):
+    """Seconds to sleep before the next attempt, or None to give up"""
+    if attempt + 1 >= Config.EMBED_MAX_ATTEMPTS:
+        return None
+    backoff = Config.EMBED_BACKOFF * 2**attempt
+    # No point sleeping into a deadline that leaves no time for the call
+    if backoff >= deadline.remaining():
+        return None
+    EMBED_RETRIES.inc()
+    return backoff
+
+
+# Threads for the hedged second request of synchronous calls
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _hedge_executor():
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="embed-hedge")
+        return _hedge_pool
+
+
+class EmbeddingEndpoint:
+    """
+    One embedding URL with its breaker and latency history. post() and
+    post_async() retry retryable failures (timeouts, connection errors,
+    429/5xx) with exponential backoff, all inside the caller's Deadline,
+    and raise EmbeddingUnavailable at once while the breaker is open.
+    """
+
+    def __init__(self, url, health_url=None):
+        self.url = url
+        self.health_url = health_url
+        self.breaker = CircuitBreaker(url)
+        self.latency = LatencyWindow()
+        self.outstanding = 0  # Calls in flight through an EndpointPool
+        self.ejected_until = 0.0  # Taken out of its pool as slow until then
+
+    def hedge_delay(self):
+        """p-quantile of recent latencies, once there are enough samples"""
+        if not Config.EMBED_HEDGE or len(self.latency) < MIN_LATENCY_SAMPLES:
+            return None
+        delay = self.latency.quantile(Config.EMBED_HEDGE_QUANTILE)
+        return max(delay, Config.EMBED_HEDGE_MIN_MS / 1000)
+
+    def _admit(self, deadline):
+        if deadline.expired:
+            raise EmbeddingUnavailable(f"Deadline exceeded calling {self.url}")
+        if not self.breaker.allow():
+            EMBED_ERRORS.inc("circuit_open")
+            raise EmbeddingUnavailable(f"Circuit open for {self.url}")
+
+    def _failed(self, error, attempt):
+        if isinstance(error, _RetryableStatus):
+            logger.warning(f"Embedding endpoint error {error.status} (attempt {attempt + 1})")
+        else:
+            EMBED_ERRORS.inc(type(error).__name__)
+            logger.warning(f"Embedding endpoint error: {error} (attempt {attempt + 1})")
+        self.breaker.record_failure()
+
+    # -------------------------------------------------------------- sync
+
+    def post(self, session, payload, headers, deadline):
+        """POST payload, returning the decoded JSON body"""
+        last_error = None
+        for attempt in range(Config.EMBED_MAX_ATTEMPTS):
+            self._admit(deadline)
+            try:
+                with _attempt(attempt):
+                    return self._post_hedged(session, payload, headers, deadline)
+            except EndpointError:
+                # The endpoint answered; it is healthy, the request is not
+                self.breaker.record_success()
+                raise
+            except Exception as e:
+                last_error = e
+                self._failed(e, attempt)
+            backoff = _backoff(attempt, deadline)
+            if backoff is None:
+                break
+            time.sleep(backoff)
+        raise EmbeddingUnavailable(f"Embedding failed for {self.url}: {last_error}")
+
+    def _send(self, session, payload, headers, deadline):
+        started = time.perf_counter()
+        response = session.post(
+            self.url,
+            json=payload,
+            headers=headers,
+            timeout=min(Config.EMBED_ATTEMPT_TIMEOUT, deadline.remaining()),
+        )
+        result = _check(response)
+        self.latency.observe(time.perf_counter() - started)
+        self.breaker.record_success()
+        return result
+
+    def _post_hedged(self, session, payload, headers, deadline):
+        delay = self.hedge_delay()
+        if delay is None or delay >= deadline.remaining():
+            return self._send(session, payload, headers, deadline)
+        pool = _hedge_executor()
+        context = contextvars.copy_context()
+        first = pool.submit(context.run, self._send, session, payload, headers, deadline)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        second = pool.submit(
+            contextvars.copy_context().run, self._send, session, payload, headers, deadline
+        )
+        pending = {first: "first", second: "hedge"}
+        error = None
+        while pending:
+            done, _ = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                winner = pending.pop(future)
+                if future.exception() is None:
+                    # The slower request finishes in the background; its result is dropped
+                    EMBED_HEDGES.inc(winner)
+                    return future.result()
+                error = future.exception()
+        raise error or TimeoutError(f"Deadline exceeded calling {self.url}")
+
+    # ------------------------------------------------------------- async
+
+    async def post_async(self, client, payload, headers, deadline):
+        """post() for an httpx.AsyncClient; backoff yields the event loop"""
+        last_error = None
+        for attempt in range(Config.EMBED_MAX_ATTEMPTS):
+            self._admit(deadline)
+            try:
+                with _attempt(attempt):
+                    return await self._post_hedged_async(client, payload, headers, deadline)
+            except EndpointError:
+                self.breaker.record_success()
+                raise
+            except Exception as e:
+                last_error = e
+                self._failed(e, attempt)
+            backoff = _backoff(attempt, deadline)
+            if backoff is None:
+                break
+            await asyncio.sleep(backoff)
+        raise EmbeddingUnavailable(f"Embedding failed for {self.url}: {last_error}")
+
+    async def _send_async(self, client, payload, headers, deadline):
+        started = time.perf_counter()
+        timeout = min(Config.EMBED_ATTEMPT_TIMEOUT, deadline.remaining())
+        response = await asyncio.wait_for(
+            client.post(self.url, json=payload, headers=headers, timeout=timeout), timeout
+        )
+        result = _check(response)
+        self.latency.observe(time.perf_counter() - started)
+        self.breaker.record_success()
+        return result
+
+    async def _post_hedged_async(self, client, payload, headers, deadline):
+        delay = self.hedge_delay()
+        if delay is None or delay >= deadline.remaining():
+            return await self._send_async(client, payload, headers, deadline)
+        first = asyncio.ensure_future(self._send_async(client, payload, headers, deadline))
+        done, _ = await asyncio.wait([first], timeout=delay)
+        if done:
+            return first.result()
+        second = asyncio.ensure_future(self._send_async(client, payload, headers, deadline))
+        pending = {first: "first", second: "hedge"}
+        error = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for task in done:
+                    winner = pending.pop(task)
+                    if task.exception() is None:
+                        EMBED_HEDGES.inc(winner)
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error or TimeoutError(f"Deadline exceeded calling {self.url}")
+
+
+class EndpointPool:
+    """
+    Replicas of one embedding service behind a single post()/post_async().
+    Each attempt goes to the healthy replica with the fewest requests in
+    flight (EMBED_ROUTING=least_outstanding) or the lowest EWMA latency
+    scaled by requests in flight (ewma); a failed attempt moves on to
+    another replica before backing off. A replica leaves the pool while its
+    breaker is open, or for POOL_EJECT_SECONDS when its EWMA latency exceeds
+    POOL_SLOW_FACTOR times the fastest replica's. A background thread probes
+    /health every POOL_HEALTH_INTERVAL seconds to readmit recovered replicas
+    early and to catch dead ones before traffic does.
+    """
+
+    def __init__(self, members, routing=None):
+        self.members = list(members)
+        self.routing = routing or Config.EMBED_ROUTING
+        self._lock = threading.Lock()
+        self._prober_pid = None
+
+    def __len__(self):
+        return len(self.members)
+
+    def healthy(self):
+        now = time.monotonic()
+        return [m for m in self.members if self._eligible(m, now)]
+
+    def _eligible(self, member, now):
+        if member.ejected_until:
+            if now < member.ejected_until:
+                return False
+            self._readmit(member, "ejection expired")
+        return member.breaker.available()
+
+    def _load(self, member):
+        if self.routing == "ewma":
+            # Unmeasured replicas first, so each gets a latency estimate
+            return (member.latency.ewma or 0.0) * (member.outstanding + 1)
+        return (member.outstanding, member.latency.ewma or 0.0)
+
+    def _acquire(self, deadline, tried):
+        """Claim the least loaded healthy replica, preferring untried ones"""
+        if deadline.expired:
+            raise EmbeddingUnavailable("Deadline exceeded calling the embedding pool")
+        self.start()
+        with self._lock:
+            healthy = self.healthy()
+            candidates = [m for m in healthy if m not in tried] or healthy
+            for member in sorted(candidates, key=self._load):
+                if member.breaker.allow():
+                    member.outstanding += 1
+                    return member
+        EMBED_ERRORS.inc("circuit_open")
+        raise EmbeddingUnavailable("No healthy endpoint in the embedding pool")
+
+    def _release(self, member):
+        with self._lock:
+            member.outstanding -= 1
+
+    def _untried(self, tried):
+        return any(m not in tried for m in self.healthy())
+
+    def _succeeded(self, member):
+        """Eject member if it has become much slower than the fastest replica"""
+        if not Config.POOL_SLOW_FACTOR or len(member.latency) < MIN_LATENCY_SAMPLES:
+            return
+        with self._lock:
+            others = [
+                m.latency.ewma
+                for m in self.healthy()
+                if m is not member and len(m.latency) >= MIN_LATENCY_SAMPLES
+            ]
+            if others and member.latency.ewma > Config.POOL_SLOW_FACTOR * min(others):
+                member.ejected_until = time.monotonic() + Config.POOL_EJECT_SECONDS
+                POOL_EJECTIONS.inc(member.url, "slow")
+                logger.warning(
+                    f"Embedding replica {member.url} ejected as slow: "
+                    f"{member.latency.ewma * 1000:.0f}ms vs {min(others) * 1000:.0f}ms"
+                )
+
+    def _readmit(self, member, reason):
+        member.ejected_until = 0.0
+        # Old samples would get it ejected again on its first success
+        member.latency.reset()
+        logger.info(f"Embedding replica {member.url} readmitted ({reason})")
+
+    # -------------------------------------------------------------- sync
+
+    def post(self, session, payload, headers, deadline):
+        """EmbeddingEndpoint.post() across the pool's replicas"""
+        last_error = None
+        tried = set()
+        for attempt in range(Config.EMBED_MAX_ATTEMPTS):
+            member = self._acquire(deadline, tried)
+            tried.add(member)
+            try:
+                with _attempt(attempt):
+                    result = member._post_hedged(session, payload, headers, deadline)
+            except EndpointError:
+                member.breaker.record_success()
+                raise
+            except Exception as e:
+                last_error = e
+                member._failed(e, attempt)
+            else:
+                self._succeeded(member)
+                return result
+            finally:
+                self._release(member)
+            if self._untried(tried) and attempt + 1 < Config.EMBED_MAX_ATTEMPTS:
+                EMBED_RETRIES.inc()
+                continue  # Another replica, no need to wait
+            backoff = _backoff(attempt, deadline)
+            if backoff is None:
+                break
+            time.sleep(backoff)
+        raise EmbeddingUnavailable(f"Embedding failed on every replica: {last_error}")
+
+    # ------------------------------------------------------------- async
+
+    async def post_async(self, client, payload, headers, deadline):
+        """post() for an httpx.AsyncClient"""
+        last_error = None
+        tried = set()
+        for attempt in range(Config.EMBED_MAX_ATTEMPTS):
+            member = self._acquire(deadline, tried)
+            tried.add(member)
+            try:
+                with _attempt(attempt):
+                    result = await member._post_hedged_async(client, payload, headers, deadline)
+            except EndpointError:
+                member.breaker.record_success()
+                raise
+            except Exception as e:
+                last_error = e
+                member._failed(e, attempt)
+            else:
+                self._succeeded(member)
+                return result
+            finally:
+                self._release(member)
+            if self._untried(tried) and attempt + 1 < Config.EMBED_MAX_ATTEMPTS:
+                EMBED_RETRIES.inc()
+                continue
+            backoff = _backoff(attempt, deadline)
+            if backoff is None:
+                break
+            await asyncio.sleep(backoff)
+        raise EmbeddingUnavailable(f"Embedding failed on every replica: {last_error}")
+
+    # ------------------------------------------------------- health probes
+
+    def probe(self, timeout=2.0):
+        """
+        GET every replica's health URL once: a failure counts against a
+        healthy replica's breaker, a success readmits an ejected or open one.
+        """
+        import requests
+
+        for member in self.members:
+            if not member.health_url:
+                continue
+            try:
+                ok = requests.get(member.health_url, timeout=timeout).status_code == 200
+            except requests.RequestException:
+                ok = False
+            out = member.ejected_until > time.monotonic() or member.breaker.state != CLOSED
+            if ok and out:
+                with self._lock:
+                    self._readmit(member, "health probe")
+                member.breaker.record_success()
+            elif not ok and not out:
+                member.breaker.record_failure()
+
+    def start(self):
+        """Probe in the background (pools of several replicas, once per process)"""
+        interval = Config.POOL_HEALTH_INTERVAL
+        if len(self.members) < 2 or not interval or self._prober_pid == os.getpid():
+            return
+        self._prober_pid = os.getpid()
+        threading.Thread(
+            target=self._probe_forever, args=(interval,), name="embed-health", daemon=True
+        ).start()
+
+    def _probe_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.probe()
+            except Exception as e:
+                logger.warning(f"Embedding health probe failed: {e}")
+
+
+_endpoints = {}
+_pools = {}
+_endpoints_lock = threading.Lock()
+
+
+def endpoint(url, health_url=None):
+    """The process-wide EmbeddingEndpoint (breaker, latency history) for url"""
+    with _endpoints_lock:
+        client = _endpoints.get(url)
+        if client is None:
+            client = _endpoints[url] = EmbeddingEndpoint(url, health_url)
+        elif health_url and client.health_url is None:
+            client.health_url = health_url
+        return client
+
+
+def space_pool(bases):
+    """The process-wide EndpointPool over HF Space base URLs (/embed, /health)"""
+    key = tuple(base.rstrip("/") for base in bases)
+    with _endpoints_lock:
+        pool = _pools.get(key)
+    if pool is None:
+        members = [endpoint(f"{base}/embed", f"{base}/health") for base in key]
+        with _endpoints_lock:
+            pool = _pools.setdefault(key, EndpointPool(members))
+    return pool
+
+
+REGISTRY.register(
+    Gauge(
+        "recommender_breakers_open",
+        "Embedding endpoints whose circuit breaker is open",
+        lambda: sum(e.breaker.state == OPEN for e in list(_endpoints.values())),
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "recommender_pool_healthy_endpoints",
+        "Embedding replicas currently taking traffic, over all pools",
+        lambda: sum(len(p.healthy()) for p in list(_pools.values())),
+    )
+)
@@ -0,0 +1,246 @@
+"""
+Query encoder backends for MovieBERTProcessor.encode: the remote embedding
+Space, the sentence model exported to ONNX and run in-process (optionally
+int8), and a fallback chain over several of them (Config.ENCODER_BACKENDS).
+"""
+
+import asyncio
+import json
+import logging
+import os
+
+import numpy as np
+
+from config import Config
+from metrics import REGISTRY, Counter, stage
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "encoder.json"
+TOKENIZER = "tokenizer.json"
+MODEL = "model.onnx"
+QUANTIZED_MODEL = "model_int8.onnx"
+
+ENCODER_FALLBACKS = REGISTRY.register(
+    Counter(
+        "recommender_encoder_fallbacks_total",
+        "Encodes passed on to the next backend after this one failed",
+        ("backend",),
+    )
+)
+
+
+class RemoteEncoder:
+    """Embeddings from the HF Space replicas (embedding_client), PCA applied here"""
+
+    name = "remote"
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    def encode(self, texts, deadline=None):
+        if not Config.HF_SPACE_ENDPOINT:
+            raise RuntimeError("HF_SPACE_ENDPOINT is not set; external embeddings unavailable")
+        logger.info(
+            "External encode start",
+            extra={"endpoint": Config.HF_SPACE_ENDPOINT, "count": len(texts)},
+        )
+        return self.processor._encode_external(texts, deadline)
+
+    async def encode_async(self, texts, client, deadline=None):
+        if not Config.HF_SPACE_ENDPOINT:
+            raise RuntimeError("HF_SPACE_ENDPOINT is not set; external embeddings unavailable")
+        return await self.processor._encode_external_async(texts, client, deadline)
+
+
+class OnnxEncoder:
+    """
+    The sentence model exported by export_onnx(), run with onnxruntime.
+    The graph does mean pooling and L2 normalization, and when exported
+    with the artifact's PCA also the projection, so one session.run returns
+    index-dimension vectors. Unfused exports get the PCA applied after.
+    """
+
+    name = "local"
+
+    def __init__(self, directory, projection=None, quantized=None, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        quantized = Config.LOCAL_ENCODER_INT8 if quantized is None else quantized
+        if quantized and not manifest.get("quantized"):
+            raise ValueError(f"No int8 model in {directory}; export without --no-int8")
+        model_file = manifest["quantized"] if quantized else manifest["model"]
+
+        fused = manifest.get("pca_fingerprint")
+        if fused is not None and (projection is None or projection.fingerprint() != fused):
+            raise ValueError(
+                f"The ONNX encoder in {directory} has a different PCA fused in than "
+                "the loaded embeddings; re-export it for this artifact"
+            )
+        # Fused exports already end in the projection
+        self.projection = None if fused is not None else projection
+        self.quantized = quantized
+        self.dims = manifest["dims"]
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = Config.LOCAL_ENCODER_THREADS if threads is None else threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(directory, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, TOKENIZER))
+        self.tokenizer.enable_truncation(manifest["max_length"])
+        self.tokenizer.enable_padding(pad_id=manifest["pad_id"])
+        logger.info(
+            f"Local ONNX encoder loaded from {directory} ({model_file}, {self.dims}D, "
+            f"PCA {'fused' if fused else 'after' if projection is not None else 'none'})"
+        )
+
+    def _feeds(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        return feeds
+
+    def encode(self, texts, deadline=None):
+        with stage("encode"):
+            vectors = self.session.run(None, self._feeds(texts))[0]
+        if self.projection is not None:
+            with stage("pca"):
+                vectors = self.projection.transform(vectors)
+        return np.asarray(vectors, dtype=np.float32)
+
+    async def encode_async(self, texts, client=None, deadline=None):
+        # CPU-bound: keep the event loop free (to_thread carries the request context)
+        return await asyncio.to_thread(self.encode, texts, deadline)
+
+
+class FallbackEncoder:
+    """Backends tried in order; a failure moves the encode on to the next one"""
+
+    def __init__(self, backends):
+        self.backends = list(backends)
+        self.name = ",".join(backend.name for backend in self.backends)
+
+    def encode(self, texts, deadline=None):
+        for backend in self.backends[:-1]:
+            try:
+                return backend.encode(texts, deadline)
+            except Exception as e:
+                self._failed(backend, e)
+        return self.backends[-1].encode(texts, deadline)
+
+    async def encode_async(self, texts, client, deadline=None):
+        for backend in self.backends[:-1]:
+            try:
+                return await backend.encode_async(texts, client, deadline)
+            except Exception as e:
+                self._failed(backend, e)
+        return await self.backends[-1].encode_async(texts, client, deadline)
+
+    @staticmethod
+    def _failed(backend, error):
+        ENCODER_FALLBACKS.inc(backend.name)
+        logger.warning(f"Encoder backend {backend.name} failed ({error}); trying the next")
+
+
+def build_encoder(processor, names=None):
+    """
+    The encoder for processor from Config.ENCODER_BACKENDS (e.g. "local,remote").
+    Backends that cannot load (missing onnxruntime or model, PCA mismatch)
+    are skipped with a warning; RuntimeError when none can.
+    """
+    names = names or [n.strip() for n in Config.ENCODER_BACKENDS.split(",") if n.strip()]
+    backends = []
+    for name in names:
+        try:
+            if name == "remote":
+                backends.append(RemoteEncoder(processor))
+            elif name == "local":
+                backends.append(OnnxEncoder(Config.LOCAL_ENCODER_PATH, processor.pca))
+            else:
+                raise ValueError("unknown backend (expected local or remote)")
+        except (ImportError, OSError, ValueError) as e:
+            logger.warning(f"Encoder backend {name} unavailable: {e}")
+    if not backends:
+        raise RuntimeError(f"No encoder backend available from {','.join(names)}")
+    return backends[0] if len(backends) == 1 else FallbackEncoder(backends)
+
+
+def export_onnx(model, tokenizer, directory, projection=None, quantize=True, max_length=128):
+    """
+    Export a transformers encoder and its fast tokenizer to directory for
+    OnnxEncoder: mean pooling, L2 normalization and (when given) the
+    PCAProjection become part of the graph. quantize also writes a
+    dynamically quantized int8 copy. Needs torch and onnxruntime.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    class SentenceEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+            if projection is not None:
+                self.register_buffer("weights", torch.from_numpy(projection.weights))
+                self.register_buffer("bias", torch.from_numpy(projection.bias))
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            hidden = self.model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            )[0]
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+            if projection is not None:
+                pooled = pooled @ self.weights - self.bias
+            return pooled
+
+    os.makedirs(directory, exist_ok=True)
+    model.eval()
+    sample = tokenizer(["a sample query", "another"], padding=True, return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    axes = {name: {0: "batch", 1: "tokens"} for name in names}
+    axes["embedding"] = {0: "batch"}
+    model_path = os.path.join(directory, MODEL)
+    with torch.no_grad():
+        torch.onnx.export(
+            # eval(): the exporter restores the wrapper's mode afterwards, and a
+            # fresh Module would leave the caller's model in training mode
+            SentenceEncoder().eval(),
+            tuple(sample[name] for name in names),
+            model_path,
+            input_names=names,
+            output_names=["embedding"],
+            dynamic_axes=axes,
+            opset_version=17,
+            dynamo=False,
+        )
+    manifest = {
+        "model": MODEL,
+        "quantized": None,
+        "dims": projection.n_components_ if projection is not None else model.config.hidden_size,
+        "max_length": max_length,
+        "pad_id": tokenizer.pad_token_id or 0,
+        "source": getattr(model.config, "_name_or_path", ""),
+        "pca_fingerprint": projection.fingerprint() if projection is not None else None,
+    }
+    if quantize:
+        quantize_dynamic(
+            model_path, os.path.join(directory, QUANTIZED_MODEL), weight_type=QuantType.QInt8
+        )
+        manifest["quantized"] = QUANTIZED_MODEL
+    tokenizer.backend_tokenizer.save(os.path.join(directory, TOKENIZER))
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -0,0 +1,187 @@
+"""Live engine holder with background rebuilds and atomic version swaps."""
+
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import artifacts
+
+logger = logging.getLogger(__name__)
+
+
+class _EngineVersion:
+    def __init__(self, engine, version):
+        self.engine = engine
+        self.version = version
+        self.in_flight = 0
+        self.loaded_at = time.time()
+
+
+class EngineManager:
+    """
+    Owns the live recommendation engine.
+
+    Requests take the engine through acquire(), which pins the version they
+    started on. reload() builds a complete new engine in a background thread
+    (factory(artifact_dir)) and swaps the live reference under a lock, so
+    in-flight requests finish on the old version. Retired versions are closed
+    and dropped as soon as their last request finishes.
+
+    Each gunicorn worker has its own manager, so reload() only swaps the
+    calling process. publish() is the multi-worker path: it moves CURRENT,
+    and every worker's watcher (watch_interval > 0) picks the version up.
+    """
+
+    def __init__(self, factory, artifact_root=None, watch_interval=0):
+        self._factory = factory
+        self._root = artifact_root
+        self._watch_interval = watch_interval
+        self._lock = threading.Lock()
+        self._first_build_lock = threading.Lock()
+        self._live = None
+        self._retired = []
+        self._reload_thread = None
+        self._last_error = None
+        self._failed_version = None
+        self._watcher_pid = None
+
+    # ------------------------------------------------------------ lifecycle
+
+    def _build(self, version):
+        directory = artifacts.version_dir(version, self._root) if version else None
+        started = time.perf_counter()
+        engine = self._factory(directory)
+        logger.info(
+            f"Built engine for artifact {version or 'legacy pickle'} "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return _EngineVersion(engine, version)
+
+    def current(self, watch=True):
+        """
+        The live engine, building the published version on first use.
+        watch=False skips starting the CURRENT watcher, for a gunicorn master
+        that preloads and forks but never serves.
+        """
+        if watch:
+            self.start_watcher()
+        if self._live is None:
+            # Built outside _lock so status() is not stuck behind the build
+            with self._first_build_lock:
+                if self._live is None:
+                    entry = self._build(artifacts.current_version(self._root))
+                    with self._lock:
+                        if self._live is None:  # Unless a reload got there first
+                            self._live = entry
+        return self._live.engine
+
+    @property
+    def loaded(self):
+        return self._live is not None
+
+    @contextmanager
+    def acquire(self):
+        """Pin the live engine version for the duration of a request."""
+        self.current()
+        with self._lock:
+            entry = self._live
+            entry.in_flight += 1
+        try:
+            yield entry.engine
+        finally:
+            with self._lock:
+                entry.in_flight -= 1
+                self._release_drained()
+
+    def _release_drained(self):
+        """Close retired versions with no requests left (lock held)."""
+        drained = [e for e in self._retired if e.in_flight == 0]
+        for entry in drained:
+            self._retired.remove(entry)
+            close = getattr(entry.engine, "close", None)
+            if close is not None:
+                close()
+            logger.info(f"Released drained engine version {entry.version}")
+            entry.engine = None
+        if drained:
+            gc.collect()
+
+    def reload(self, version=None, wait=False):
+        """
+        Rebuild the engine for version (default: CURRENT) in the background
+        and swap it in. Returns False if a reload is already running.
+        """
+        with self._lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return False
+            self._reload_thread = threading.Thread(
+                target=self._reload, args=(version,), name="engine-reload", daemon=True
+            )
+            self._reload_thread.start()
+            thread = self._reload_thread
+        if wait:
+            thread.join()
+        return True
+
+    def publish(self, version, wait=False):
+        """
+        Make version the published one for every worker: CURRENT is moved
+        (ValueError for an unknown version) and this process reloads now;
+        the others follow through their CURRENT watcher.
+        """
+        artifacts.publish_version(version, self._root)
+        return self.reload(version, wait=wait)
+
+    def _reload(self, version):
+        version = version or artifacts.current_version(self._root)
+        try:
+            entry = self._build(version)
+        except Exception as e:
+            self._last_error = f"{type(e).__name__}: {e}"
+            self._failed_version = version
+            logger.error(f"Reload of artifact {version} failed, keeping live version: {e}")
+            return
+        with self._lock:
+            old, self._live = self._live, entry
+            self._last_error = None
+            if old is not None:
+                self._retired.append(old)
+                self._release_drained()
+        logger.info(f"Swapped live engine to artifact {version}")
+
+    # -------------------------------------------------------------- watching
+
+    def start_watcher(self):
+        """Poll CURRENT for new versions (one watcher per process, post-fork safe)."""
+        if not self._watch_interval or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name="artifact-watch", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self._watch_interval)
+            try:
+                version = artifacts.current_version(self._root)
+                live = self._live.version if self._live is not None else None
+                if version and version not in (live, self._failed_version):
+                    logger.info(f"Artifact CURRENT changed to {version}; reloading")
+                    self.reload(version)
+            except Exception as e:
+                logger.warning(f"Artifact watch failed: {e}")
+
+    def status(self):
+        with self._lock:
+            return {
+                "live_version": self._live.version if self._live else None,
+                "live_in_flight": self._live.in_flight if self._live else 0,
+                "retired": [
+                    {"version": e.version, "in_flight": e.in_flight} for e in self._retired
+                ],
+                "reloading": bool(self._reload_thread and self._reload_thread.is_alive()),
+                "published_version": artifacts.current_version(self._root),
+                "last_error": self._last_error,
+            }
@@ -1,10 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from rec_engine import MovieRecommendationEngine
-from bert_processor import MovieBERTProcessor
 from config import Config
+from serving import (
+    admin_token_valid,
+    admission,
+    capture_memory_diff,
+    degraded_results,
+    engine_manager,
+    get_engine,
+    log_memory,
+    normalize,
+    preload_engine,
+    query_flights,
+    recent_results,
+    request_filters,
+    response_format,
+    start_warmup,
+    warmup,
+)
+from admission import DEGRADED_HEADER, RETRY_AFTER_HEADER, Overloaded
+from embedding_client import EmbeddingUnavailable
+from results import encode_results
+import metrics
+import profiling
+import tracing
+from singleflight import flight_key
 import logging
-import numpy as np
+import os
+import threading
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -20,72 +44,81 @@ CORS(
     methods=["GET", "POST", "OPTIONS"],
 )
 
-# Global variables for caching
-engine = None
 
+@app.before_request
+def _start_timing():
+    g.request_started = time.perf_counter()
+    g.timings = metrics.start_request()
+    forced = request.headers.get(profiling.PROFILE_HEADER) == "1"
+    forced = forced and _admin_authorized()
+    g.profiler = (
+        profiling.start_profile([threading.get_ident()])
+        if profiling.should_profile(forced)
+        else None
+    )
+    g.trace = tracing.start_trace(
+        "request",
+        trace_id=request.headers.get(tracing.TRACE_HEADER),
+        route=request.url_rule.rule if request.url_rule else "unmatched",
+        method=request.method,
+    )
 
-def log_memory(stage=""):
-    """Log current memory usage"""
-    try:
-        import psutil
-        import os
 
-        process = psutil.Process(os.getpid())
-        mem_mb = process.memory_info().rss / 1024 / 1024
-        logger.info(f"Memory at {stage}: {mem_mb:.2f} MB")
-        return mem_mb
-    except ImportError:
-        return None
+@app.after_request
+def _finish_timing(response):
+    started = getattr(g, "request_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    trace = g.trace
+    if tracing.finish_trace(trace, status=response.status_code):
+        response.headers[tracing.TRACE_HEADER] = trace.trace.trace_id
+    if Config.METRICS_ENABLED:
+        metrics.finish_request(route, response.status_code, elapsed)
+        timing = metrics.server_timing(g.timings)
+        total = f"total;dur={elapsed * 1000:.2f}"
+        response.headers["Server-Timing"] = f"{timing}, {total}" if timing else total
+    if g.profiler is not None:
+        path = profiling.finish_profile(g.profiler, route)
+        if path:
+            response.headers["X-Profile-File"] = os.path.basename(path)
+    return response
 
 
-def get_engine():
-    """Get or create the recommendation engine (lazy loading for fast startup)"""
-    global engine
-    if engine is None:
-        try:
-            log_memory("before engine init")
-            logger.info("Initializing recommendation engine...")
-            # Use lazy_load=True for fast startup and health check pass
-            bert_processor = MovieBERTProcessor(lazy_load=True)
-            log_memory("after bert_processor init")
-            logger.info(
-                "Recommendation engine initialized (external embeddings enabled)"
-            )
-            engine = MovieRecommendationEngine(bert_processor, use_imdb=False)
-            logger.info("Engine ready")
-            log_memory("startup complete")
-        except Exception as e:
-            logger.error(f"Failed to initialize recommendation engine: {e}")
-            raise
-    return engine
-
-
-def _to_native(value):
-    """Convert numpy/pandas scalar types to native Python types for JSON serialization."""
-    if isinstance(value, (np.integer,)):
-        return int(value)
-    if isinstance(value, (np.floating,)):
-        return float(value)
-    if isinstance(value, (np.bool_,)):
-        return bool(value)
-    if value is None:
-        return None
-    try:
-        # Handle NaN
-        if np.isnan(value):
-            return None
-    except Exception:
-        pass
-    return value
+def _admin_authorized():
+    """Admin token from X-Admin-Token or an Authorization: Bearer header"""
+    token = request.headers.get("X-Admin-Token", "")
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        token = token or auth[len("Bearer ") :]
+    return admin_token_valid(token)
+
+
+def _overloaded(error):
+    """503 for a request admission control refused, with Retry-After"""
+    response = jsonify({"error": str(error), "reason": error.reason})
+    response.status_code = 503
+    response.headers[RETRY_AFTER_HEADER] = str(error.retry_after)
+    return response
 
 
-def _normalize(obj):
-    """Recursively normalize dicts/lists to be JSON serializable."""
-    if isinstance(obj, dict):
-        return {k: _normalize(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_normalize(v) for v in obj]
-    return _to_native(obj)
+def _embedding_unavailable(error):
+    """503 for a query the embedding backend could not encode, with Retry-After"""
+    response = jsonify({"error": str(error), "reason": "embedding_unavailable"})
+    response.status_code = 503
+    response.headers[RETRY_AFTER_HEADER] = str(max(1, int(Config.BREAKER_RESET_TIMEOUT)))
+    return response
+
+
+def _request_filters(data=None):
+    """Read structured filters from a JSON body ("filters") or query params."""
+    return request_filters(data, request.args)
+
+
+def _response_format(requested=None):
+    """Requested "format", else MessagePack when the client accepts it"""
+    return response_format(requested, request.headers.get("Accept", ""))
 
 
 @app.route("/", methods=["GET"])
@@ -98,9 +131,12 @@ def index():
             "version": "1.0",
             "endpoints": {
                 "health": "/api/health",
+                "ready": "/api/ready",
                 "recommendations": "/api/recommendations/query",
                 "similar": "/api/recommendations/similar",
                 "search": "/api/search",
+                "facets": "/api/facets",
+                "autocomplete": "/api/autocomplete",
             },
         }
     )
@@ -112,6 +148,15 @@ def health_check():
     return jsonify({"status": "healthy", "imdb_available": Config.validate_config()})
 
 
+@app.route("/api/ready", methods=["GET"])
+def readiness_check():
+    """Readiness: 200 once warm-up has loaded and warmed the engine, else 503"""
+    # Starts warm-up on servers that never called start_warmup()
+    warmup.start()
+    status = warmup.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
 @app.route("/api/recommendations/query", methods=["GET", "POST"])
 def get_recommendations_by_query():
     """Get recommendations based on natural language query.
@@ -120,13 +165,17 @@ def get_recommendations_by_query():
     """
     try:
         logger.info("Received recommendation query request")
+        parse_started = time.perf_counter()
 
         query = ""
         top_k = 8
 
         if request.method == "GET":
+            data = None
             query = (request.args.get("query", "") or "").strip()
             top_k = request.args.get("top_k", 8)
+            mode = request.args.get("mode")
+            requested_format = request.args.get("format")
         else:  # POST
             data = request.get_json(silent=True) or {}
             if not data:
@@ -134,44 +183,72 @@ def get_recommendations_by_query():
                 data = request.form or {}
             query = (data.get("query", "") or "").strip()
             top_k = data.get("top_k", 8)
+            mode = data.get("mode")
+            requested_format = data.get("format")
 
         try:
             top_k = int(top_k)
         except Exception:
             return jsonify({"error": "top_k must be an integer"}), 400
 
+        try:
+            filters = _request_filters(data)
+            fmt = _response_format(requested_format)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         logger.info(f"Query: {query}, Top K: {top_k}")
 
         if not query:
             return jsonify({"error": "Query is required"}), 400
         if top_k <= 0:
             return jsonify({"error": "top_k must be positive"}), 400
-
-        logger.info("Getting engine...")
-        engine = get_engine()
-        logger.info("Engine ready")
-
-        # Load embeddings only on first recommendation (lazy load to save startup memory)
-        if engine.bert_processor.movie_embeddings is None:
-            log_memory("before loading embeddings metadata")
-            logger.info("Loading embeddings...")
-            engine.bert_processor.load_embeddings()
-            log_memory("after loading metadata")
+        metrics.record("parse", time.perf_counter() - parse_started)
 
         # Use local recommendations only (IMDb disabled per request)
         logger.info("Encoding query and finding recommendations...")
         log_memory("before encoding query")
-        recommendations = engine.recommend_by_query(query, top_k)
+
+        def compute():
+            with engine_manager.acquire() as engine:
+                return engine.recommend_by_query(
+                    query, top_k, filters, mode, columnar=True
+                )
+
+        key = flight_key(query, top_k, filters, mode or Config.RETRIEVAL_MODE)
+        degraded = None
+        try:
+            with admission.admit():
+                if Config.SINGLE_FLIGHT:
+                    # Identical concurrent queries share one encode and scan
+                    recommendations = query_flights.do(key, compute)
+                else:
+                    recommendations = compute()
+            recent_results.put(key, recommendations)
+        except Overloaded as e:
+            degraded = degraded_results(key, top_k, filters)
+            if degraded is None:
+                return _overloaded(e)
+            degraded, recommendations = degraded
+        except EmbeddingUnavailable as e:
+            # Breaker open, deadline spent or every replica down, with no
+            # BM25 fallback: answer like a refused request
+            degraded = degraded_results(key, top_k, filters)
+            if degraded is None:
+                return _embedding_unavailable(e)
+            degraded, recommendations = degraded
+        except ValueError as e:
+            # Unknown genre names in filters or retrieval mode
+            return jsonify({"error": str(e)}), 400
         log_memory("after recommendations complete")
         logger.info(f"Found {len(recommendations)} recommendations")
 
-        return jsonify(
-            {
-                "success": True,
-                "recommendations": _normalize(recommendations),
-                "count": len(recommendations),
-            }
-        )
+        with metrics.stage("serialization"):
+            body, content_type = encode_results(recommendations, "recommendations", fmt)
+        response = Response(body, mimetype=content_type)
+        if degraded:
+            response.headers[DEGRADED_HEADER] = degraded
+        return response
 
     except Exception as e:
         logger.error(f"Error in query recommendations: {e}", exc_info=True)
@@ -191,22 +268,34 @@ def get_similar_movies():
         if not movie_id:
             return jsonify({"error": "Movie ID is required"}), 400
 
-        logger.info("Getting engine...")
-        engine = get_engine()
-        logger.info("Engine ready")
-
         # Use local recommendations only (IMDb disabled per request)
         logger.info(f"Finding similar movies...")
-        recommendations = engine.recommend_similar_movies(movie_id, top_k)
+        key = ("similar", movie_id, top_k)
+        degraded = None
+        try:
+            with admission.admit():
+                with engine_manager.acquire() as engine:
+                    recommendations = normalize(
+                        engine.recommend_similar_movies(movie_id, top_k)
+                    )
+            recent_results.put(key, recommendations)
+        except Overloaded as e:
+            degraded = degraded_results(key)
+            if degraded is None:
+                return _overloaded(e)
+            degraded, recommendations = degraded
         logger.info(f"Found {len(recommendations)} similar movies")
 
-        return jsonify(
+        response = jsonify(
             {
                 "success": True,
-                "recommendations": _normalize(recommendations),
+                "recommendations": recommendations,
                 "count": len(recommendations),
             }
         )
+        if degraded:
+            response.headers[DEGRADED_HEADER] = degraded
+        return response
 
     except Exception as e:
         logger.exception(f"Error in similar movies: {e}")
@@ -224,20 +313,118 @@ def search_movies():
         if not search_term:
             return jsonify({"error": "Search term is required"}), 400
 
-        engine = get_engine()
-
         # Use local search only (IMDb disabled per request)
-        results = engine.search_movies(search_term, top_k)
+        try:
+            filters = _request_filters(data)
+            fmt = _response_format(data.get("format"))
+            with engine_manager.acquire() as engine:
+                results = engine.search_movies(
+                    search_term, top_k, filters, mode=data.get("mode"), columnar=True
+                )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        with metrics.stage("serialization"):
+            body, content_type = encode_results(results, "movies", fmt)
+        return Response(body, mimetype=content_type)
+
+    except Exception as e:
+        logger.error(f"Error in movie search: {e}")
+        return jsonify({"error": str(e)}), 500
 
+
+@app.route("/api/autocomplete", methods=["GET"])
+def autocomplete():
+    """Title suggestions for a typed prefix, most-rated first"""
+    try:
+        prefix = (request.args.get("q", "") or "").strip()
+        try:
+            limit = int(request.args.get("limit", 8))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        if not prefix:
+            return jsonify({"success": True, "suggestions": [], "count": 0})
+
+        with engine_manager.acquire() as engine:
+            suggestions = engine.autocomplete(prefix, max(1, min(limit, 50)))
         return jsonify(
-            {"success": True, "movies": _normalize(results), "count": len(results)}
+            {
+                "success": True,
+                "suggestions": suggestions,
+                "count": len(suggestions),
+            }
         )
 
     except Exception as e:
-        logger.error(f"Error in movie search: {e}")
+        logger.error(f"Error in autocomplete: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/facets", methods=["GET", "POST"])
+def get_facets():
+    """Genre and decade counts for the movies matching the given filters"""
+    try:
+        data = request.get_json(silent=True) if request.method == "POST" else None
+        try:
+            with engine_manager.acquire() as engine:
+                facets = engine.facet_counts(_request_filters(data))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"success": True, "facets": facets})
+
+    except Exception as e:
+        logger.error(f"Error computing facets: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus text exposition of latency histograms and counters"""
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+
+@app.route("/api/admin/reload", methods=["POST"])
+def reload_artifacts():
+    """
+    Publish an artifact version (default: reload CURRENT) and swap it in.
+    Other workers follow the CURRENT change through their artifact watcher.
+    """
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    data = request.get_json(silent=True) or {}
+    wait = bool(data.get("wait"))
+    try:
+        if data.get("version"):
+            started = engine_manager.publish(data["version"], wait=wait)
+        else:
+            started = engine_manager.reload(wait=wait)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    status = engine_manager.status()
+    if not started:
+        return jsonify({"error": "Reload already in progress", **status}), 409
+    return jsonify({"success": True, **status}), 202
+
+
+@app.route("/api/admin/memory-diff", methods=["POST"])
+def memory_diff():
+    """tracemalloc allocation diff around one query or engine load"""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        return jsonify(capture_memory_diff(request.get_json(silent=True) or {}))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/api/admin/artifacts", methods=["GET"])
+def artifact_status():
+    """Live/retired artifact versions and in-flight request counts"""
+    if not _admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(engine_manager.status())
+
+
 @app.route("/api/imdb/search", methods=["POST"])
 def search_imdb_movies():
     return jsonify({"error": "IMDB features disabled"}), 400
@@ -263,5 +450,6 @@ if __name__ == "__main__":
     if not Config.validate_config():
         logger.warning("IMDB API key not configured. Some features will be disabled.")
 
+    start_warmup()
     # Use debug=False for production-like behavior, avoiding reload issues
     app.run(debug=False, host="0.0.0.0", port=5000, use_reloader=False)
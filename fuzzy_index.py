@@ -0,0 +1,185 @@
+"""Typo-tolerant title lookup using a symmetric-delete index over title tokens."""
+
+import logging
+from itertools import combinations
+
+import numpy as np
+
+from title_index import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+def max_edits(token):
+    """Edit budget for a token: short words must match exactly."""
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 5:
+        return 1
+    return 2
+
+
+def deletes(token, distance):
+    """All strings obtained by deleting up to distance characters."""
+    variants = {token}
+    for d in range(1, min(distance, len(token) - 1) + 1):
+        for positions in combinations(range(len(token)), d):
+            variants.add("".join(c for i, c in enumerate(token) if i not in positions))
+    return variants
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (
+                prev2 is not None
+                and i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class FuzzyTitleIndex:
+    """
+    Edit-distance title matcher built once at load time.
+
+    Every distinct title token is expanded into its deletion variants (up to
+    max_edits(token)); the variants are stored as a sorted array of string
+    hashes with the owning token id alongside. A query token is expanded the
+    same way, candidate tokens are found by binary search and verified with a
+    real edit distance, so no query scans the title list. Hashes are
+    process-local (built per process), and collisions are harmless because
+    every candidate is verified.
+    """
+
+    def __init__(self, titles, popularity=None):
+        titles = [normalize_text(t) for t in titles]
+        n = len(titles)
+        if popularity is None:
+            popularity = np.zeros(n)
+        popularity = np.nan_to_num(np.asarray(popularity, dtype=np.float64))
+        self.rows_by_rank = np.argsort(-popularity, kind="stable").astype(np.int32)
+        self.size = n
+
+        token_ids = {}
+        token_ranks = []
+        for rank, row in enumerate(self.rows_by_rank):
+            for token in set(titles[row].split()):
+                tid = token_ids.setdefault(token, len(token_ids))
+                if tid == len(token_ranks):
+                    token_ranks.append([])
+                token_ranks[tid].append(rank)
+        self.tokens = list(token_ids)
+
+        # Token -> title ranks in CSR form (ranks ascending = most popular first)
+        lengths = np.fromiter((len(r) for r in token_ranks), dtype=np.int64)
+        self.indptr = np.concatenate(([0], np.cumsum(lengths)))
+        self.ranks = (
+            np.concatenate([np.asarray(r, dtype=np.int32) for r in token_ranks])
+            if token_ranks
+            else np.empty(0, dtype=np.int32)
+        )
+
+        hashes, owners = [], []
+        for tid, token in enumerate(self.tokens):
+            for variant in deletes(token, max_edits(token)):
+                hashes.append(hash(variant))
+                owners.append(tid)
+        order = np.argsort(np.asarray(hashes, dtype=np.int64), kind="stable")
+        self.delete_hashes = np.asarray(hashes, dtype=np.int64)[order]
+        self.delete_owners = np.asarray(owners, dtype=np.int32)[order]
+
+        logger.info(
+            f"Fuzzy title index built: {len(self.tokens)} tokens, "
+            f"{len(self.delete_hashes)} deletion variants"
+        )
+
+    @classmethod
+    def from_movies(cls, movies_df):
+        popularity = (
+            movies_df["rating_count"] if "rating_count" in movies_df.columns else None
+        )
+        return cls(movies_df["clean_title"].tolist(), popularity)
+
+    def similar_tokens(self, term):
+        """Map token id -> edit distance for index tokens close to term."""
+        budget = max_edits(term)
+        hashes = np.fromiter((hash(v) for v in deletes(term, budget)), dtype=np.int64)
+        lo = np.searchsorted(self.delete_hashes, hashes, "left")
+        hi = np.searchsorted(self.delete_hashes, hashes, "right")
+        candidates = set()
+        for start, stop in zip(lo, hi):
+            candidates.update(self.delete_owners[start:stop].tolist())
+
+        matches = {}
+        for tid in candidates:
+            token = self.tokens[tid]
+            limit = min(budget, max_edits(token)) if token != term else 0
+            distance = edit_distance(term, token, limit)
+            if distance <= limit:
+                matches[tid] = distance
+        return matches
+
+    def search(self, text, limit=20, mask=None):
+        """
+        Row indices of titles matching text within the edit budget.
+
+        Titles are ranked by number of query words matched, then total edit
+        distance, then popularity. At least half of the query words must match.
+        """
+        terms = normalize_text(text).split()
+        if not terms:
+            return np.empty(0, dtype=np.int32)
+
+        all_ranks, all_dists = [], []
+        for term in terms:
+            similar = self.similar_tokens(term)
+            if not similar:
+                continue
+            ranks = np.concatenate(
+                [self.ranks[self.indptr[t] : self.indptr[t + 1]] for t in similar]
+            )
+            dists = np.repeat(
+                np.fromiter(similar.values(), dtype=np.int32),
+                [self.indptr[t + 1] - self.indptr[t] for t in similar],
+            )
+            # Keep each title's closest match for this query word
+            order = np.lexsort((dists, ranks))
+            ranks, dists = ranks[order], dists[order]
+            first = np.concatenate(([True], ranks[1:] != ranks[:-1]))
+            all_ranks.append(ranks[first])
+            all_dists.append(dists[first])
+        if not all_ranks:
+            return np.empty(0, dtype=np.int32)
+
+        ranks, inverse, matched = np.unique(
+            np.concatenate(all_ranks), return_inverse=True, return_counts=True
+        )
+        distance = np.bincount(inverse, weights=np.concatenate(all_dists))
+        keep = matched >= (len(terms) + 1) // 2
+        ranks, matched, distance = ranks[keep], matched[keep], distance[keep]
+        ordered = ranks[np.lexsort((ranks, distance, -matched))]
+
+        rows = []
+        for rank in ordered:
+            row = self.rows_by_rank[rank]
+            if mask is not None and not mask[row]:
+                continue
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+        return np.asarray(rows, dtype=np.int32)
@@ -0,0 +1,64 @@
+"""
+Gunicorn settings for flask_api.
+
+With PRELOAD_ENGINE (default on) the master imports the app and builds the
+recommendation engine, movie metadata, indexes and embedding matrix once,
+before forking. Workers then share those pages instead of each loading its
+own copy, so WEB_CONCURRENCY can follow the core count without multiplying
+RSS. Use scripts/measure_worker_memory.py to check per-worker unique memory.
+
+Workers are gthread by default, with enough threads for admission control's
+running requests, its queue and one more to answer refusals with a 503;
+a sync worker would hold everything else in the listen backlog instead, and
+single-flight would never see two identical requests at once. The heartbeat
+runs apart from request threads, so the timeout only has to cover a stuck
+worker, not a slow engine build or embedding call.
+"""
+
+import gc
+import os
+
+from config import Config
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(
+    os.getenv(
+        "GUNICORN_THREADS", Config.ADMISSION_MAX_CONCURRENCY + Config.ADMISSION_MAX_QUEUE + 1
+    )
+)
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+max_requests = 100
+max_requests_jitter = 10
+preload_app = os.getenv("PRELOAD_ENGINE", "true").lower() == "true"
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before workers fork."""
+    if not preload_app:
+        return
+    import flask_api
+
+    try:
+        flask_api.preload_engine()
+    except Exception as e:
+        # Workers fall back to lazy per-process loading
+        server.log.warning(f"Engine preload failed: {e}")
+        return
+    # Stop the cyclic GC from tracking (and writing to) everything built so
+    # far; otherwise collections in each worker dirty the shared pages.
+    gc.collect()
+    gc.freeze()
+    server.log.info("Engine preloaded in master; workers will share it")
+
+
+def post_fork(server, worker):
+    """
+    Start each worker's memory-governor and CURRENT-watcher threads and its
+    background warm-up. Threads do not survive the fork, and the master
+    preloads without starting any.
+    """
+    import flask_api
+
+    flask_api.start_warmup()
@@ -2,23 +2,102 @@
 HF Space API for MiniLM embeddings.
 Hosts all-MiniLM-L6-v2 model and provides /embed endpoint.
 Deploy to https://huggingface.co/spaces/<username>/<space-name>
+
+Serving options (environment variables):
+    EMBED_QUANTIZE      "int8" for dynamic int8 quantization of the Linear layers
+                        (default "none": float32)
+    EMBED_WORKERS       encodes running at once (default: CPU cores)
+    EMBED_THREADS       torch intra-op threads per encode (default: cores // workers)
+    EMBED_BATCH_SIZE    texts per forward pass (default 32)
+    EMBED_MODEL         model name or local path (default all-MiniLM-L6-v2)
 """
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import numpy as np
+import torch
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from sentence_transformers import SentenceTransformer
-import numpy as np
-import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="MiniLM Embeddings API")
+MODEL_NAME = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+CORES = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+QUANTIZE = os.getenv("EMBED_QUANTIZE", "none").lower()
+WORKERS = int(os.getenv("EMBED_WORKERS", CORES))
+THREADS = int(os.getenv("EMBED_THREADS", max(1, CORES // WORKERS)))
+BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
 
-# Load model once at startup
-MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-logger.info(f"Loading {MODEL_NAME}...")
-model = SentenceTransformer(MODEL_NAME)
-logger.info("Model loaded successfully")
+
+def load_model(quantize=QUANTIZE):
+    """all-MiniLM-L6-v2 on CPU, optionally with int8 dynamic quantization"""
+    model = SentenceTransformer(MODEL_NAME, device="cpu")
+    model.eval()
+    if quantize == "int8":
+        # Linear weights stored as int8; activations quantized on the fly per batch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif quantize != "none":
+        raise ValueError(f"EMBED_QUANTIZE must be none or int8, not {quantize!r}")
+    return model
+
+
+def encode_pool(workers=WORKERS, threads=THREADS):
+    """Encode threads, each with its own intra-op thread count (it is per thread)"""
+    return ThreadPoolExecutor(
+        max_workers=workers,
+        thread_name_prefix="encode",
+        initializer=torch.set_num_threads,
+        initargs=(threads,),
+    )
+
+
+# The fast tokenizer is not re-entrant: pool threads sharing the model fail
+# with "Already borrowed" when they tokenize at once
+_tokenize_lock = threading.Lock()
+
+
+def encode(model, texts, batch_size=BATCH_SIZE):
+    """
+    model.encode for the pool threads sharing one model: tokenization is
+    serialized, forward passes run in parallel. Longest texts are batched
+    together to cut padding, as model.encode does.
+    """
+    order = np.argsort([-len(text) for text in texts], kind="stable")
+    vectors = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    for start in range(0, len(texts), batch_size):
+        rows = order[start : start + batch_size]
+        with _tokenize_lock:
+            features = model.tokenize([texts[i] for i in rows])
+        with torch.inference_mode():
+            vectors[rows] = model(features)["sentence_embedding"].float().numpy()
+    return vectors
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load model once at startup
+    logger.info(
+        f"Loading {MODEL_NAME} ({QUANTIZE}, {WORKERS} workers x {THREADS} threads, "
+        f"{CORES} cores)..."
+    )
+    torch.set_num_threads(THREADS)
+    app.state.model = load_model()
+    app.state.pool = encode_pool()
+    logger.info("Model loaded successfully")
+    try:
+        yield
+    finally:
+        app.state.pool.shutdown(wait=False)
+
+
+app = FastAPI(title="MiniLM Embeddings API", lifespan=lifespan)
 
 
 class EmbedRequest(BaseModel):
@@ -35,26 +114,29 @@ class EmbedResponse(BaseModel):
 async def embed(request: EmbedRequest):
     """
     Encode texts to embeddings using all-MiniLM-L6-v2.
-    
+
     Request:
         texts: list of strings to encode
-    
+
     Returns:
         embeddings: list of 384D float vectors
     """
     try:
         if not request.texts:
             raise ValueError("texts list is empty")
-        
+
         logger.info(f"Encoding {len(request.texts)} texts...")
-        embeddings = model.encode(request.texts, convert_to_numpy=True)
-        
+        # On the encode pool: the event loop keeps accepting requests meanwhile
+        embeddings = await asyncio.get_running_loop().run_in_executor(
+            app.state.pool, encode, app.state.model, request.texts
+        )
+
         # Convert to list of lists for JSON serialization
         embeddings_list = embeddings.tolist() if isinstance(embeddings, np.ndarray) else embeddings
-        
+
         logger.info(f"Successfully encoded {len(request.texts)} texts")
         return EmbedResponse(embeddings=embeddings_list)
-    
+
     except Exception as e:
         logger.error(f"Error encoding texts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -63,7 +145,13 @@ async def embed(request: EmbedRequest):
 @app.get("/health")
 async def health():
     """Health check endpoint"""
-    return {"status": "ok", "model": MODEL_NAME}
+    return {
+        "status": "ok",
+        "model": MODEL_NAME,
+        "quantize": QUANTIZE,
+        "workers": WORKERS,
+        "threads": THREADS,
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,310 @@
+"""Memory budget: pick the loading plan up front, shed caches under pressure."""
+
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import threading
+import time
+import weakref
+
+from config import Config
+from metrics import REGISTRY, Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Process memory (USS growth, allocator overhead included) per catalog row,
+# measured building each structure for a 200k-movie synthetic artifact with
+# scripts/memory_plan_report.py's generator
+MOVIES_BYTES_PER_ROW = 900
+# movie_store.MovieStore after the DataFrame is released (scripts/bench_metadata_memory.py)
+COMPACT_MOVIES_BYTES_PER_ROW = 200
+INDEX_BYTES_PER_ROW = {
+    "catalog_index": 25,
+    "title_index": 900,
+    "fuzzy_index": 400,
+    "sparse_index": 1100,
+    "result_store": 30,
+}
+# Query cache entry: vector plus key string, OrderedDict node and array header
+CACHE_ENTRY_OVERHEAD = 250
+# onnxruntime session arenas and the tokenizer, on top of the model weights
+LOCAL_ENCODER_OVERHEAD_MB = 40
+IN_MEMORY_SCORING = ("exact", "cascade")
+SHRUNK_CACHE_SIZE = 128
+
+CACHE_EVICTIONS = REGISTRY.register(
+    Counter(
+        "recommender_cache_evictions_total",
+        "Cache entries evicted to stay inside the memory budget",
+    )
+)
+
+
+def process_rss_mb():
+    try:
+        import psutil
+
+        return psutil.Process(os.getpid()).memory_info().rss / MB
+    except Exception:
+        return None
+
+
+def release_memory():
+    """
+    Collect garbage and hand freed heap pages back to the OS. glibc keeps
+    freed small-object memory mapped after large transient structures (a
+    movies DataFrame) go away; malloc_trim returns it. No-op elsewhere.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _cgroup_limit_mb():
+    """Container memory limit (cgroup v2, then v1), None when unlimited."""
+    for path in (
+        "/sys/fs/cgroup/memory.max",
+        "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+    ):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value) / MB
+    return None
+
+
+def available_memory_mb():
+    """Memory this process could grow into: own RSS + free RAM, capped by the cgroup."""
+    limits = [_cgroup_limit_mb()]
+    try:
+        import psutil
+
+        limits.append(psutil.virtual_memory().available / MB + (process_rss_mb() or 0))
+    except Exception:
+        pass
+    limits = [limit for limit in limits if limit]
+    return min(limits) if limits else None
+
+
+class LoadingPlan:
+    """
+    What to build and hold in memory for one engine. The defaults are the
+    unconstrained plan (everything Config asks for).
+    """
+
+    def __init__(
+        self,
+        dense_scoring=None,
+        fuzzy_index=True,
+        sparse_index=True,
+        query_cache_size=None,
+        expected_mb=None,
+        budget_mb=None,
+    ):
+        self.dense_scoring = dense_scoring or Config.DENSE_SCORING
+        self.fuzzy_index = fuzzy_index
+        self.sparse_index = sparse_index
+        self.query_cache_size = (
+            Config.QUERY_CACHE_SIZE if query_cache_size is None else query_cache_size
+        )
+        self.expected_mb = expected_mb or {}
+        self.budget_mb = budget_mb
+
+    @property
+    def embeddings_in_memory(self):
+        """Blocked/sharded scoring reads a memory map instead of a loaded matrix"""
+        return self.dense_scoring in IN_MEMORY_SCORING
+
+    @property
+    def total_mb(self):
+        return sum(self.expected_mb.values())
+
+    def to_dict(self):
+        return {
+            "dense_scoring": self.dense_scoring,
+            "fuzzy_index": self.fuzzy_index,
+            "sparse_index": self.sparse_index,
+            "query_cache_size": self.query_cache_size,
+            "expected_mb": {k: round(v, 1) for k, v in self.expected_mb.items()},
+            "total_mb": round(self.total_mb, 1),
+            "budget_mb": None if self.budget_mb is None else round(self.budget_mb, 1),
+        }
+
+
+def local_encoder_mb():
+    """Resident MB of the in-process ONNX encoder, 0 when it is not exported"""
+    from encoders import MODEL, QUANTIZED_MODEL
+
+    name = QUANTIZED_MODEL if Config.LOCAL_ENCODER_INT8 else MODEL
+    path = os.path.join(Config.LOCAL_ENCODER_PATH, name)
+    if not os.path.exists(path):
+        return 0.0
+    return os.path.getsize(path) / MB + LOCAL_ENCODER_OVERHEAD_MB
+
+
+def estimate_mb(rows, dims, plan, movies_bytes=None, baseline_mb=0.0):
+    """Expected resident MB per component of plan for a rows x dims catalog."""
+    matrix_mb = rows * dims * 4 / MB
+    expected = {
+        "baseline": baseline_mb,
+        "catalog_index": rows * INDEX_BYTES_PER_ROW["catalog_index"] / MB,
+        "title_index": rows * INDEX_BYTES_PER_ROW["title_index"] / MB,
+    }
+    if Config.COMPACT_METADATA:
+        # The MovieStore also serves result fields, so there is no ResultStore
+        expected["movies_data"] = rows * COMPACT_MOVIES_BYTES_PER_ROW / MB
+    else:
+        expected["movies_data"] = max(rows * MOVIES_BYTES_PER_ROW, movies_bytes or 0) / MB
+        expected["result_store"] = rows * INDEX_BYTES_PER_ROW["result_store"] / MB
+    if plan.embeddings_in_memory:
+        # Loaded float32 matrix plus the normalized lead/tail DenseIndex copy
+        expected["embeddings"] = 2 * matrix_mb
+    else:
+        # Memory-mapped: page cache, not process memory; one block of scores
+        block_rows = min(rows, Config.SCORING_BLOCK_ROWS)
+        expected["embeddings"] = block_rows * (dims + 1) * 4 / MB
+    if plan.fuzzy_index:
+        expected["fuzzy_index"] = rows * INDEX_BYTES_PER_ROW["fuzzy_index"] / MB
+    if plan.sparse_index:
+        expected["sparse_index"] = rows * INDEX_BYTES_PER_ROW["sparse_index"] / MB
+    if "local" in Config.ENCODER_BACKENDS:
+        expected["encoder"] = local_encoder_mb()
+    entry_bytes = dims * 4 + CACHE_ENTRY_OVERHEAD
+    expected["query_cache"] = plan.query_cache_size * entry_bytes / MB
+    return expected
+
+
+class MemoryGovernor:
+    """
+    Chooses an engine's LoadingPlan from Config.MEMORY_BUDGET_MB (or a
+    fraction of the memory available at startup) and, at runtime, evicts
+    from registered caches when RSS crosses the high watermark.
+    """
+
+    def __init__(self, interval=None):
+        self._interval = Config.MEMORY_CHECK_INTERVAL if interval is None else interval
+        self._caches = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self._auto_budget = None
+        self.last_plan = None
+
+    def budget_mb(self):
+        """Config.MEMORY_BUDGET_MB, else a fraction of the memory available at first use"""
+        if Config.MEMORY_BUDGET_MB:
+            return float(Config.MEMORY_BUDGET_MB)
+        if self._auto_budget is None:
+            available = available_memory_mb()
+            fraction = Config.MEMORY_BUDGET_FRACTION
+            self._auto_budget = available * fraction if available else 0
+        return self._auto_budget or None
+
+    def plan(self, rows, dims, movies_bytes=None):
+        """
+        Fit the engine for a rows x dims catalog into the budget. Degrades
+        in order: a small query cache, memory-mapped instead of in-RAM dense
+        scoring, no fuzzy title index, no BM25 index, no query cache. Required
+        structures (movie data, filter/title indexes) are always loaded.
+        """
+        budget = self.budget_mb()
+        baseline = process_rss_mb() or 0.0
+        plan = LoadingPlan(budget_mb=budget)
+        degradations = [
+            ("query_cache_size", min(plan.query_cache_size, SHRUNK_CACHE_SIZE)),
+            ("dense_scoring", "blocked"),
+            ("fuzzy_index", False),
+            ("sparse_index", False),
+            ("query_cache_size", 0),
+        ]
+        plan.expected_mb = estimate_mb(rows, dims, plan, movies_bytes, baseline)
+        for attr, value in degradations:
+            if budget is None or plan.total_mb <= budget:
+                break
+            if attr == "dense_scoring" and not plan.embeddings_in_memory:
+                continue
+            setattr(plan, attr, value)
+            plan.expected_mb = estimate_mb(rows, dims, plan, movies_bytes, baseline)
+
+        if budget is None:
+            logger.info(f"Memory plan (no budget detected): {plan.to_dict()}")
+        elif plan.total_mb > budget:
+            logger.warning(
+                f"Memory plan exceeds the {budget:.0f}MB budget even fully "
+                f"degraded: {plan.to_dict()}"
+            )
+        else:
+            logger.info(f"Memory plan for {rows} x {dims}: {plan.to_dict()}")
+        self.last_plan = plan
+        return plan
+
+    def headroom_mb(self):
+        """Budget left above the current RSS, None when either is unknown"""
+        budget = self.budget_mb()
+        rss = process_rss_mb()
+        if not budget or rss is None:
+            return None
+        return budget - rss
+
+    # ------------------------------------------------------------ runtime
+
+    def register(self, cache):
+        """Track a cache (with shrink(fraction)) for eviction under pressure"""
+        self._caches.add(cache)
+
+    def check(self):
+        """Evict from registered caches if RSS is above the high watermark."""
+        budget = self.budget_mb()
+        rss = process_rss_mb()
+        if not budget or rss is None or rss <= budget * Config.MEMORY_HIGH_WATERMARK:
+            return 0
+        with self._lock:
+            evicted = sum(cache.shrink(0.5) for cache in list(self._caches))
+        release_memory()
+        CACHE_EVICTIONS.inc(amount=evicted)
+        logger.warning(
+            f"RSS {rss:.0f}MB above {Config.MEMORY_HIGH_WATERMARK:.0%} of the "
+            f"{budget:.0f}MB budget; evicted {evicted} cache entries"
+        )
+        return evicted
+
+    def start(self):
+        """Poll RSS every interval seconds (one thread per process, post-fork safe)."""
+        if not self._interval or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name="memory-governor", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.warning(f"Memory check failed: {e}")
+
+
+memory_governor = MemoryGovernor()
+
+REGISTRY.register(
+    Gauge(
+        "recommender_memory_budget_bytes",
+        "Per-process memory budget",
+        lambda: int((memory_governor.budget_mb() or 0) * MB),
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "recommender_memory_rss_bytes",
+        "Resident set size of this process",
+        lambda: int((process_rss_mb() or 0) * MB),
+    )
+)
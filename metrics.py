@@ -0,0 +1,218 @@
+"""In-process latency histograms and counters with Prometheus text export."""
+
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from config import Config
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans microsecond index lookups to multi-second Space cold starts
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Value read from fn() at scrape time."""
+
+    def __init__(self, name, help_text, fn):
+        self.name = name
+        self.help = help_text
+        self._fn = fn
+
+    def render(self):
+        try:
+            value = self._fn()
+        except Exception as e:
+            logger.warning(f"Gauge {self.name} failed: {e}")
+            return []
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {value}",
+        ]
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[slot] += 1
+            series[-1] += value
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                label_text = _label_text(self.labelnames + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _label_text(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {series[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "recommender_stage_seconds",
+        "Time spent per request stage (parse, cache_lookup, encode, pca, "
+        "scoring, topk, assembly, serialization)",
+        ("stage",),
+    )
+)
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram("recommender_request_seconds", "End-to-end request latency", ("route",))
+)
+REQUESTS = REGISTRY.register(
+    Counter("recommender_requests_total", "Requests by route and status", ("route", "status"))
+)
+EMBED_ATTEMPT_SECONDS = REGISTRY.register(
+    Histogram(
+        "recommender_embed_attempt_seconds",
+        "Embedding endpoint call latency by attempt number",
+        ("attempt",),
+    )
+)
+EMBED_RETRIES = REGISTRY.register(
+    Counter("recommender_embed_retries_total", "Embedding calls retried")
+)
+EMBED_ERRORS = REGISTRY.register(
+    Counter(
+        "recommender_embed_errors_total",
+        "Failed embedding endpoint attempts by reason",
+        ("reason",),
+    )
+)
+CACHE_REQUESTS = REGISTRY.register(
+    Counter(
+        "recommender_query_cache_total",
+        "Query embedding cache lookups by result",
+        ("result",),
+    )
+)
+
+# Per-request stage durations, read into the Server-Timing header
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request():
+    """Begin collecting stage timings for the current request context."""
+    timings = []
+    _timings.set(timings)
+    return timings
+
+
+def record(stage_name, seconds):
+    """Record a stage duration into the histogram and the request timings."""
+    if not Config.METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage_name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage_name, seconds))
+
+
+class stage:
+    """Time a block as one request stage (and a trace span when traced)."""
+
+    __slots__ = ("name", "span", "started")
+
+    def __init__(self, stage_name):
+        self.name = stage_name
+
+    def __enter__(self):
+        self.span = span(self.name)
+        self.span.__enter__()
+        self.started = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.started)
+        return self.span.__exit__(exc_type, exc, tb)
+
+
+def server_timing(timings):
+    """Server-Timing header value; repeated stages are summed."""
+    totals = {}
+    for name, seconds in timings or ():
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items())
+
+
+def finish_request(route, status, seconds):
+    if not Config.METRICS_ENABLED:
+        return
+    REQUEST_SECONDS.observe(seconds, route)
+    REQUESTS.inc(route, str(status))
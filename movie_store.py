@@ -0,0 +1,297 @@
+"""Compact column store for the serving-time movie metadata."""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from results import MOVIE_FIELDS, ResultColumns, _native_column
+
+logger = logging.getLogger(__name__)
+
+# movies_data columns the serving path reads; everything else is dropped
+STORE_COLUMNS = (
+    "movieId",
+    "clean_title",
+    "year",
+    "genres_list",
+    "avg_rating",
+    "rating_count",
+    "combined_tags",
+)
+
+
+def _as_list(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(v) for v in value if v is not None and v == v]
+    return []
+
+
+def _offsets_dtype(total):
+    return np.int32 if total < 2**31 else np.int64
+
+
+class StringColumn:
+    """Strings concatenated into one UTF-8 buffer, sliced by offsets."""
+
+    def __init__(self, values):
+        encoded = [("" if v is None else str(v)).encode("utf-8") for v in values]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        self.offsets = np.zeros(len(encoded) + 1, dtype=_offsets_dtype(lengths.sum()))
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.buffer = b"".join(encoded)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return self.buffer[self.offsets[row] : self.offsets[row + 1]].decode("utf-8")
+
+    def take(self, rows):
+        starts, stops = self.offsets[rows].tolist(), self.offsets[np.asarray(rows) + 1].tolist()
+        buffer = self.buffer
+        return [buffer[a:b].decode("utf-8") for a, b in zip(starts, stops)]
+
+    def tolist(self):
+        return self.take(np.arange(len(self)))
+
+    @property
+    def nbytes(self):
+        return len(self.buffer) + self.offsets.nbytes
+
+
+class TagColumn:
+    """Per-row tag lists as interned ids in one flat array (CSR offsets)."""
+
+    def __init__(self, values):
+        vocabulary = {}
+        ids, lengths = [], []
+        for tags in values:
+            tags = _as_list(tags)
+            lengths.append(len(tags))
+            for tag in tags:
+                ids.append(vocabulary.setdefault(tag, len(vocabulary)))
+        self.vocabulary = list(vocabulary)
+        id_dtype = np.int16 if len(self.vocabulary) < 2**15 else np.int32
+        self.ids = np.asarray(ids, dtype=id_dtype)
+        self.offsets = np.zeros(len(lengths) + 1, dtype=_offsets_dtype(len(ids)))
+        np.cumsum(lengths, out=self.offsets[1:])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        vocabulary = self.vocabulary
+        return [vocabulary[i] for i in self.ids[self.offsets[row] : self.offsets[row + 1]]]
+
+    def tolist(self):
+        return [self[row] for row in range(len(self))]
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.offsets.nbytes
+
+
+class GenreColumn:
+    """
+    Genre sets as one bit per genre. Decoding returns each row's original
+    list: per mask, the order of the first row that had it, plus a per-row
+    combination id only if some rows list the same genres in another order.
+    """
+
+    def __init__(self, values):
+        names, combinations = {}, {}
+        masks, combination_ids = [], []
+        for genres in values:
+            genres = _as_list(genres)
+            mask = 0
+            for genre in genres:
+                mask |= 1 << names.setdefault(genre, len(names))
+            masks.append(mask)
+            combination_ids.append(combinations.setdefault(tuple(genres), len(combinations)))
+        if len(names) > 64:
+            raise ValueError(f"{len(names)} genres do not fit a 64-bit genre mask")
+        self.names = list(names)
+        self.masks = np.asarray(masks, dtype=np.uint32 if len(names) <= 32 else np.uint64)
+
+        self._combinations = [list(genres) for genres in combinations]
+        first = {}
+        for mask, combination in zip(masks, combination_ids):
+            first.setdefault(mask, combination)
+        self._lists = {mask: self._combinations[c] for mask, c in first.items()}
+        self.combination_ids = None
+        if any(first[mask] != c for mask, c in zip(masks, combination_ids)):
+            dtype = np.int16 if len(combinations) < 2**15 else np.int32
+            self.combination_ids = np.asarray(combination_ids, dtype=dtype)
+
+    def __len__(self):
+        return len(self.masks)
+
+    def __getitem__(self, row):
+        return self.take([row])[0]
+
+    def take(self, rows):
+        if self.combination_ids is not None:
+            combinations = self._combinations
+            return [combinations[c] for c in self.combination_ids[rows].tolist()]
+        lists = self._lists
+        return [lists[mask] for mask in self.masks[rows].tolist()]
+
+    def tolist(self):
+        return self.take(np.arange(len(self)))
+
+    def mask_of(self, genre):
+        """Bit for a genre name (0 when unknown)."""
+        try:
+            return 1 << self.names.index(genre)
+        except ValueError:
+            return 0
+
+    @property
+    def nbytes(self):
+        ids = self.combination_ids
+        return self.masks.nbytes + (0 if ids is None else ids.nbytes)
+
+
+class MovieStore:
+    """
+    Serving-time movie metadata without per-row Python objects: titles in a
+    UTF-8 buffer, genres as bitmasks, tags as interned ids, years, ratings
+    and vote counts as typed arrays. Row numbers match the DataFrame it was
+    built from.
+
+    It stands in for movies_data where the engine reads it: len(),
+    store.columns, store[column] (a pandas Series materialized on demand,
+    for building indexes), row(i) for a single movie, and take() with the
+    same interface and output as results.ResultStore.
+    """
+
+    def __init__(self, movies):
+        self.size = len(movies)
+        columns = movies.columns
+        self.columns = [c for c in STORE_COLUMNS if c in columns]
+        missing = [None] * self.size
+
+        self.movie_ids = movies["movieId"].to_numpy()
+        if self.size and -(2**31) <= self.movie_ids.min() and self.movie_ids.max() < 2**31:
+            self.movie_ids = self.movie_ids.astype(np.int32)
+        self.titles = StringColumn(movies["clean_title"] if "clean_title" in columns else missing)
+        self.genres = GenreColumn(movies["genres_list"] if "genres_list" in columns else missing)
+        self.tags = TagColumn(movies["combined_tags"] if "combined_tags" in columns else missing)
+        self.years, self._year_type = self._pack_years(
+            movies["year"] if "year" in columns else None
+        )
+        # Ratings and vote counts are already downcast typed columns
+        self.avg_rating = movies["avg_rating"].to_numpy() if "avg_rating" in columns else None
+        self.rating_count = (
+            movies["rating_count"].to_numpy() if "rating_count" in columns else None
+        )
+        logger.info(
+            f"Movie store built: {self.size} rows, {self.nbytes / 2**20:.1f}MB "
+            f"({len(self.genres.names)} genres, {len(self.tags.vocabulary)} distinct tags)"
+        )
+
+    @staticmethod
+    def _pack_years(year):
+        """
+        Years as int16 (0 = missing) plus the Python type to give them back
+        as: data_prep extracts them as strings, older artifacts hold floats.
+        Raises ValueError for values that would not round-trip.
+        """
+        if year is None:
+            return None, None
+        numeric = pd.to_numeric(year, errors="coerce").to_numpy(dtype=np.float64)
+        present = ~np.isnan(numeric)
+        if year.dtype.kind in "biuf":
+            kind = float if year.dtype.kind == "f" else int
+        else:
+            kind = str
+            # Only canonical digit strings ("1995"), so str(int) gives them back
+            if (year.notna().to_numpy() != present).any():
+                raise ValueError("year column holds values that are not plain years")
+            text = year[present].astype(str).tolist()
+            if any(value != str(int(n)) for value, n in zip(text, numeric[present])):
+                raise ValueError("year column holds values that are not plain years")
+        if not present.any():
+            return np.zeros(len(numeric), dtype=np.int16), kind
+        values = numeric[present]
+        if values.min() <= 0 or values.max() >= 2**15 or (values != np.round(values)).any():
+            raise ValueError("year column holds values outside int16 years")
+        return np.where(present, numeric, 0).astype(np.int16), kind
+
+    @classmethod
+    def from_frame(cls, movies):
+        return cls(movies)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        arrays = [self.movie_ids, self.years, self.avg_rating, self.rating_count]
+        return (
+            sum(a.nbytes for a in arrays if a is not None)
+            + self.titles.nbytes
+            + self.genres.nbytes
+            + self.tags.nbytes
+        )
+
+    # ---------------------------------------------------------------- columns
+
+    def _year_values(self, rows):
+        kind = self._year_type
+        return [kind(y) if y else None for y in self.years[rows].tolist()]
+
+    def column_values(self, column, rows=None):
+        """Python values of one column (all rows, or rows) as the DataFrame held them."""
+        if rows is None:
+            rows = np.arange(self.size)
+        if column == "movieId":
+            return self.movie_ids[rows].tolist()
+        if column == "clean_title":
+            return self.titles.take(rows)
+        if column == "year" and self.years is not None:
+            return self._year_values(rows)
+        if column == "genres_list":
+            return self.genres.take(rows)
+        if column == "combined_tags":
+            return [self.tags[row] for row in np.asarray(rows).tolist()]
+        if column == "avg_rating" and self.avg_rating is not None:
+            return _native_column(self.avg_rating[rows])
+        if column == "rating_count" and self.rating_count is not None:
+            return _native_column(self.rating_count[rows])
+        raise KeyError(column)
+
+    def __getitem__(self, column):
+        """Whole column as a pandas Series (built on demand, e.g. for indexes)."""
+        if column == "avg_rating" and self.avg_rating is not None:
+            return pd.Series(self.avg_rating, name=column)
+        if column == "rating_count" and self.rating_count is not None:
+            return pd.Series(self.rating_count, name=column)
+        if column == "movieId":
+            return pd.Series(self.movie_ids, name=column)
+        return pd.Series(self.column_values(column), name=column, dtype=object)
+
+    def row(self, row):
+        """One movie as {column: value}, like movies_data.iloc[row]"""
+        return {column: self.column_values(column, [row])[0] for column in self.columns}
+
+    def to_frame(self):
+        return pd.DataFrame({column: self[column] for column in self.columns})
+
+    # ---------------------------------------------------------------- results
+
+    def take(self, rows, scores=None, fields=None):
+        """ResultColumns for rows (and scores), as ResultStore.take builds them."""
+        rows = np.asarray(rows, dtype=np.int64)
+        sources = {name: (column, default) for name, column, default in MOVIE_FIELDS}
+        columns = {}
+        for name in fields or sources:
+            column, default = sources[name]
+            if column in self.columns:
+                columns[name] = self.column_values(column, rows)
+            else:
+                columns[name] = [default] * len(rows)
+        if scores is not None:
+            columns["score"] = np.asarray(scores, dtype=np.float64).tolist()
+        return ResultColumns(columns)
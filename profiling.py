@@ -0,0 +1,216 @@
+"""Opt-in sampling profiler and tracemalloc diffs for live requests."""
+
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread snapshots the stacks of the
+    profiled threads every interval seconds (sys._current_frames) and counts
+    each distinct stack. Nothing is hooked into the profiled code, so the
+    cost is the sampler's own wake-ups, not a per-call tax.
+
+    thread_ids=None samples every thread but the sampler (event loop plus
+    worker pool for the ASGI app).
+    """
+
+    def __init__(self, thread_ids=None, interval=0.005):
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                self.stacks[_stack_key(frame)] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        """Brendan Gregg collapsed-stack lines ("root;...;leaf count")."""
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+
+def _stack_key(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        names.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class ProfileStore:
+    """Directory of collapsed-stack files, keeping the newest `keep`."""
+
+    def __init__(self, directory, keep=50):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def write(self, label, profiler):
+        safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_") or "request"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{safe}.collapsed"
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(
+                    f"# samples={profiler.samples} elapsed={profiler.elapsed:.4f}s "
+                    f"interval={profiler.interval}s\n"
+                )
+                f.write("\n".join(profiler.collapsed()) + "\n")
+            self._rotate()
+        return path
+
+    def _rotate(self):
+        files = sorted(
+            (os.path.join(self.directory, f) for f in os.listdir(self.directory)),
+            key=os.path.getmtime,
+        )
+        profiles = [f for f in files if f.endswith(".collapsed")]
+        for path in profiles[: max(0, len(profiles) - self.keep)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_request_counter = itertools.count(1)
+_store = None
+
+
+def profile_store():
+    global _store
+    if _store is None or _store.directory != Config.PROFILE_DIR:
+        _store = ProfileStore(Config.PROFILE_DIR, Config.PROFILE_KEEP)
+    return _store
+
+
+def should_profile(forced=False):
+    """
+    Profile this request? Every Config.PROFILE_EVERY_N-th request, or when
+    forced (an admin-authorized request sending X-Profile: 1).
+    """
+    if forced:
+        return True
+    every = Config.PROFILE_EVERY_N
+    return bool(every) and next(_request_counter) % every == 0
+
+
+def start_profile(thread_ids=None):
+    return SamplingProfiler(thread_ids, Config.PROFILE_INTERVAL_MS / 1000).start()
+
+
+def finish_profile(profiler, label):
+    """Stop a request profile and write it out; returns the file path."""
+    profiler.stop()
+    try:
+        path = profile_store().write(label, profiler)
+    except OSError as e:
+        logger.warning(f"Could not write profile: {e}")
+        return None
+    logger.info(f"Profiled {label}: {profiler.samples} samples -> {path}")
+    return path
+
+
+# ------------------------------------------------------------------ tracemalloc
+
+_tracemalloc_lock = threading.Lock()
+
+
+def memory_diff(fn, limit=25, frames=8):
+    """
+    Run fn() between two tracemalloc snapshots and return the top
+    allocation tracebacks (up to `frames` deep, so a NumPy allocation is
+    attributed to the repo code calling it) by size growth, plus the net
+    growth and the peak above the starting point.
+    Captures are serialized; tracemalloc is stopped again afterwards if it
+    was not already running.
+    """
+    with _tracemalloc_lock:
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(frames)
+        elif tracemalloc.get_traceback_limit() < frames:
+            logger.info("tracemalloc already running with a shallower traceback limit")
+        try:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+    ignore = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ]
+    stats = after.filter_traces(ignore).compare_to(
+        before.filter_traces(ignore), "traceback"
+    )
+    return {
+        "seconds": round(elapsed, 4),
+        "net_bytes": sum(stat.size_diff for stat in stats),
+        "peak_bytes": peak - baseline,
+        "top": [
+            {
+                "traceback": [f"{f.filename}:{f.lineno}" for f in stat.traceback],
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size": stat.size,
+            }
+            for stat in stats[:limit]
+        ],
+    }
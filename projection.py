@@ -0,0 +1,74 @@
+"""PCA query projection as plain arrays (no scikit-learn at serving time)."""
+
+import hashlib
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PCAProjection:
+    """
+    The transform of a fitted PCA: (x - mean) @ components.T, optionally
+    scaled by 1 / sqrt(explained_variance) when the PCA was whitened.
+
+    The mean and scale are folded into a single weight matrix and bias at
+    construction, so transform() is one matmul and a subtraction:
+    x @ W - b with W = components.T / scale and b = mean @ W.
+    """
+
+    def __init__(self, mean, components, scale=None):
+        self.mean = np.ascontiguousarray(mean, dtype=np.float32).reshape(-1)
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float32)
+        if self.components.shape[1] != self.mean.shape[0]:
+            raise ValueError(
+                f"PCA components {self.components.shape} do not match mean "
+                f"{self.mean.shape}"
+            )
+
+        weights = self.components.T.astype(np.float64)
+        if self.scale is not None:
+            weights = weights / self.scale.astype(np.float64)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)
+        self.bias = (self.mean.astype(np.float64) @ weights).astype(np.float32)
+
+    @property
+    def n_components_(self):
+        return self.components.shape[0]
+
+    @classmethod
+    def from_sklearn(cls, pca):
+        """Extract the arrays from a fitted sklearn PCA (or pass through)."""
+        if pca is None or isinstance(pca, cls):
+            return pca
+        scale = np.sqrt(pca.explained_variance_) if pca.whiten else None
+        return cls(pca.mean_, pca.components_, scale)
+
+    def transform(self, x):
+        """Project rows of x (n, input_dims) to (n, n_components) float32."""
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        return x @ self.weights - self.bias
+
+    def fingerprint(self):
+        """Short hash of the folded weights, to match exports that embed them."""
+        digest = hashlib.sha256(self.weights.tobytes())
+        digest.update(self.bias.tobytes())
+        return digest.hexdigest()[:16]
+
+    def arrays(self):
+        """Named arrays to persist; the inverse of from_arrays."""
+        arrays = {"pca_mean": self.mean, "pca_components": self.components}
+        if self.scale is not None:
+            arrays["pca_scale"] = self.scale
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild from arrays() output, or None when no PCA was stored."""
+        if arrays.get("pca_components") is None:
+            return None
+        return cls(arrays["pca_mean"], arrays["pca_components"], arrays.get("pca_scale"))
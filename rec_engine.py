@@ -1,21 +1,71 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from imdb_service import IMDBService
+from catalog_index import CatalogIndex
+from title_index import TitleIndex
+from fuzzy_index import FuzzyTitleIndex
+from bm25_index import BM25Index, reciprocal_rank_fusion, weighted_fusion
+from dense_index import DenseIndex
+from blocked_scoring import blocked_top_k
+from sharded_index import ShardedScorer
+from results import ResultStore
+from movie_store import MovieStore
+from metrics import stage
+from tracing import span
 from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+SEARCH_MODES = ("auto", "substring", "fuzzy")
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+DENSE_SCORING = ("exact", "cascade", "blocked", "sharded")
+
+
+def _scatter_scores(pairs, length):
+    """Expand (positions, scores) into a full array with -inf elsewhere"""
+    positions, scores = pairs
+    full = np.full(length, -np.inf, dtype=np.float32)
+    full[positions] = scores
+    return full
+
+
+def _top_k_indices(scores, top_k):
+    """Indices of the top_k highest scores, best first, without a full sort"""
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < len(scores):
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.argsort(-scores[part], kind="stable")]
+
 
 class MovieRecommendationEngine:
-    def __init__(self, bert_processor, use_imdb=True):
+    def __init__(self, bert_processor, use_imdb=True, dense_scoring=None):
         self.bert_processor = bert_processor
         # Don't store movies or embeddings directly - access via bert_processor
 
+        # "exact" scans all PCA dims; "cascade" prefilters on the leading dims;
+        # "blocked" streams row blocks from the memory-mapped embedding file;
+        # "sharded" splits those blocks over SCORING_SHARDS worker processes.
+        # The processor's memory plan may have downgraded Config.DENSE_SCORING.
+        plan = getattr(bert_processor, "plan", None)
+        self.dense_scoring = dense_scoring or (
+            plan.dense_scoring if plan is not None else Config.DENSE_SCORING
+        )
+        if self.dense_scoring not in DENSE_SCORING:
+            raise ValueError(f"dense_scoring must be one of {', '.join(DENSE_SCORING)}")
+        self._dense_index = None
+        self._dense_source = None
+        self._sharded_scorer = None
+
         # Initialize IMDB service if API key is available
         self.imdb_service = None
         if use_imdb and Config.validate_config():
             try:
+                # Imported here: serving runs with IMDb disabled
+                from imdb_service import IMDBService
+
                 self.imdb_service = IMDBService(Config.RAPIDAPI_IMDB_KEY)
                 logger.info("IMDB service initialized successfully")
             except Exception as e:
@@ -27,63 +77,246 @@ class MovieRecommendationEngine:
         """Access movies data from bert_processor"""
         return self.bert_processor.movies_data
 
-    def recommend_by_query(self, query, top_k=8):
+    def _planned(self, attr):
+        """Whether the processor's memory plan includes this optional index"""
+        plan = getattr(self.bert_processor, "plan", None)
+        return plan is None or getattr(plan, attr)
+
+    def _processor_index(self, attr, builder):
+        """Return an index built on load by bert_processor, building it if missing"""
+        index = getattr(self.bert_processor, attr, None)
+        if index is None or index.size != len(self.movies):
+            index = builder(self.movies)
+            setattr(self.bert_processor, attr, index)
+        return index
+
+    @property
+    def catalog_index(self):
+        """Filter bitmaps for the current movies_data"""
+        return self._processor_index("catalog_index", CatalogIndex)
+
+    @property
+    def result_store(self):
+        """Response fields of every movie as arrays, for column-wise results"""
+        return self._processor_index("result_store", self._result_store)
+
+    @staticmethod
+    def _result_store(movies):
+        # A MovieStore already serves result fields from its packed columns
+        return movies if isinstance(movies, MovieStore) else ResultStore(movies)
+
+    @property
+    def title_index(self):
+        """Trigram/prefix title index for the current movies_data"""
+        return self._processor_index("title_index", TitleIndex.from_movies)
+
+    @property
+    def fuzzy_index(self):
+        """Typo-tolerant title index (None when the memory plan leaves it out)"""
+        if not self._planned("fuzzy_index"):
+            return None
+        return self._processor_index("fuzzy_index", FuzzyTitleIndex.from_movies)
+
+    @property
+    def sparse_index(self):
+        """BM25 index over titles, genres and tags (None if left out of the memory plan)"""
+        if not self._planned("sparse_index"):
+            return None
+        return self._processor_index("sparse_index", BM25Index.from_movies)
+
+    @property
+    def dense_index(self):
+        """Normalized, lead/tail-blocked embedding matrix for cosine scoring"""
+        embeddings = self.bert_processor._get_embeddings()
+        if self._dense_index is None or self._dense_source is not embeddings:
+            self._dense_index = DenseIndex(embeddings, Config.CASCADE_LEAD_DIMS)
+            self._dense_source = embeddings
+        return self._dense_index
+
+    @property
+    def sharded_scorer(self):
+        """Shard worker processes over the memory-mapped embedding file"""
+        matrix = self.bert_processor.embeddings_memmap()
+        if self._sharded_scorer is None or self._sharded_scorer.size != len(matrix):
+            if self._sharded_scorer is not None:
+                self._sharded_scorer.close()
+            self._sharded_scorer = ShardedScorer(
+                matrix.filename, Config.SCORING_SHARDS, Config.SCORING_BLOCK_ROWS
+            )
+        return self._sharded_scorer
+
+    def close(self):
+        """Release worker processes started by the engine"""
+        if self._sharded_scorer is not None:
+            self._sharded_scorer.close()
+            self._sharded_scorer = None
+
+    def facet_counts(self, filters=None):
+        """Genre/decade counts for the rows matching filters"""
+        return self.catalog_index.facet_counts(filters)
+
+    def recommend_by_query(
+        self, query, top_k=8, filters=None, mode=None, query_embedding=None,
+        columnar=False,
+    ):
+        """
+        Recommendations for a natural language query.
+
+        mode "dense" ranks by cosine similarity of HF Space embeddings, "sparse"
+        by local BM25 keyword scores, and "hybrid" fuses both (Config.FUSION_METHOD).
+        When the embedding endpoint fails, dense/hybrid fall back to sparse
+        (Config.SPARSE_FALLBACK). filters (see catalog_index.parse_filters) are
+        applied as a row mask before scoring, so only matching movies are scored.
+        query_embedding skips the encode when the caller already has it (the
+        ASGI app encodes without blocking and scores in a thread). columnar
+        returns a results.ResultColumns instead of a list of dicts.
         """
-        Pure semantic similarity-based recommendations using HF Space embeddings.
+        mode = mode or Config.RETRIEVAL_MODE
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"mode must be one of {', '.join(RETRIEVAL_MODES)}")
+        sparse_index = self.sparse_index
+        if mode == "sparse" and sparse_index is None:
+            raise ValueError("sparse mode is unavailable: no BM25 index in the memory plan")
+        logger.info(f"Getting {mode} recommendations for query: {query}")
+
+        candidates = self.catalog_index.candidate_rows(filters)
+        if candidates is not None and len(candidates) == 0:
+            logger.info("No movies match the requested filters")
+            results = self.result_store.take([], [])
+            return results if columnar else []
+
+        dense = sparse = None
+        if mode in ("dense", "hybrid"):
+            try:
+                dense = self._dense_scores(query, candidates, top_k, query_embedding)
+            except Exception as e:
+                if not Config.SPARSE_FALLBACK or sparse_index is None:
+                    raise
+                logger.warning(f"Dense scoring unavailable ({e}); using BM25 only")
+        # Hybrid without a BM25 index ranks on dense scores alone
+        if sparse_index is not None and (mode in ("sparse", "hybrid") or dense is None):
+            with stage("scoring"):
+                sparse = sparse_index.scores(query, candidates)
+
+        with stage("topk"):
+            if isinstance(dense, tuple) and sparse is not None:
+                # Blocked scoring only returns its best rows; the rest are unranked
+                dense = _scatter_scores(dense, len(sparse))
+
+            if dense is None:
+                scores = sparse
+            elif sparse is None:
+                scores = dense
+            elif Config.FUSION_METHOD == "weighted":
+                scores = weighted_fusion(dense, sparse, Config.HYBRID_SPARSE_WEIGHT)
+            else:
+                scores = reciprocal_rank_fusion(
+                    [dense, sparse], k=Config.RRF_K, depth=max(top_k, Config.FUSION_DEPTH)
+                )
+
+            # Get top K indices
+            if isinstance(scores, tuple):
+                top_positions, top_scores = scores[0][:top_k], scores[1][:top_k]
+            else:
+                top_positions = _top_k_indices(scores, top_k)
+                if dense is None:
+                    # Keyword-only ranking: rows without any matching term are not results
+                    top_positions = top_positions[scores[top_positions] > 0]
+                top_scores = scores[top_positions]
+            top_indices = top_positions if candidates is None else candidates[top_positions]
+
+        # Build recommendations column-wise (one take per column, no per-row .iloc)
+        with stage("assembly"):
+            results = self.result_store.take(top_indices, top_scores)
+
+        logger.info(f"Ranking complete: returned {len(results)} movies")
+        return results if columnar else results.to_records()
+
+    def _dense_scores(self, query, candidates=None, top_k=8, query_embedding=None):
+        """
+        Cosine similarity of the query embedding to every (candidate) movie.
+
+        Blocked and sharded scoring return only their best (positions, scores)
+        instead of a full-length array.
         """
-        logger.info(f"Getting semantic recommendations for query: {query}")
-        
         # Encode query using HF Space
-        query_embedding = self.bert_processor.encode([query], force_semantic=True)[0]
-        query_embedding = np.array(query_embedding, dtype=np.float32).reshape(1, -1)
+        if query_embedding is None:
+            query_embedding = self.bert_processor.encode([query], force_semantic=True)[0]
 
-        # Get all movie embeddings
-        embeddings = self.bert_processor._get_embeddings()
-        embeddings = np.array(embeddings, dtype=np.float32)
-
-        # Compute cosine similarity
-        logger.info("Computing semantic similarity scores")
-        similarities = cosine_similarity(query_embedding, embeddings)[0]
-
-        # Get top K indices
-        top_indices = similarities.argsort()[::-1][:top_k]
-
-        # Build recommendations
-        recommendations = []
-        for idx in top_indices:
-            movie = self.movies.iloc[idx]
-            recommendations.append({
-                "movieId": movie["movieId"],
-                "title": movie["clean_title"],
-                "year": movie.get("year", "Unknown"),
-                "genres": movie.get("genres_list", []),
-                "avg_rating": movie.get("avg_rating", 0),
-                "score": float(similarities[idx]),
-            })
-
-        logger.info(f"Semantic ranking complete: returned {len(recommendations)} movies")
-        return recommendations
-
-    def search_movies(self, search_term, top_k=20):
+        with stage("scoring"):
+            return self._score_embedding(query_embedding, candidates, top_k)
+
+    def _score_embedding(self, query_embedding, candidates, top_k):
+        """Dense scores of an encoded query with the configured scorer"""
+        if self.dense_scoring == "sharded":
+            return self.sharded_scorer.top_k(
+                query_embedding, max(top_k, Config.FUSION_DEPTH), candidates
+            )
+
+        if self.dense_scoring == "blocked":
+            return blocked_top_k(
+                self.bert_processor.embeddings_memmap(),
+                query_embedding,
+                max(top_k, Config.FUSION_DEPTH),
+                block_rows=Config.SCORING_BLOCK_ROWS,
+                candidates=candidates,
+            )
+
+        index = self.dense_index
+        count = index.size if candidates is None else len(candidates)
+        logger.info(f"Computing {self.dense_scoring} similarity scores over {count} movies")
+        if self.dense_scoring == "cascade":
+            return index.cascade_scores(
+                query_embedding,
+                max(top_k, Config.FUSION_DEPTH),
+                candidates,
+                multiplier=Config.CASCADE_MULTIPLIER,
+                minimum=Config.CASCADE_MIN_CANDIDATES,
+            )
+        return index.scores(query_embedding, candidates)
+
+    def search_movies(
+        self, search_term, top_k=20, filters=None, mode=None, columnar=False
+    ):
         """
-        Search movies by matching search_term in cleaned title (case-insensitive).
-        Returns up to top_k matching movies with basic info.
+        Search movies by title. Returns up to top_k matching movies with basic info.
+
+        mode "substring" matches search_term literally inside the cleaned title
+        (case- and punctuation-insensitive), most-rated first; "fuzzy" tolerates
+        typos ("Incepton"); "auto" (default) tries substring and falls back to
+        fuzzy when nothing matches. columnar returns a results.ResultColumns.
         """
-        matches = self.movies[
-            self.movies["clean_title"].str.contains(search_term, case=False, na=False)
-        ]
-        results = []
-        for _, movie in matches.head(top_k).iterrows():
-            results.append(
-                {
-                    "movieId": movie["movieId"],
-                    "title": movie["clean_title"],
-                    "year": movie.get("year", "Unknown"),
-                    "genres": movie.get("genres_list", []),
-                    "avg_rating": movie.get("avg_rating", 0),
-                }
-            )
-        return results
+        mode = mode or Config.SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+
+        mask = self.catalog_index.mask(filters)
+        rows = []
+        if mode in ("substring", "auto"):
+            rows = self.title_index.substring(search_term, top_k, mask)
+        fuzzy_index = self.fuzzy_index
+        if fuzzy_index is None:
+            # Left out of the memory plan: fuzzy degrades to substring matching
+            if mode == "fuzzy":
+                rows = self.title_index.substring(search_term, top_k, mask)
+        elif mode == "fuzzy" or (mode == "auto" and len(rows) == 0):
+            rows = fuzzy_index.search(search_term, top_k, mask)
+        results = self.result_store.take(rows)
+        return results if columnar else results.to_records()
+
+    def popular_movies(self, top_k=8, filters=None, columnar=False):
+        """
+        Most-rated movies matching filters, without encoding or scoring: the
+        degraded answer to a query when the server is overloaded. Scores are 0.
+        """
+        rows = self.title_index.popular(top_k, self.catalog_index.mask(filters))
+        results = self.result_store.take(rows, np.zeros(len(rows)))
+        return results if columnar else results.to_records()
+
+    def autocomplete(self, prefix, limit=8):
+        """Titles with a word starting with prefix, most-rated first"""
+        rows = self.title_index.prefix(prefix, limit)
+        return self.result_store.take(rows, fields=("movieId", "title", "year")).to_records()
 
     def _enhance_with_imdb_data(self, recommendations):
         """Enhance recommendations with IMDB data if available"""
@@ -96,7 +329,8 @@ class MovieRecommendationEngine:
 
             try:
                 # Search for the movie in IMDB
-                imdb_results = self.imdb_service.search_movies(rec["title"], limit=1)
+                with span("imdb_search", title=rec["title"]):
+                    imdb_results = self.imdb_service.search_movies(rec["title"], limit=1)
                 if imdb_results:
                     # Pick best-matching IMDb result to avoid wrong first hits like "De små mænd"
                     def score_candidate(c):
@@ -149,9 +383,9 @@ class MovieRecommendationEngine:
 
         return enhanced_recommendations
 
-    def recommend_by_query_with_imdb(self, query, top_k=10):
+    def recommend_by_query_with_imdb(self, query, top_k=10, filters=None, mode=None):
         """Get recommendations with IMDB data enhancement"""
-        recommendations = self.recommend_by_query(query, top_k)
+        recommendations = self.recommend_by_query(query, top_k, filters, mode)
         return self._enhance_with_imdb_data(recommendations)
 
     def recommend_similar_movies_with_imdb(self, movie_id, top_k=8):
@@ -159,9 +393,9 @@ class MovieRecommendationEngine:
         recommendations = self.recommend_similar_movies(movie_id, top_k)
         return self._enhance_with_imdb_data(recommendations)
 
-    def search_movies_with_imdb(self, search_term, top_k=20):
+    def search_movies_with_imdb(self, search_term, top_k=20, filters=None, mode=None):
         """Search movies with IMDB data enhancement"""
-        recommendations = self.search_movies(search_term, top_k)
+        recommendations = self.search_movies(search_term, top_k, filters, mode)
         return self._enhance_with_imdb_data(recommendations)
 
     def get_trending_movies(self, limit=10):
@@ -0,0 +1,148 @@
+"""Columnar result sets and fast response encoding."""
+
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # "msgpack" format unavailable
+    msgpack = None
+
+# Response formats: list of dicts, dict of column arrays, MessagePack columns
+RESPONSE_FORMATS = ("records", "columns", "msgpack")
+
+# (result field, movies_data column, value when the column is missing)
+MOVIE_FIELDS = (
+    ("movieId", "movieId", None),
+    ("title", "clean_title", None),
+    ("year", "year", "Unknown"),
+    ("genres", "genres_list", []),
+    ("avg_rating", "avg_rating", 0),
+)
+
+
+def _native_column(values):
+    """Column as a list of JSON-native values, NaN/None -> None."""
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+        column = values.tolist()
+        if values.dtype.kind == "f":
+            nan = np.isnan(values)
+            if nan.any():
+                for i in np.flatnonzero(nan):
+                    column[i] = None
+        return column
+    column = []
+    for value in values:
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        elif isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and value != value:
+            value = None
+        column.append(value)
+    return column
+
+
+class ResultColumns:
+    """
+    A result set held as one column per field. Columns are JSON-native
+    lists, so they serialize without a per-value normalize pass.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    def to_records(self):
+        """List of per-movie dicts (the long-standing response shape)."""
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*self.columns.values())]
+
+
+class ResultStore:
+    """
+    Result fields of every movie as arrays, built once per movies_data, so a
+    result set is one fancy-index per column instead of a per-row .iloc.
+    Numeric columns stay NumPy arrays; the rest are object arrays of
+    JSON-native values.
+    """
+
+    def __init__(self, movies, fields=MOVIE_FIELDS):
+        self.size = len(movies)
+        self.arrays = {}
+        for name, column, default in fields:
+            if column not in movies.columns:
+                values = np.empty(self.size, dtype=object)
+                values.fill(default)
+            else:
+                values = movies[column].to_numpy()
+                if values.dtype.kind not in "biuf":
+                    native = _native_column(values)
+                    values = np.empty(self.size, dtype=object)
+                    for i, value in enumerate(native):
+                        values[i] = value
+            self.arrays[name] = values
+
+    def take(self, rows, scores=None, fields=None):
+        """ResultColumns for rows (and scores), optionally only some fields."""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = {}
+        for name in fields or self.arrays:
+            values = self.arrays[name][rows]
+            columns[name] = (
+                _native_column(values) if values.dtype.kind in "biuf" else values.tolist()
+            )
+        if scores is not None:
+            columns["score"] = np.asarray(scores, dtype=np.float64).tolist()
+        return ResultColumns(columns)
+
+
+def _default(value):
+    """Fallback for the stdlib encoder: NumPy scalars and arrays."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """JSON bytes; orjson (with native NumPy support) when installed."""
+    if orjson is not None:
+        return orjson.dumps(
+            payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode()
+
+
+def encode_results(results, key, response_format="records", **extra):
+    """
+    Encode a ResultColumns response as (body bytes, content type).
+
+    "records" keeps the {key: [{...}, ...]} shape; "columns" sends
+    {"columns": {field: [...]}}, which is smaller for large top_k; "msgpack"
+    sends the columns payload as MessagePack.
+    """
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(RESPONSE_FORMATS)}")
+    payload = {"success": True, "count": len(results), **extra}
+    if response_format == "records":
+        payload[key] = results.to_records()
+        return dumps(payload), "application/json"
+    payload["columns"] = results.columns
+    if response_format == "columns":
+        return dumps(payload), "application/json"
+    if msgpack is None:
+        raise ValueError("msgpack format requires the msgpack package")
+    return msgpack.packb(payload, use_bin_type=True), "application/msgpack"
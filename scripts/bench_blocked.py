@@ -0,0 +1,66 @@
+"""
+Latency and peak memory of blocked mmap scoring for several block sizes.
+
+Writes a synthetic unit-normalized embedding file, then scores queries
+against it with blocked_top_k. Peak memory is the tracemalloc high-water mark
+of the scoring call (page cache used by the mapping is not counted).
+
+Usage: python scripts/bench_blocked.py [rows] [path]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from blocked_scoring import blocked_top_k, open_unit_embeddings
+
+DIMS = 32
+TOP_K = 10
+
+
+def write_synthetic(path, n, chunk=1_000_000):
+    """Write n random unit rows without holding them all in memory."""
+    rng = np.random.default_rng(0)
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, DIMS))
+    for start in range(0, n, chunk):
+        block = rng.standard_normal((min(chunk, n - start), DIMS)).astype(np.float32)
+        out[start : start + len(block)] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    out.flush()
+    del out
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(
+        tempfile.gettempdir(), f"bench_unit_{n}.npy"
+    )
+    if not os.path.exists(path):
+        write_synthetic(path, n)
+    matrix = open_unit_embeddings(path)
+    query = np.random.default_rng(1).standard_normal(DIMS).astype(np.float32)
+    print(f"{n:,} rows x {DIMS} dims ({matrix.nbytes / 2**20:.0f}MB on disk)")
+
+    exact = np.argsort(-(np.asarray(matrix) @ (query / np.linalg.norm(query))))[:TOP_K]
+    for block_rows in (4096, 16384, 65536, 262144, 1048576):
+        blocked_top_k(matrix, query, TOP_K, block_rows)  # warm page cache
+        tracemalloc.start()
+        start = time.perf_counter()
+        positions, _ = blocked_top_k(matrix, query, TOP_K, block_rows)
+        elapsed = (time.perf_counter() - start) * 1000
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert positions.tolist() == exact.tolist()
+        print(
+            f"block {block_rows:>8,} rows: {elapsed:7.1f} ms/query, "
+            f"peak {peak / 2**20:6.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
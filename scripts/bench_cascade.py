@@ -0,0 +1,73 @@
+"""
+Compare cascade (coarse-to-fine) scoring with the exact scan.
+
+Synthetic catalogs get PCA-like spectra (variance of component i ~ i^-decay)
+and queries are noisy copies of catalog rows, mimicking query/movie
+agreement. Recall depends heavily on how fast the spectrum decays, so both a
+flat (decay=1) and a steep (decay=2) spectrum are reported.
+
+Usage: python scripts/bench_cascade.py [rows ...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from dense_index import DenseIndex
+
+TOP_K = 10
+DIMS = 32
+
+
+def synthetic(n, seed=0, decay=1.0):
+    rng = np.random.default_rng(seed)
+    scale = np.arange(1, DIMS + 1) ** (-decay / 2)
+    return (rng.standard_normal((n, DIMS)) * scale).astype(np.float32)
+
+
+def top(scores, k):
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+def run(n, decay, queries=50):
+    embeddings = synthetic(n, decay=decay)
+    index = DenseIndex(embeddings, lead_dims=8)
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, n, size=queries)
+    noise = synthetic(queries, seed=2, decay=decay)
+    query_vectors = embeddings[picks] + 0.5 * noise
+
+    def timed(fn):
+        start = time.perf_counter()
+        results = [top(fn(q), TOP_K) for q in query_vectors]
+        return results, (time.perf_counter() - start) / queries * 1000
+
+    exact, exact_ms = timed(index.scores)
+    print(f"{n:>10,} rows, decay {decay}: exact {exact_ms:8.2f} ms/query")
+    for multiplier in (5, 10, 20, 50):
+        cascade, ms = timed(
+            lambda q: index.cascade_scores(q, TOP_K, multiplier=multiplier, minimum=0)
+        )
+        recall = np.mean(
+            [len(set(a) & set(b)) / TOP_K for a, b in zip(exact, cascade)]
+        )
+        print(
+            f"{'':>8}cascade x{multiplier:<3} {ms:8.2f} ms/query  "
+            f"recall@{TOP_K} {recall:.3f}  speedup {exact_ms / ms:.1f}x"
+        )
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000, 4_000_000]
+    for n in sizes:
+        for decay in (1.0, 2.0):
+            run(n, decay)
+
+
+if __name__ == "__main__":
+    main()
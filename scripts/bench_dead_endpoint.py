@@ -0,0 +1,80 @@
+"""
+What a dead embedding endpoint costs each query.
+
+Starts a local endpoint that accepts connections but never answers (or
+answers 503 with --503), then times a run of encode calls through
+EmbeddingEndpoint with the configured deadline and breaker. The old client
+tried 3 times with a 30s timeout and 1+2+4s sleeps: up to ~97s per query,
+for every query. Now the first calls are capped at EMBED_DEADLINE, and once
+the breaker opens the rest fail in microseconds (and fall back to BM25).
+
+Usage: python scripts/bench_dead_endpoint.py [queries] [deadline_s] [--503]
+"""
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from config import Config
+from embedding_client import Deadline, EmbeddingEndpoint, EmbeddingUnavailable
+
+OLD_WORST_CASE_S = 3 * 30 + 1 + 2 + 4
+
+
+def dead_server(status):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if status is None:
+                time.sleep(3600)
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    queries = int(args[0]) if args else 20
+    deadline = float(args[1]) if len(args) > 1 else 2.0
+    status = 503 if "--503" in sys.argv else None
+
+    server = dead_server(status)
+    endpoint = EmbeddingEndpoint(f"http://127.0.0.1:{server.server_port}/embed")
+    session = requests.Session()
+    print(
+        f"{queries} queries against a {'503ing' if status else 'hanging'} endpoint; "
+        f"deadline {deadline}s, breaker opens after {Config.BREAKER_FAILURE_THRESHOLD} "
+        f"failures for {Config.BREAKER_RESET_TIMEOUT}s"
+    )
+    print(f"{'query':>5} {'ms':>10} {'breaker':>10}")
+    total = time.perf_counter()
+    for i in range(queries):
+        started = time.perf_counter()
+        try:
+            endpoint.post(session, {"texts": ["query"]}, {}, Deadline(deadline))
+        except EmbeddingUnavailable:
+            pass
+        print(f"{i + 1:5d} {(time.perf_counter() - started) * 1000:10.2f} {endpoint.breaker.state:>10}")
+    total = time.perf_counter() - total
+    print(
+        f"total {total:.1f}s; old client worst case {queries * OLD_WORST_CASE_S}s "
+        f"({OLD_WORST_CASE_S}s per query)"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
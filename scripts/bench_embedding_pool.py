@@ -0,0 +1,108 @@
+"""
+Embedding throughput across a pool of replicas.
+
+Starts local replicas that each encode one batch at a time in BATCH_MS
+(like a single-CPU Space), then runs a bulk encode of BATCHES batches
+through EndpointPool with EMBED_BULK_PER_ENDPOINT batches in flight per
+replica. Reports batches/s for 1..N replicas, then p50/p99 with one
+replica SLOW_FACTOR times slower under each routing policy (the slow one
+is ejected once its EWMA latency stands out).
+
+Usage: python scripts/bench_embedding_pool.py [replicas] [batches]
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from config import Config
+from embedding_client import Deadline, EmbeddingEndpoint, EndpointPool
+
+BATCH_MS = 20
+SLOW_FACTOR = 5
+
+
+def replica(batch_ms):
+    busy = threading.Lock()  # One batch at a time
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            with busy:
+                time.sleep(batch_ms / 1000)
+            data = b'{"embeddings": [[0.0]]}'
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server
+
+
+def run(servers, batches, routing):
+    pool = EndpointPool(
+        [EmbeddingEndpoint(f"http://127.0.0.1:{s.server_port}/embed") for s in servers], routing
+    )
+    session = requests.Session()
+    latencies = []
+
+    def encode(_):
+        started = time.perf_counter()
+        pool.post(session, {"texts": ["movie"]}, {}, Deadline(Config.EMBED_BULK_DEADLINE))
+        latencies.append(time.perf_counter() - started)
+
+    workers = len(servers) * max(Config.EMBED_BULK_PER_ENDPOINT, 1)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(encode, range(batches)))
+    elapsed = time.perf_counter() - started
+    return batches / elapsed, np.array(latencies) * 1000
+
+
+def main():
+    replicas = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    batches = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    Config.POOL_HEALTH_INTERVAL = 0
+    print(f"{batches} batches, replicas encode one batch at a time in {BATCH_MS}ms")
+    print(f"{'replicas':>8} {'batches/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for n in range(1, replicas + 1):
+        servers = [replica(BATCH_MS) for _ in range(n)]
+        rate, latencies = run(servers, batches, "least_outstanding")
+        print(
+            f"{n:8d} {rate:10.1f} {np.percentile(latencies, 50):8.1f} "
+            f"{np.percentile(latencies, 99):8.1f}"
+        )
+        for server in servers:
+            server.shutdown()
+
+    print(f"\n{replicas} replicas, one {SLOW_FACTOR}x slower")
+    print(f"{'routing':>17} {'batches/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for routing in ("least_outstanding", "ewma"):
+        servers = [replica(BATCH_MS * SLOW_FACTOR)] + [
+            replica(BATCH_MS) for _ in range(replicas - 1)
+        ]
+        rate, latencies = run(servers, batches, routing)
+        print(
+            f"{routing:>17} {rate:10.1f} {np.percentile(latencies, 50):8.1f} "
+            f"{np.percentile(latencies, 99):8.1f}"
+        )
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Query encoder backends compared: remote Space vs in-process ONNX (fp32, int8).
+
+For each available backend, encodes QUERIES single queries one at a time
+(p50/p99 latency, as a search request sees it) and then in batches of 64
+(texts/s), and reports the cosine agreement of its vectors with the first
+backend's. The remote backend needs HF_SPACE_ENDPOINT; the local ones need
+onnxruntime and an export from scripts/export_onnx_encoder.py.
+
+Usage: python scripts/bench_encoders.py [queries] [threads]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from bert_processor import MovieBERTProcessor
+from config import Config
+from encoders import OnnxEncoder, RemoteEncoder
+from export_onnx_encoder import current_pca
+
+TEMPLATES = [
+    "{} movies from the nineties",
+    "a {} film with a twist ending",
+    "feel-good {} for a rainy day",
+    "dark {} set in a small town",
+    "{} about time travel",
+    "critically acclaimed {} with great dialogue",
+]
+GENRES = ["comedy", "horror", "thriller", "romance", "animated", "sci-fi", "drama", "western"]
+
+
+def queries(count):
+    texts = [t.format(g) for t in TEMPLATES for g in GENRES]
+    return [f"{texts[i % len(texts)]} #{i}" for i in range(count)]
+
+
+def backends(threads):
+    processor = MovieBERTProcessor(lazy_load=True)
+    try:
+        processor.pca = current_pca()
+    except Exception as e:
+        # Unfused exports still work; fused ones need the matching PCA
+        print(f"No PCA loaded ({e})")
+    found = []
+    if Config.HF_SPACE_ENDPOINT:
+        found.append(("remote", RemoteEncoder(processor)))
+    for label, quantized in (("local fp32", False), ("local int8", True)):
+        try:
+            found.append(
+                (label, OnnxEncoder(Config.LOCAL_ENCODER_PATH, processor.pca, quantized, threads))
+            )
+        except (ImportError, OSError, ValueError) as e:
+            print(f"{label}: unavailable ({e})")
+    return found
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else Config.LOCAL_ENCODER_THREADS
+    texts = queries(count)
+    found = backends(threads)
+    if not found:
+        print("No backend available: set HF_SPACE_ENDPOINT or export the ONNX encoder")
+        return
+
+    print(f"{count} queries, local intra-op threads {threads}")
+    print(f"{'backend':>11} {'p50 ms':>8} {'p99 ms':>8} {'texts/s':>9} {'cosine':>14}")
+    reference = None
+    for label, encoder in found:
+        encoder.encode(texts[:2])  # Warm connections / session
+        latencies = []
+        for text in texts:
+            started = time.perf_counter()
+            encoder.encode([text])
+            latencies.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        vectors = np.vstack([encoder.encode(texts[i : i + 64]) for i in range(0, count, 64)])
+        rate = count / (time.perf_counter() - started)
+
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        if reference is None:
+            reference, agreement = unit, "reference"
+        else:
+            cosine = np.sum(unit * reference, axis=1)
+            agreement = f"{cosine.mean():.4f} min {cosine.min():.3f}"
+        print(
+            f"{label:>11} {np.percentile(latencies, 50):8.2f} "
+            f"{np.percentile(latencies, 99):8.2f} {rate:9.0f} {agreement:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
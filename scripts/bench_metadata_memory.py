@@ -0,0 +1,149 @@
+"""
+Movie metadata memory: object-dtype DataFrame vs movie_store.MovieStore.
+
+Pickles a synthetic catalog shaped like data_prep output (20 genres, 1-4
+per movie; up to 15 tags from a few thousand distinct strings; distinct
+string objects per cell as read_csv produces them), then measures USS in a
+fresh process per layout: imports only, the prepared DataFrame, and the
+MovieStore with the DataFrame released (then memory_governor.release_memory,
+as the processor does). Also checks that results encode to
+identical JSON and times a 10-row result take from each.
+
+Usage: python scripts/bench_metadata_memory.py [rows ...]   (default 87585, 500000)
+"""
+
+import gc
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+GENRES = (
+    "Action Adventure Animation Children Comedy Crime Documentary Drama Fantasy "
+    "Film-Noir Horror IMAX Musical Mystery Romance Sci-Fi Thriller War Western"
+).split() + ["(no genres listed)"]
+WORDS = (
+    "dark knight star wars love story night city lost space time return king "
+    "man woman house death life world blood dead last first american little"
+).split()
+
+
+def synthetic_movies(rows):
+    rng = np.random.default_rng(0)
+    tags = np.array([f"tag {i}" for i in range(4000)])
+    tag_counts = rng.integers(0, 16, rows)
+    genre_counts = rng.integers(1, 5, rows)
+    year = rng.integers(1900, 2024, rows).astype(object)
+    year[rng.random(rows) < 0.01] = None
+    return pd.DataFrame(
+        {
+            "movieId": np.arange(1, rows + 1),
+            "title": [f"{' '.join(rng.choice(WORDS, 3))} {i} (1999)" for i in range(rows)],
+            "genres": ["|".join(rng.choice(GENRES[:-1], 2)) for _ in range(rows)],
+            "clean_title": [" ".join(rng.choice(WORDS, 3)) + f" {i}" for i in range(rows)],
+            "year": [None if y is None else str(y) for y in year],
+            # movies.csv lists genres in a fixed order
+            "genres_list": [
+                sorted(rng.choice(GENRES[:-1], n, replace=False).tolist(), key=GENRES.index)
+                for n in genre_counts
+            ],
+            "avg_rating": rng.uniform(0.5, 5, rows),
+            "rating_count": rng.integers(1, 80000, rows),
+            "combined_tags": [rng.choice(tags, n, replace=False).tolist() for n in tag_counts],
+        }
+    )
+
+
+def uss_mb():
+    import psutil
+
+    gc.collect()
+    return psutil.Process().memory_full_info().uss / 2**20
+
+
+def child(path, layout):
+    """Load the pickle like the processor does; print USS as JSON"""
+    from bert_processor import MovieBERTProcessor
+    from memory_governor import release_memory
+    from movie_store import MovieStore
+
+    if layout == "baseline":
+        return print(json.dumps({"uss_mb": uss_mb()}))
+    with open(path, "rb") as f:
+        movies = MovieBERTProcessor._prepare_movies_data(pickle.load(f))
+    if layout == "store":
+        movies = MovieStore(movies)
+    # As the processor does after compacting (both layouts, for fairness)
+    release_memory()
+    print(json.dumps({"uss_mb": uss_mb(), "rows": len(movies)}))
+
+
+def measure(path, layout):
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", path, layout],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])["uss_mb"]
+
+
+def compare_results(movies):
+    from bert_processor import MovieBERTProcessor
+    from movie_store import MovieStore
+    from results import ResultStore, encode_results
+
+    movies = MovieBERTProcessor._prepare_movies_data(movies)
+    frame_store, movie_store = ResultStore(movies), MovieStore(movies)
+    rng = np.random.default_rng(1)
+    timings = {}
+    for name, store in (("ResultStore", frame_store), ("MovieStore", movie_store)):
+        started = time.perf_counter()
+        for _ in range(2000):
+            store.take(rng.integers(0, len(movies), 10))
+        timings[name] = (time.perf_counter() - started) / 2000 * 1e6
+    for _ in range(50):
+        rows = rng.integers(0, len(movies), 20)
+        scores = rng.random(20).astype(np.float32)
+        expected = encode_results(frame_store.take(rows, scores), "recommendations")
+        assert encode_results(movie_store.take(rows, scores), "recommendations") == expected
+    return movie_store.nbytes / 2**20, timings
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        return child(sys.argv[2], sys.argv[3])
+    sizes = [int(n) for n in sys.argv[1:]] or [87_585, 500_000]
+
+    print(
+        f"{'rows':>8} {'DataFrame':>10} {'MovieStore':>11} {'saved':>7} "
+        f"{'B/row':>11} {'arrays':>7} {'take10 us':>16}"
+    )
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "movies.pkl")
+            movies = synthetic_movies(rows)
+            movies.to_pickle(path)
+            nbytes_mb, timings = compare_results(movies)
+            del movies
+            baseline = measure(path, "baseline")
+            frame = measure(path, "frame") - baseline
+            store = measure(path, "store") - baseline
+        print(
+            f"{rows:8,} {frame:9.1f}M {store:10.1f}M {1 - store / frame:6.0%} "
+            f"{frame * 2**20 / rows:5.0f}->{store * 2**20 / rows:<5.0f} {nbytes_mb:6.1f}M "
+            f"{timings['ResultStore']:7.1f}->{timings['MovieStore']:<7.1f}"
+        )
+    print("JSON output identical for sampled result sets")
+
+
+if __name__ == "__main__":
+    main()
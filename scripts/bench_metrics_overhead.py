@@ -0,0 +1,102 @@
+"""
+Overhead of per-stage metrics on the dense query path.
+
+Runs recommend_by_query (dense, columnar) plus response encoding against a
+synthetic catalog with Config.METRICS_ENABLED off and on, alternating
+rounds to cancel drift, and reports the per-request difference next to the
+raw cost of one metrics.stage() block.
+
+Usage: python scripts/bench_metrics_overhead.py [catalog_rows] [dims]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+import metrics
+from config import Config
+from rec_engine import MovieRecommendationEngine
+from results import encode_results
+
+REQUESTS = 300
+ROUNDS = 5
+
+
+class SyntheticProcessor:
+    """Attributes the engine reads, over a random unit-normalized catalog"""
+
+    def __init__(self, n, dims):
+        rng = np.random.default_rng(0)
+        genres = ["Action", "Comedy", "Drama", "Horror", "Romance", "Sci-Fi"]
+        self.movies_data = pd.DataFrame(
+            {
+                "movieId": np.arange(1, n + 1, dtype=np.int32),
+                "clean_title": [f"Movie Title {i}" for i in range(n)],
+                "year": rng.integers(1920, 2024, n).astype(str),
+                "genres_list": [list(rng.choice(genres, 2, replace=False)) for _ in range(n)],
+                "avg_rating": rng.uniform(1, 5, n).astype(np.float32),
+                "rating_count": rng.integers(1, 5000, n).astype(np.int32),
+                "combined_tags": [["tag"] for _ in range(n)],
+            }
+        )
+        embeddings = rng.standard_normal((n, dims)).astype(np.float32)
+        self.movie_embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.catalog_index = None
+        self._query = rng.standard_normal((1, dims)).astype(np.float32)
+
+    def encode(self, texts, force_semantic=False):
+        return self._query
+
+    def _get_embeddings(self):
+        return self.movie_embeddings
+
+
+def one_request(engine):
+    metrics.start_request()
+    results = engine.recommend_by_query("space adventure", 8, mode="dense", columnar=True)
+    with metrics.stage("serialization"):
+        encode_results(results, "recommendations")
+
+
+def timed(engine, enabled):
+    Config.METRICS_ENABLED = enabled
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        one_request(engine)
+    return (time.perf_counter() - started) / REQUESTS * 1e6
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    dims = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    engine = MovieRecommendationEngine(SyntheticProcessor(n, dims), use_imdb=False)
+    one_request(engine)  # Build indexes outside the timed loop
+
+    off, on = [], []
+    for _ in range(ROUNDS):
+        off.append(timed(engine, False))
+        on.append(timed(engine, True))
+    off_us, on_us = min(off), min(on)
+
+    Config.METRICS_ENABLED = True
+    metrics.start_request()
+    started = time.perf_counter()
+    for _ in range(100_000):
+        with metrics.stage("bench"):
+            pass
+    stage_us = (time.perf_counter() - started) / 100_000 * 1e6
+
+    print(f"{n:,} x {dims} catalog, dense top_k=8, best of {ROUNDS} x {REQUESTS} requests")
+    print(f"metrics off: {off_us:8.1f}us/request")
+    print(f"metrics on:  {on_us:8.1f}us/request")
+    print(f"overhead:    {on_us - off_us:8.1f}us ({(on_us - off_us) / off_us:+.2%})")
+    print(f"one stage(): {stage_us:8.2f}us")
+
+
+if __name__ == "__main__":
+    main()
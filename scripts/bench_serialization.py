@@ -0,0 +1,104 @@
+"""
+Result building and serialization time for 8 vs 500 results.
+
+"legacy" is the previous path: one .iloc per result row, the recursive
+normalize() pass and stdlib json. The other rows take columns from a
+ResultStore (built once at load) and encode them with
+results.encode_results (orjson when installed) as records, columns, or
+MessagePack columns.
+
+Usage: python scripts/bench_serialization.py [catalog_rows]
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from results import ResultStore, encode_results, msgpack, orjson
+from serving import normalize
+
+REPEATS = 200
+
+
+def synthetic_movies(n):
+    rng = np.random.default_rng(0)
+    genres = ["Action", "Comedy", "Drama", "Horror", "Romance", "Sci-Fi"]
+    return pd.DataFrame(
+        {
+            "movieId": np.arange(1, n + 1, dtype=np.int32),
+            "clean_title": [f"Movie Title {i}" for i in range(n)],
+            "year": rng.integers(1920, 2024, n).astype(str),
+            "genres_list": [list(rng.choice(genres, 2, replace=False)) for _ in range(n)],
+            "avg_rating": rng.uniform(1, 5, n).astype(np.float32),
+        }
+    )
+
+
+def legacy(movies, rows, scores):
+    recommendations = []
+    for idx, score in zip(rows, scores):
+        movie = movies.iloc[idx]
+        recommendations.append(
+            {
+                "movieId": movie["movieId"],
+                "title": movie["clean_title"],
+                "year": movie.get("year", "Unknown"),
+                "genres": movie.get("genres_list", []),
+                "avg_rating": movie.get("avg_rating", 0),
+                "score": float(score),
+            }
+        )
+    payload = {
+        "success": True,
+        "recommendations": normalize(recommendations),
+        "count": len(recommendations),
+    }
+    return json.dumps(payload).encode()
+
+
+def columnar(store, rows, scores, fmt):
+    results = store.take(rows, scores)
+    return encode_results(results, "recommendations", fmt)[0]
+
+
+def timed(fn):
+    fn()
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        body = fn()
+    return (time.perf_counter() - start) / REPEATS * 1e6, len(body)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    movies = synthetic_movies(n)
+    store = ResultStore(movies)  # built once at load in the server
+    rng = np.random.default_rng(1)
+    print(f"{n:,} movies; orjson={'yes' if orjson else 'no'}, msgpack={'yes' if msgpack else 'no'}")
+
+    for k in (8, 500):
+        rows = rng.choice(n, k, replace=False)
+        scores = np.sort(rng.random(k).astype(np.float32))[::-1]
+        cases = [("legacy", lambda: legacy(movies, rows, scores))]
+        formats = ["records", "columns"] + (["msgpack"] if msgpack else [])
+        for fmt in formats:
+            cases.append((fmt, lambda fmt=fmt: columnar(store, rows, scores, fmt)))
+
+        baseline = None
+        for name, fn in cases:
+            us, size = timed(fn)
+            baseline = baseline or us
+            print(
+                f"top_k={k:>3} {name:>8}: {us:9.1f}us  {size / 1024:7.1f}KB  "
+                f"{baseline / us:5.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
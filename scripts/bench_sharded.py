@@ -0,0 +1,56 @@
+"""
+Scaling of scatter-gather sharded scoring from 1 to 8 processes.
+
+Reuses the synthetic unit embedding file from bench_blocked.py and reports
+per-query latency and speedup relative to a single shard. Speedup is bounded
+by the number of cores (os.cpu_count()) and memory bandwidth.
+
+Usage: python scripts/bench_sharded.py [rows] [path]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from bench_blocked import DIMS, write_synthetic
+from config import Config
+from sharded_index import ShardedScorer
+
+TOP_K = 10
+QUERIES = 20
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 4_000_000
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(
+        tempfile.gettempdir(), f"bench_unit_{n}.npy"
+    )
+    if not os.path.exists(path):
+        write_synthetic(path, n)
+    queries = np.random.default_rng(1).standard_normal((QUERIES, DIMS)).astype(np.float32)
+    print(f"{n:,} rows x {DIMS} dims, {os.cpu_count()} cores available")
+
+    baseline = None
+    reference = None
+    for shards in (1, 2, 4, 8):
+        scorer = ShardedScorer(path, shards, Config.SCORING_BLOCK_ROWS)
+        try:
+            scorer.top_k(queries[0], TOP_K)  # warm page cache
+            start = time.perf_counter()
+            results = [scorer.top_k(q, TOP_K)[0].tolist() for q in queries]
+            ms = (time.perf_counter() - start) / QUERIES * 1000
+        finally:
+            scorer.close()
+        if reference is None:
+            baseline, reference = ms, results
+        assert results == reference
+        print(f"{shards} shard(s): {ms:7.1f} ms/query, speedup {baseline / ms:4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
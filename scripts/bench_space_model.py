@@ -0,0 +1,109 @@
+"""
+Embedding server throughput: float32 vs int8, one big encode vs a worker pool.
+
+Encodes movie descriptions (prepare_movie_texts over the current artifact's
+movies, else the embeddings pickle, else synthetic ones of the same shape)
+with the model (EMBED_MODEL) as hf_space_app.py loads it, in batches of
+EMBED_BATCH_SIZE submitted to the app's encode pool:
+- fp32, 1 worker x all cores (the old default threading)
+- fp32, workers x threads from EMBED_WORKERS / EMBED_THREADS
+- int8, 1 worker x all cores and workers x threads
+and reports texts/s plus cosine agreement with the fp32 vectors.
+
+Needs sentence-transformers, torch and fastapi (as the Space does).
+
+Usage: python scripts/bench_space_model.py [texts] [workers] [threads]
+"""
+
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+import hf_space_app
+from artifacts import current_version, read_artifact, version_dir
+from bert_processor import MovieBERTProcessor
+from config import Config
+
+
+def movie_texts(count):
+    try:
+        version = current_version()
+        if version is not None:
+            movies = read_artifact(version_dir(version), verify=False, mmap=True)["movies_data"]
+        else:
+            with open(Config.EMBEDDINGS_FILE, "rb") as f:
+                movies = pickle.load(f)["movies_data"]
+    except Exception as e:
+        print(f"No movie catalog ({e}); using synthetic descriptions")
+        return synthetic_texts(count)
+    sample = movies.sample(min(count, len(movies)), random_state=0)
+    return MovieBERTProcessor(lazy_load=True).prepare_movie_texts(sample)
+
+
+def synthetic_texts(count):
+    """Descriptions shaped like prepare_movie_texts output, with varied lengths"""
+    rng = np.random.default_rng(0)
+    genres = ["Comedy", "Drama", "Horror", "Romance", "Thriller", "Animation", "Sci-Fi"]
+    tags = ["atmospheric", "dark", "twist ending", "funny", "classic", "quirky", "cult"]
+    texts = []
+    for i in range(count):
+        text = (
+            f"Title: Movie {i}. Genres: {', '.join(rng.choice(genres, 2, replace=False))}. "
+            f"Year: {rng.integers(1950, 2024)}. "
+            f"Rating: {rng.uniform(1, 5):.1f}/5.0 ({rng.integers(1, 5000)} reviews)"
+        )
+        if i % 3:
+            text += f". Tags: {', '.join(rng.choice(tags, rng.integers(1, 8)))}"
+        texts.append(text)
+    return texts
+
+
+def run(model, texts, workers, threads):
+    batch_size = hf_space_app.BATCH_SIZE
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+    with hf_space_app.encode_pool(workers, threads) as pool:
+        list(pool.map(lambda batch: hf_space_app.encode(model, batch), batches[:workers]))
+        started = time.perf_counter()
+        vectors = list(pool.map(lambda batch: hf_space_app.encode(model, batch), batches))
+        elapsed = time.perf_counter() - started
+    return len(texts) / elapsed, np.vstack(vectors)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else hf_space_app.WORKERS
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else hf_space_app.THREADS
+    cores = hf_space_app.CORES
+    texts = movie_texts(count)
+    print(
+        f"{len(texts)} movie descriptions, batches of {hf_space_app.BATCH_SIZE}, "
+        f"{cores} cores"
+    )
+    print(f"{'model':>6} {'workers':>8} {'threads':>8} {'texts/s':>9} {'cosine':>20}")
+
+    reference = None
+    for quantize in ("none", "int8"):
+        torch.set_num_threads(cores)
+        model = hf_space_app.load_model(quantize)
+        for pool_workers, pool_threads in dict.fromkeys([(1, cores), (workers, threads)]):
+            rate, vectors = run(model, texts, pool_workers, pool_threads)
+            unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            if reference is None:
+                reference, agreement = unit, "reference"
+            else:
+                cosine = np.sum(unit * reference, axis=1)
+                agreement = f"{cosine.mean():.4f} (min {cosine.min():.3f})"
+            label = "fp32" if quantize == "none" else quantize
+            print(
+                f"{label:>6} {pool_workers:8d} {pool_threads:8d} {rate:9.1f} {agreement:>20}"
+            )
+
+
+if __name__ == "__main__":
+    main()
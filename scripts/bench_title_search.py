@@ -0,0 +1,87 @@
+"""
+Benchmark title search latency and index memory on a synthetic catalog.
+
+Usage: python scripts/bench_title_search.py [num_titles]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from fuzzy_index import FuzzyTitleIndex
+from title_index import TitleIndex
+
+WORDS = (
+    "the dark knight star wars return lost city night day love story house "
+    "dead man river last blood ghost king queen secret island war game life "
+    "space time heart fire ice shadow dream road home summer winter spider "
+    "iron golden silent black white red blue little big wild crazy happy"
+).split()
+
+
+def synthetic_titles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, 5, size=n)
+    picks = rng.integers(0, len(WORDS), size=lengths.sum())
+    titles, pos = [], 0
+    for i, length in enumerate(lengths):
+        words = [WORDS[j] for j in picks[pos : pos + length]]
+        pos += length
+        titles.append(" ".join(words).title() + f" {i}")
+    popularity = rng.zipf(1.5, size=n)
+    return titles, popularity
+
+
+def time_queries(fn, queries, repeat=5):
+    """Return median latency in microseconds per query."""
+    samples = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            fn(q)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return float(np.median(samples)), float(np.percentile(samples, 99))
+
+
+def build(cls, titles, popularity):
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = cls(titles, popularity)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        f"{cls.__name__}: built over {len(titles):,} titles in {elapsed:.2f}s, "
+        f"{size / 2**20:.1f}MB retained, {peak / 2**20:.1f}MB peak"
+    )
+    return index
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    titles, popularity = synthetic_titles(n)
+
+    index = build(TitleIndex, titles, popularity)
+    fuzzy = build(FuzzyTitleIndex, titles, popularity)
+
+    prefixes = ["d", "da", "dar", "dark k", "ret", "spider ma", "gho", "zz"]
+    median, p99 = time_queries(lambda q: index.prefix(q, 8), prefixes)
+    print(f"autocomplete: median {median:.1f}us, p99 {p99:.1f}us")
+
+    terms = ["knight", "lost city", "ghost", "red", "spider man 1"]
+    median, p99 = time_queries(lambda q: index.substring(q, 20), terms)
+    print(f"substring:    median {median:.1f}us, p99 {p99:.1f}us")
+
+    typos = ["ghots", "spidr man", "shadw kingg", "secert island", "winetr"]
+    median, p99 = time_queries(lambda q: fuzzy.search(q, 20), typos)
+    print(f"fuzzy:        median {median:.1f}us, p99 {p99:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Publish the legacy embeddings pickle as a versioned artifact.
+
+Writes ARTIFACT_DIR/<version>/ (embeddings, unit .npy, movie data, PCA mean
+and components as .npy arrays, and a manifest with checksums) and then points ARTIFACT_DIR/CURRENT at it. Running
+servers pick it up through their ARTIFACT_WATCH_INTERVAL watcher, or one
+worker at a time via POST /api/admin/reload.
+
+Usage: python scripts/export_artifact.py [embeddings.pkl] [version]
+"""
+
+import os
+import pickle
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from artifacts import write_artifact
+from config import Config
+from projection import PCAProjection
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else Config.EMBEDDINGS_FILE
+    version = sys.argv[2] if len(sys.argv) > 2 else None
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    directory = write_artifact(
+        data["embeddings"],
+        data["movies_data"],
+        PCAProjection.from_arrays(data) or data.get("pca"),
+        version=version,
+    )
+    print(f"Published {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Export the sentence model for the in-process query encoder (ENCODER_BACKENDS=local).
+
+Writes LOCAL_ENCODER_PATH/ with model.onnx (mean pooling, L2 normalization
+and the current artifact's PCA fused into the graph), a dynamically
+quantized model_int8.onnx, tokenizer.json and encoder.json. The fused PCA
+ties the export to that artifact: re-export after regenerating embeddings
+(the server refuses a mismatched export and falls back to the next backend).
+
+Needs torch, transformers, onnxruntime and onnx (requirements-export.txt).
+
+Usage: python scripts/export_onnx_encoder.py [output_dir] [--unfused] [--no-int8]
+"""
+
+import os
+import pickle
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from artifacts import current_version, read_artifact, version_dir
+from config import Config
+from encoders import export_onnx
+from projection import PCAProjection
+
+# The model hf_space_app.py serves: the stored embeddings come from it
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def current_pca():
+    """The PCA of the current artifact, else of the legacy embeddings pickle"""
+    version = current_version()
+    if version is not None:
+        return read_artifact(version_dir(version), verify=False, mmap=True)["pca"]
+    with open(Config.EMBEDDINGS_FILE, "rb") as f:
+        data = pickle.load(f)
+    return PCAProjection.from_arrays(data) or PCAProjection.from_sklearn(data.get("pca"))
+
+
+def main():
+    from transformers import AutoModel, AutoTokenizer
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    directory = args[0] if args else Config.LOCAL_ENCODER_PATH
+    projection = None if "--unfused" in sys.argv else current_pca()
+
+    model = AutoModel.from_pretrained(MODEL_NAME)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    manifest = export_onnx(
+        model, tokenizer, directory, projection, quantize="--no-int8" not in sys.argv
+    )
+    for name in (manifest["model"], manifest["quantized"]):
+        if name:
+            size = os.path.getsize(os.path.join(directory, name)) / 1024**2
+            print(f"{os.path.join(directory, name)}: {size:.1f}MB")
+    print(
+        f"{manifest['dims']}D output, PCA "
+        f"{'fused (' + manifest['pca_fingerprint'] + ')' if projection else 'not fused'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Cold import-time report for the serving entry point.
+
+Imports a module in fresh interpreters with `python -X importtime`, reports
+the median total and the slowest modules by cumulative time, and fails when
+the serving path pulls in offline-only libraries (torch, transformers,
+sentence_transformers, sklearn) or exceeds the time budget.
+
+Usage: python scripts/import_time_report.py [module] [budget_seconds] [runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("torch", "transformers", "sentence_transformers", "sklearn")
+TOP = 15
+
+
+def import_times(module):
+    """{module: (self_us, cumulative_us)} for one cold import of module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:") :].split("|")
+        if not fields[0].strip().isdigit():
+            continue  # header row
+        name = fields[2].strip()
+        times[name] = (int(fields[0]), int(fields[1]))
+    return times
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "flask_api"
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    samples = [import_times(module) for _ in range(runs)]
+    totals = [s[module][1] / 1e6 for s in samples]
+    total = statistics.median(totals)
+    last = samples[-1]
+
+    print(f"import {module}: median {total:.3f}s over {runs} cold runs (budget {budget:.1f}s)")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    ranked = sorted(last.items(), key=lambda item: -item[1][1])
+    for name, (self_us, cumulative_us) in ranked[:TOP]:
+        print(f"{cumulative_us / 1000:10.1f}ms {self_us / 1000:8.1f}ms  {name}")
+
+    heavy = sorted({name for name in last if name.split(".")[0] in HEAVY})
+    roots = sorted({name.split(".")[0] for name in heavy})
+    if roots:
+        print(f"FAIL: serving imports offline-only packages: {', '.join(roots)}")
+    if total > budget:
+        print(f"FAIL: {total:.3f}s exceeds the {budget:.1f}s budget")
+    sys.exit(1 if roots or total > budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Load test for admission control under overload.
+
+Concurrent clients send requests back to back against a simulated backend
+that serves BACKEND_SLOTS requests at a time in UPSTREAM_MS each (the
+embedding endpoint plus scoring), so offered load far exceeds capacity.
+Runs the same traffic without admission control (everyone queues) and
+with an AdmissionController, and reports served/refused counts and
+latency: refusals come back immediately instead of after a long queue.
+
+Usage: python scripts/load_test_admission.py [clients] [seconds] [max_concurrency] [max_queue] [max_wait]
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from admission import AdmissionController, Overloaded
+
+BACKEND_SLOTS = 2
+UPSTREAM_MS = 100
+
+
+def run(clients, seconds, controller):
+    backend = threading.Semaphore(BACKEND_SLOTS)
+    lock = threading.Lock()
+    served, refused = [], []
+    stop_at = time.perf_counter() + seconds
+
+    def request():
+        with backend:
+            time.sleep(UPSTREAM_MS / 1000)
+
+    def client():
+        local_served, local_refused = [], []
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                if controller is None:
+                    request()
+                else:
+                    with controller.admit():
+                        request()
+                local_served.append(time.perf_counter() - started)
+            except Overloaded as e:
+                local_refused.append(time.perf_counter() - started)
+                # Well-behaved clients honor Retry-After (scaled down for the test)
+                time.sleep(e.retry_after / 10)
+        with lock:
+            served.extend(local_served)
+            refused.extend(local_refused)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(served) * 1000, np.array(refused) * 1000
+
+
+def summary(label, served, refused):
+    def pct(values, q):
+        return np.percentile(values, q) if len(values) else float("nan")
+
+    print(
+        f"{label:>10} {len(served):7d} {len(refused):8d} "
+        f"{pct(served, 50):8.0f} {pct(served, 99):8.0f} {pct(served, 100):8.0f} "
+        f"{pct(refused, 99):10.1f}"
+    )
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    max_concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else BACKEND_SLOTS
+    max_queue = int(sys.argv[4]) if len(sys.argv) > 4 else 4 * BACKEND_SLOTS
+    max_wait = float(sys.argv[5]) if len(sys.argv) > 5 else 0.5
+    print(
+        f"{clients} clients for {seconds:.0f}s; backend {BACKEND_SLOTS} x {UPSTREAM_MS}ms "
+        f"(capacity {BACKEND_SLOTS * 1000 // UPSTREAM_MS} req/s); admission "
+        f"{max_concurrency} running, {max_queue} queued, {max_wait}s max wait"
+    )
+    print(
+        f"{'':>10} {'served':>7} {'refused':>8} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'max ms':>8} {'refused p99':>10}"
+    )
+    summary("no limit", *run(clients, seconds, None))
+    controller = AdmissionController(max_concurrency, max_queue, max_wait)
+    summary("admission", *run(clients, seconds, controller))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Load test for single-flight deduplication under a skewed query mix.
+
+Concurrent clients draw queries from a Zipf distribution (a few trending
+queries, a long tail) and each request makes one simulated upstream encode
+of UPSTREAM_MS. Runs the same traffic with and without SingleFlight and
+reports upstream calls avoided and request latency.
+
+Usage: python scripts/load_test_singleflight.py [clients] [requests_per_client] [zipf_s]
+"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from singleflight import SingleFlight, flight_key
+
+DISTINCT_QUERIES = 1000
+UPSTREAM_MS = 50
+
+
+def zipf_queries(n, s, seed=0):
+    """n query strings with rank-frequency ~ 1 / rank**s over DISTINCT_QUERIES."""
+    ranks = np.arange(1, DISTINCT_QUERIES + 1)
+    weights = 1.0 / ranks**s
+    picks = np.random.default_rng(seed).choice(
+        DISTINCT_QUERIES, size=n, p=weights / weights.sum()
+    )
+    return [f"trending query {i}" for i in picks]
+
+
+def run(clients, per_client, s, single_flight):
+    flights = SingleFlight()
+    upstream_calls = [0]
+    lock = threading.Lock()
+    latencies = []
+
+    def upstream(query):
+        with lock:
+            upstream_calls[0] += 1
+        time.sleep(UPSTREAM_MS / 1000)
+        return [query]
+
+    def client(index):
+        local = []
+        for query in zipf_queries(per_client, s, seed=index):
+            started = time.perf_counter()
+            if single_flight:
+                flights.do(flight_key(query, 8), lambda: upstream(query))
+            else:
+                upstream(query)
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return upstream_calls[0], elapsed, np.array(latencies) * 1000
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    s = float(sys.argv[3]) if len(sys.argv) > 3 else 1.1
+    total = clients * per_client
+    print(
+        f"{clients} clients x {per_client} requests, Zipf s={s} over "
+        f"{DISTINCT_QUERIES} queries, upstream {UPSTREAM_MS}ms"
+    )
+
+    for single_flight in (False, True):
+        calls, elapsed, latencies = run(clients, per_client, s, single_flight)
+        label = "single-flight" if single_flight else "baseline"
+        print(
+            f"{label:>13}: {calls:6,} upstream calls for {total:,} requests "
+            f"({1 - calls / total:6.1%} avoided), {total / elapsed:7.0f} req/s, "
+            f"p50 {np.percentile(latencies, 50):5.1f}ms "
+            f"p99 {np.percentile(latencies, 99):5.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Report per-worker memory of a running gunicorn server.
+
+USS (unique set size) is memory only that worker holds; PSS splits shared
+pages between the processes mapping them. With the engine preloaded in the
+master, worker USS should stay small while RSS looks like a full copy.
+
+Usage: python scripts/measure_worker_memory.py <gunicorn master pid>
+"""
+
+import sys
+
+import psutil
+
+
+def mb(value):
+    return f"{value / 2**20:8.1f}MB"
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    master = psutil.Process(int(sys.argv[1]))
+    processes = [master] + master.children(recursive=True)
+
+    print(f"{'pid':>8} {'role':>7} {'rss':>10} {'uss':>10} {'pss':>10}")
+    totals = {"rss": 0, "uss": 0, "pss": 0}
+    for process in processes:
+        info = process.memory_full_info()
+        role = "master" if process.pid == master.pid else "worker"
+        pss = getattr(info, "pss", 0)
+        print(f"{process.pid:>8} {role:>7} {mb(info.rss)} {mb(info.uss)} {mb(pss)}")
+        totals["rss"] += info.rss
+        totals["uss"] += info.uss
+        totals["pss"] += pss
+
+    workers = len(processes) - 1
+    print(
+        f"{'total':>16} {mb(totals['rss'])} {mb(totals['uss'])} {mb(totals['pss'])}"
+        f"  ({workers} workers)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Memory governor plans vs measured memory under several budgets.
+
+Publishes a synthetic artifact, then for each budget builds the serving
+engine in a fresh process (serving.build_engine with MEMORY_BUDGET_MB),
+runs one dense query and one title search so lazy structures exist, and
+prints the plan, its expected footprint and the measured USS (memory
+unique to the process, which excludes clean memory-mapped file pages).
+
+Usage: python scripts/memory_plan_report.py [rows] [dims] [budget_mb ...]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+WORDS = (
+    "dark knight star wars love story night city lost space time return king "
+    "man woman house death life world"
+).split()
+
+
+def publish(root, rows, dims):
+    import artifacts
+
+    rng = np.random.default_rng(0)
+    genres = ["Action", "Comedy", "Drama", "Horror", "Romance", "Sci-Fi"]
+    movies = pd.DataFrame(
+        {
+            "movieId": np.arange(1, rows + 1, dtype=np.int32),
+            "clean_title": [" ".join(rng.choice(WORDS, 3)) + f" {i}" for i in range(rows)],
+            "year": rng.integers(1920, 2024, rows).astype(str),
+            "genres_list": [rng.choice(genres, 2, replace=False).tolist() for _ in range(rows)],
+            "avg_rating": rng.uniform(1, 5, rows).astype(np.float32),
+            "rating_count": rng.integers(1, 5000, rows).astype(np.int32),
+            "combined_tags": [rng.choice(WORDS, 5).tolist() for _ in range(rows)],
+        }
+    )
+    embeddings = rng.standard_normal((rows, dims)).astype(np.float32)
+    return artifacts.write_artifact(embeddings, movies, root=root, version="bench")
+
+
+def child(directory):
+    """Build the engine under the inherited MEMORY_BUDGET_MB; print JSON"""
+    import psutil
+
+    from memory_governor import memory_governor
+    from serving import build_engine
+
+    engine = build_engine(directory)
+    query = np.ones(engine.bert_processor.movie_embeddings.shape[1], np.float32)
+    engine.recommend_by_query("night city", 8, mode="dense", query_embedding=query)
+    engine.search_movies("nigth city", mode="auto")
+    info = psutil.Process().memory_full_info()
+    print(
+        json.dumps(
+            {
+                "plan": memory_governor.last_plan.to_dict(),
+                "uss_mb": info.uss / 2**20,
+                "rss_mb": info.rss / 2**20,
+            }
+        )
+    )
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        return child(sys.argv[2])
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    dims = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    budgets = [float(b) for b in sys.argv[3:]] or [2048, 400, 300, 250]
+
+    with tempfile.TemporaryDirectory() as root:
+        directory = publish(root, rows, dims)
+        print(f"{rows:,} x {dims} catalog")
+        print(
+            f"{'budget':>8} {'dense':>8} {'fuzzy':>6} {'bm25':>5} {'cache':>6} "
+            f"{'expected':>9} {'uss':>8} {'rss':>8}"
+        )
+        for budget in budgets:
+            env = dict(os.environ, MEMORY_BUDGET_MB=str(budget))
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", directory],
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            plan = result["plan"]
+            print(
+                f"{budget:7.0f}M {plan['dense_scoring']:>8} {str(plan['fuzzy_index']):>6} "
+                f"{str(plan['sparse_index']):>5} {plan['query_cache_size']:>6} "
+                f"{plan['total_mb']:8.1f}M {result['uss_mb']:7.1f}M {result['rss_mb']:7.1f}M"
+            )
+
+
+if __name__ == "__main__":
+    main()
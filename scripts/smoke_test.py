@@ -27,7 +27,7 @@ def main():
 
     # Similar by movieId if available
     if len(processor.movies_data) > 0:
-        sample_id = int(processor.movies_data.iloc[0]["movieId"])
+        sample_id = int(processor.movies_data["movieId"][0])
         print(f"\nSimilar to movieId={sample_id}")
         sim = engine.recommend_similar_movies(sample_id, top_k=5)
         for i, r in enumerate(sim, 1):
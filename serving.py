@@ -0,0 +1,328 @@
+"""Engine lifecycle and request helpers shared by the Flask and ASGI apps."""
+
+import hmac
+import logging
+
+import numpy as np
+
+import artifacts
+from admission import DEGRADED, AdmissionController, ResultCache
+from bert_processor import MovieBERTProcessor
+from catalog_index import FILTER_KEYS, parse_filters
+from config import Config
+from engine_manager import EngineManager
+from memory_governor import memory_governor
+from metrics import REGISTRY, Gauge
+from profiling import memory_diff
+from rec_engine import MovieRecommendationEngine
+from results import RESPONSE_FORMATS, msgpack
+from singleflight import SingleFlight
+from warmup import Warmup, touch_pages
+
+logger = logging.getLogger(__name__)
+
+
+def log_memory(stage=""):
+    """Log current memory usage"""
+    try:
+        import psutil
+        import os
+
+        process = psutil.Process(os.getpid())
+        mem_mb = process.memory_info().rss / 1024 / 1024
+        logger.info(f"Memory at {stage}: {mem_mb:.2f} MB")
+        return mem_mb
+    except ImportError:
+        return None
+
+
+def build_engine(artifact_dir=None):
+    """
+    Build a fully loaded engine: from a versioned artifact directory when one
+    is published, otherwise from the legacy embeddings pickle.
+    """
+    log_memory("before engine init")
+    logger.info("Initializing recommendation engine...")
+    bert_processor = MovieBERTProcessor(lazy_load=True)
+    if artifact_dir:
+        bert_processor.load_artifact(artifact_dir, planner=memory_governor.plan)
+    else:
+        bert_processor.load_embeddings(planner=memory_governor.plan)
+    memory_governor.register(bert_processor.query_cache)
+    engine = MovieRecommendationEngine(bert_processor, use_imdb=False)
+    if engine.dense_scoring in ("exact", "cascade"):
+        engine.dense_index
+    elif engine.dense_scoring == "blocked":
+        bert_processor.embeddings_memmap()
+    # Sharded scorers own worker processes and pipes, so they are started
+    # lazily on first query rather than inherited across a fork.
+    logger.info("Engine ready")
+    log_memory("engine built")
+    return engine
+
+
+# Live engine; swapped atomically when a new artifact version is published
+engine_manager = EngineManager(
+    build_engine, watch_interval=Config.ARTIFACT_WATCH_INTERVAL
+)
+
+
+# Shared by concurrent identical query requests (threaded servers)
+query_flights = SingleFlight()
+
+# Bounds concurrent /api/recommendations/* work in the Flask app; recent
+# results back degraded answers to the requests it refuses
+admission = AdmissionController()
+recent_results = ResultCache()
+memory_governor.register(recent_results)
+
+
+def _query_cache_size():
+    """Entries in the live engine's query embedding cache (0 before load)"""
+    if not engine_manager.loaded:
+        return 0
+    return len(engine_manager.current().bert_processor.query_cache)
+
+
+REGISTRY.register(
+    Gauge(
+        "recommender_singleflight_executed",
+        "Query computations run by single-flight leaders",
+        lambda: query_flights.executed,
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "recommender_singleflight_shared",
+        "Query requests served from another request's computation",
+        lambda: query_flights.shared,
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "recommender_query_cache_entries",
+        "Query embeddings held in the LRU cache",
+        _query_cache_size,
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "recommender_engine_in_flight",
+        "Requests currently holding the live engine",
+        lambda: engine_manager.status()["live_in_flight"],
+    )
+)
+
+
+def start_background_threads():
+    """Memory governor and CURRENT watcher threads, once per serving process"""
+    memory_governor.start()
+    engine_manager.start_watcher()
+
+
+def get_engine():
+    """Get or create the recommendation engine (lazy loading for fast startup)"""
+    start_background_threads()
+    try:
+        return engine_manager.current()
+    except Exception as e:
+        logger.error(f"Failed to initialize recommendation engine: {e}")
+        raise
+
+
+def preload_engine():
+    """
+    Build the engine and everything requests read (metadata, indexes,
+    embedding matrix) up front. gunicorn.conf.py calls this in the master so
+    forked workers share one copy instead of loading their own. No threads
+    are started: the master serves nothing, a watcher there would rebuild
+    engines nobody uses, and a fork while one held a lock would copy it
+    locked into the worker. Workers start theirs from start_warmup().
+    """
+    engine = engine_manager.current(watch=False)
+    log_memory("engine preloaded")
+    return engine
+
+
+def _touch_engine_pages():
+    """Fault in the embedding matrix the configured scorer reads"""
+    engine = get_engine()
+    if engine.dense_scoring in ("exact", "cascade"):
+        touch_pages(engine.dense_index.lead)
+        touch_pages(engine.dense_index.tail)
+    else:
+        touch_pages(engine.bert_processor.embeddings_memmap())
+
+
+def _probe_encode():
+    """Open the embedding connection and wake the Space with one encode"""
+    if Config.WARMUP_PROBE_ENCODE:
+        get_engine().bert_processor.encode([Config.WARMUP_PROBE_QUERY])
+
+
+# Boot warm-up, run per process (gunicorn workers start it from post_fork)
+warmup = Warmup(
+    [
+        ("load_engine", get_engine, True),
+        ("touch_pages", _touch_engine_pages, True),
+        ("probe_encode", _probe_encode, False),
+    ]
+)
+
+
+def start_warmup():
+    """Start this process's background threads and, if enabled, the warm-up"""
+    start_background_threads()
+    if Config.WARMUP_ON_START:
+        warmup.start()
+
+
+def capture_memory_diff(data):
+    """
+    tracemalloc diff around one operation for the admin endpoint: a
+    recommendation query ("query", the default) or a full engine build
+    from the published artifact ("load", built aside and discarded). A load
+    is refused (ValueError) when the live engine's planned footprint does not
+    fit in the memory budget left above the current RSS.
+    """
+    target = data.get("target", "query")
+    limit = int(data.get("limit", 25))
+    if target == "query":
+        query = (data.get("query") or Config.WARMUP_PROBE_QUERY).strip()
+        top_k = int(data.get("top_k", 8))
+        filters = request_filters(data)
+        mode = data.get("mode")
+
+        def run():
+            with engine_manager.acquire() as engine:
+                engine.recommend_by_query(query, top_k, filters, mode)
+
+        get_engine()  # Build outside the capture
+    elif target == "load":
+        plan = getattr(get_engine().bert_processor, "plan", None)
+        needed_mb = 0.0
+        if plan is not None:
+            needed_mb = plan.total_mb - plan.expected_mb.get("baseline", 0.0)
+        headroom = memory_governor.headroom_mb()
+        if headroom is not None and needed_mb > headroom:
+            raise ValueError(
+                f"A second engine needs ~{needed_mb:.0f}MB but only {max(headroom, 0):.0f}MB "
+                f"of the memory budget is free; not loading it in a serving worker"
+            )
+
+        def run():
+            version = artifacts.current_version()
+            build_engine(artifacts.version_dir(version) if version else None).close()
+
+    else:
+        raise ValueError("target must be 'query' or 'load'")
+    return {"target": target, **memory_diff(run, limit=limit)}
+
+
+def degraded_results(key, top_k=None, filters=None):
+    """
+    (source, results) for a request refused by admission control or whose
+    query the embedding backend could not encode: the recent result for the
+    same key ("cached"), else the most-rated movies matching filters
+    ("popular") when top_k is given and the engine is already loaded. None
+    when degraded answers are off or unavailable.
+    """
+    if not Config.ADMISSION_DEGRADED:
+        return None
+    results = recent_results.get(key)
+    source = "cached"
+    if results is None:
+        if top_k is None or not engine_manager.loaded:
+            return None
+        try:
+            with engine_manager.acquire() as engine:
+                results = engine.popular_movies(top_k, filters, columnar=True)
+        except ValueError:
+            return None
+        source = "popular"
+    DEGRADED.inc(source)
+    return source, results
+
+
+def admin_token_valid(token):
+    """Admin endpoints require Config.ADMIN_TOKEN (disabled when unset)."""
+    if not Config.ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token, Config.ADMIN_TOKEN)
+
+
+def request_filters(data=None, args=None):
+    """Read structured filters from a JSON body ("filters") or query params."""
+    if data is not None and "filters" in data:
+        return parse_filters(data.get("filters"))
+    source = data if data is not None else (args or {})
+    return parse_filters({key: source.get(key) for key in FILTER_KEYS})
+
+
+def _accept_quality(accept, media_types):
+    """Highest q the Accept header gives any of media_types (0 when absent)."""
+    quality = 0.0
+    for part in (accept or "").split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        if media_type.lower() not in media_types:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        quality = max(quality, q)
+    return quality
+
+
+def response_format(requested=None, accept=""):
+    """
+    Response format for result lists: the requested one, else MessagePack
+    when msgpack is installed and the client prefers it to JSON, else
+    Config.RESPONSE_FORMAT. Only an explicit msgpack request fails without
+    the package.
+    """
+    response_format = requested
+    if not response_format:
+        response_format = Config.RESPONSE_FORMAT
+        if msgpack is not None:
+            wanted = _accept_quality(accept, ("application/msgpack",))
+            json_quality = _accept_quality(accept, ("application/json", "application/*", "*/*"))
+            if wanted > 0 and wanted >= json_quality:
+                response_format = "msgpack"
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(RESPONSE_FORMATS)}")
+    if response_format == "msgpack" and msgpack is None:
+        raise ValueError("msgpack format requires the msgpack package")
+    return response_format
+
+
+def to_native(value):
+    """Convert numpy/pandas scalar types to native Python types for JSON serialization."""
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating,)):
+        return float(value)
+    if isinstance(value, (np.bool_,)):
+        return bool(value)
+    if value is None:
+        return None
+    try:
+        # Handle NaN
+        if np.isnan(value):
+            return None
+    except Exception:
+        pass
+    return value
+
+
+def normalize(obj):
+    """Recursively normalize dicts/lists to be JSON serializable."""
+    if isinstance(obj, dict):
+        return {k: normalize(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [normalize(v) for v in obj]
+    return to_native(obj)
@@ -0,0 +1,230 @@
+"""Scatter-gather top-k over shard worker processes sharing one mmap file."""
+
+import itertools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+import numpy as np
+
+from blocked_scoring import blocked_top_k, open_unit_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def _shard_worker(conn, path, start, stop, block_rows):
+    """Serve top-k requests for rows [start, stop) of the unit embedding file."""
+    matrix = open_unit_embeddings(path)[start:stop]
+    conn.send(("ready", stop - start))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        request_id, query, top_k, candidates = message
+        try:
+            local = None if candidates is None else candidates - start
+            positions, scores = blocked_top_k(matrix, query, top_k, block_rows, local)
+            rows = positions + start if local is None else candidates[positions]
+            conn.send((request_id, (rows, scores)))
+        except Exception as e:  # Report instead of dying so the coordinator can raise
+            conn.send((request_id, e))
+    conn.close()
+
+
+class ShardedScorer:
+    """
+    Coordinator for num_shards worker processes.
+
+    The catalog is split into contiguous row ranges of the memory-mapped unit
+    embedding file; each worker scores its range with blocked_top_k. top_k()
+    broadcasts the query to every shard and merges the per-shard top-k. Pages
+    of the mapping are shared through the OS page cache, so workers do not
+    copy the matrix. Requests carry an id and a reader thread per shard
+    routes replies back, so queries from several threads are in flight at
+    once; each worker answers them in arrival order.
+    """
+
+    def __init__(self, path, num_shards, block_rows=65536, start_method="spawn"):
+        total = len(open_unit_embeddings(path))
+        num_shards = max(1, min(num_shards, total))
+
+        self.path = path
+        self.size = total
+        self.block_rows = block_rows
+        self.bounds = np.linspace(0, total, num_shards + 1).astype(np.int64)
+        self.broken = False
+        self._context = multiprocessing.get_context(start_method)
+        self._lock = threading.Lock()  # Sends, start/restart/close
+        self._ids = itertools.count()
+        # Readers never take _lock (restarts join them while holding it)
+        self._pending_lock = threading.Lock()
+        self._pending = {}  # request id -> (generation, one Future per shard)
+        self._generation = 0
+        self._failed_generation = None  # A reader of it saw its pipe close
+        self._conns = []
+        self._processes = []
+        self._readers = []
+        self._start()
+        logger.info(f"Sharded scorer ready: {total} rows over {num_shards} processes")
+
+    def _start(self):
+        """Spawn one worker per shard and wait until every one has mapped its rows."""
+        for start, stop in zip(self.bounds[:-1], self.bounds[1:]):
+            parent, child = self._context.Pipe()
+            process = self._context.Process(
+                target=_shard_worker,
+                args=(child, self.path, int(start), int(stop), self.block_rows),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self._conns.append(parent)
+            self._processes.append(process)
+        for conn in self._conns:
+            conn.recv()  # wait for "ready"
+        self._readers = [
+            threading.Thread(
+                target=self._read,
+                args=(index, conn, self._generation),
+                name=f"shard-reader-{index}",
+                daemon=True,
+            )
+            for index, conn in enumerate(self._conns)
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    def _read(self, index, conn, generation):
+        """Route one shard's replies to the waiting requests until its pipe closes."""
+        while True:
+            try:
+                request_id, reply = conn.recv()
+            except (EOFError, OSError) as e:
+                lost = EOFError(f"shard {index} closed its pipe ({e!r})")
+                with self._pending_lock:
+                    self._failed_generation = generation
+                    for request_generation, futures in self._pending.values():
+                        if request_generation == generation:
+                            self._resolve(futures[index], exception=lost)
+                return
+            entry = self._pending.get(request_id)
+            if entry is not None:
+                self._resolve(entry[1][index], result=reply)
+
+    @staticmethod
+    def _resolve(future, result=None, exception=None):
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:  # Already failed by a closing pipe
+            pass
+
+    def _stop(self, graceful):
+        """Stop workers and reader threads (lock held)."""
+        for conn in self._conns:
+            if graceful:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+        for process in self._processes:
+            if not graceful and process.is_alive():
+                process.terminate()
+            process.join(timeout=5)
+        # Worker ends are closed now, so each reader sees EOF and exits
+        for reader in self._readers:
+            reader.join(timeout=5)
+        for conn in self._conns:
+            conn.close()
+        self._conns, self._processes, self._readers = [], [], []
+        self._generation += 1
+
+    def _restart(self, generation, error):
+        """
+        Replace every worker after a pipe error (lock held). Requests in
+        flight on the old pipes fail over to in-process scoring, and the
+        surviving shards' queued replies go away with their pipes. Only the
+        first request to notice a failed generation restarts it. If the
+        respawn fails the scorer is marked broken and answers in-process.
+        """
+        if generation != self._generation or self.broken:
+            return
+        logger.warning(f"Shard worker lost ({error!r}); restarting shard processes")
+        self._stop(graceful=False)
+        try:
+            self._start()
+        except (EOFError, OSError) as e:
+            logger.error(f"Sharded scorer could not respawn its workers ({e}); scoring in-process")
+            self._stop(graceful=False)
+            self.broken = True
+
+    def top_k(self, query, top_k, candidates=None):
+        """
+        Best (positions, scores) over all shards, like blocked_top_k: positions
+        are row ids, or indices into candidates when candidates is given.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        request_id = next(self._ids)
+        with self._lock:
+            if self.broken:
+                return self._local_top_k(query, top_k, candidates)
+            generation = self._generation
+            futures = [Future() for _ in self._conns]
+            with self._pending_lock:
+                failed = self._failed_generation == generation
+                if not failed:
+                    self._pending[request_id] = (generation, futures)
+            if failed:
+                # A shard died while idle; its reader will not answer
+                self._restart(generation, EOFError("shard pipe closed"))
+                return self._local_top_k(query, top_k, candidates)
+            try:
+                for conn, start, stop in zip(self._conns, self.bounds[:-1], self.bounds[1:]):
+                    shard_candidates = None
+                    if candidates is not None:
+                        lo, hi = np.searchsorted(candidates, (start, stop))
+                        shard_candidates = candidates[lo:hi]
+                    conn.send((request_id, query, top_k, shard_candidates))
+            except (EOFError, OSError) as e:
+                with self._pending_lock:
+                    del self._pending[request_id]
+                self._restart(generation, e)
+                return self._local_top_k(query, top_k, candidates)
+
+        try:
+            replies = [future.result() for future in futures]
+        except (EOFError, OSError) as e:
+            with self._lock:
+                self._restart(generation, e)
+            return self._local_top_k(query, top_k, candidates)
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        rows = np.concatenate([r[0] for r in replies])
+        scores = np.concatenate([r[1] for r in replies])
+        order = np.lexsort((rows, -scores))[:top_k]
+        rows, scores = rows[order], scores[order]
+        if candidates is not None:
+            rows = np.searchsorted(candidates, rows)
+        return rows, scores
+
+    def _local_top_k(self, query, top_k, candidates):
+        """The query scored in this process, for when the workers are unavailable."""
+        return blocked_top_k(
+            open_unit_embeddings(self.path), query, top_k, self.block_rows, candidates
+        )
+
+    def close(self):
+        """Stop the worker processes."""
+        with self._lock:
+            self._stop(graceful=True)
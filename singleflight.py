@@ -0,0 +1,94 @@
+"""Collapse concurrent identical requests into one computation."""
+
+import asyncio
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def flight_key(query, top_k, filters=None, mode=None):
+    """
+    Key for a recommendation request: case- and whitespace-normalized query
+    plus top_k, mode and filters in canonical (sorted) form.
+    """
+    normalized = " ".join(str(query).lower().split())
+    return (normalized, int(top_k), mode, json.dumps(filters or {}, sort_keys=True))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread-based single flight: the first caller for a key runs fn(); callers
+    arriving while it is in flight wait and get the same result (or
+    exception). Results are shared objects, so callers must not mutate them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        return {"executed": self.executed, "shared": self.shared}
+
+
+class AsyncSingleFlight:
+    """
+    asyncio single flight: the first caller starts a task for coro_fn();
+    later callers await the same task. The task is shielded, so one caller
+    disconnecting does not cancel the computation for the others.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key, coro_fn):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self.executed += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"executed": self.executed, "shared": self.shared}
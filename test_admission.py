@@ -0,0 +1,222 @@
+"""Test admission control, 503 load shedding and degraded answers."""
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+import requests
+
+import flask_api
+import serving
+from admission import AdmissionController, AsyncAdmissionController, Overloaded, ResultCache
+from config import Config
+from embedding_client import OPEN, Deadline, EmbeddingEndpoint
+from engine_manager import EngineManager
+from rec_engine import MovieRecommendationEngine
+from test_catalog_index import FakeProcessor, make_movies
+from test_embedding_client import StubEmbeddingServer
+
+
+def hold(controller, release, count):
+    """Start count threads that each occupy a slot until release is set"""
+    threads = []
+    for _ in range(count):
+        thread = threading.Thread(target=lambda: _occupy(controller, release))
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def _occupy(controller, release):
+    try:
+        with controller.admit():
+            release.wait(5)
+    except Overloaded:
+        pass
+
+
+def wait_for(condition):
+    deadline = time.perf_counter() + 5
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.001)
+
+
+def test_admission_queues_then_rejects():
+    controller = AdmissionController(max_concurrency=2, max_queue=1, max_wait=5)
+    release = threading.Event()
+    threads = hold(controller, release, 3)
+    wait_for(lambda: controller.active == 2 and controller.waiting == 1)
+
+    # Queue full: refused at once, not after max_wait
+    started = time.perf_counter()
+    with pytest.raises(Overloaded) as refused:
+        with controller.admit():
+            pass
+    assert time.perf_counter() - started < 0.5
+    assert refused.value.reason == "queue_full" and refused.value.retry_after >= 1
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert controller.stats()["rejected"] == 1
+    assert controller.active == 0 and controller.waiting == 0
+
+
+def test_admission_wait_times_out():
+    controller = AdmissionController(max_concurrency=1, max_queue=4, max_wait=0.05)
+    release = threading.Event()
+    threads = hold(controller, release, 1)
+    wait_for(lambda: controller.active == 1)
+    with pytest.raises(Overloaded) as refused:
+        with controller.admit():
+            pass
+    assert refused.value.reason == "timeout"
+    release.set()
+    threads[0].join()
+    with controller.admit():  # Free again
+        assert controller.active == 1
+
+
+def test_async_admission():
+    async def scenario():
+        controller = AsyncAdmissionController(max_concurrency=1, max_queue=1, max_wait=0.2)
+        release = asyncio.Event()
+
+        async def occupy():
+            async with controller.admit():
+                await release.wait()
+
+        async def quick():
+            async with controller.admit():
+                return "served"
+
+        first = asyncio.ensure_future(occupy())
+        await asyncio.sleep(0)
+        queued = asyncio.ensure_future(quick())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as refused:
+            await quick()
+        assert refused.value.reason == "queue_full"
+        release.set()
+        await first
+        assert await queued == "served"
+        assert controller.active == 0 and controller.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_result_cache_is_bounded():
+    cache = ResultCache(2)
+    for i in range(3):
+        cache.put(i, [i])
+    assert cache.get(0) is None and cache.get(2) == [2]
+    assert cache.shrink(0.5) == 1 and len(cache) == 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def factory(directory=None):
+        processor = FakeProcessor(make_movies(), np.eye(5, 4, dtype=np.float32) + 0.1)
+        return MovieRecommendationEngine(processor, use_imdb=False)
+
+    manager = EngineManager(factory)
+    monkeypatch.setattr(flask_api, "engine_manager", manager)
+    monkeypatch.setattr(serving, "engine_manager", manager)
+    controller = AdmissionController(max_concurrency=1, max_queue=0, max_wait=1)
+    monkeypatch.setattr(flask_api, "admission", controller)
+    monkeypatch.setattr(serving, "recent_results", ResultCache(16))
+    monkeypatch.setattr(flask_api, "recent_results", serving.recent_results)
+    client = flask_api.app.test_client()
+    client.controller = controller
+    return client
+
+
+def saturate(controller):
+    release = threading.Event()
+    threads = hold(controller, release, 1)
+    wait_for(lambda: controller.active == 1)
+    return release, threads
+
+
+def test_overloaded_query_gets_cached_then_popular_results(client, monkeypatch):
+    url = "/api/recommendations/query?query=fun&top_k=2&mode=dense"
+    fresh = client.get(url)
+    assert fresh.status_code == 200 and "X-Degraded" not in fresh.headers
+
+    release, threads = saturate(client.controller)
+    try:
+        # The same query was answered recently: served from the result cache
+        cached = client.get(url)
+        assert cached.headers["X-Degraded"] == "cached"
+        assert cached.get_json() == fresh.get_json()
+
+        # New query: the most-rated movies matching the filters
+        popular = client.get(
+            "/api/recommendations/query?query=scary&top_k=2&mode=dense&genres=Comedy"
+        )
+        assert popular.status_code == 200 and popular.headers["X-Degraded"] == "popular"
+        titles = [m["title"] for m in popular.get_json()["recommendations"]]
+        assert titles == ["Groundhog Day", "Dumb and Dumber"]
+
+        monkeypatch.setattr(Config, "ADMISSION_DEGRADED", False)
+        refused = client.get(url)
+        assert refused.status_code == 503
+        assert int(refused.headers["Retry-After"]) >= 1
+        assert refused.get_json()["reason"] == "queue_full"
+
+        similar = client.post("/api/recommendations/similar", json={"movie_id": 1})
+        assert similar.status_code == 503
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    metrics_text = client.get("/metrics").get_data(as_text=True)
+    assert 'recommender_admission_rejected_total{reason="queue_full"}' in metrics_text
+    assert 'recommender_degraded_responses_total{source="popular"}' in metrics_text
+    assert "recommender_admission_queue_depth" in metrics_text
+
+
+def test_open_breaker_query_gets_cached_then_popular_results(client, monkeypatch):
+    monkeypatch.setattr(Config, "SPARSE_FALLBACK", False)
+    monkeypatch.setattr(Config, "EMBED_BACKOFF", 0.01)
+    monkeypatch.setattr(Config, "EMBED_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(Config, "BREAKER_FAILURE_THRESHOLD", 2)
+    stub = StubEmbeddingServer()
+    endpoint = EmbeddingEndpoint(f"{stub.url}/embed")
+
+    def encode(texts, force_semantic=False):
+        result = endpoint.post(requests.Session(), {"texts": texts}, {}, Deadline(5))
+        return np.asarray(result["embeddings"], dtype=np.float32)
+
+    monkeypatch.setattr(serving.engine_manager.current().bert_processor, "encode", encode)
+    url = "/api/recommendations/query?query=fun&top_k=2&mode=dense"
+    try:
+        fresh = client.get(url)
+        assert fresh.status_code == 200 and "X-Degraded" not in fresh.headers
+
+        # The Space starts failing: retries trip the breaker, the answer is cached
+        stub.status = 503
+        cached = client.get(url)
+        assert cached.status_code == 200 and cached.headers["X-Degraded"] == "cached"
+        assert cached.get_json() == fresh.get_json()
+        assert endpoint.breaker.state == OPEN
+
+        requests_before = stub.requests
+        popular = client.get(
+            "/api/recommendations/query?query=scary&top_k=2&mode=dense&genres=Comedy"
+        )
+        assert popular.status_code == 200 and popular.headers["X-Degraded"] == "popular"
+        titles = [m["title"] for m in popular.get_json()["recommendations"]]
+        assert titles == ["Groundhog Day", "Dumb and Dumber"]
+        assert stub.requests == requests_before  # Refused by the open breaker
+
+        monkeypatch.setattr(Config, "ADMISSION_DEGRADED", False)
+        refused = client.get(url)
+        assert refused.status_code == 503
+        assert refused.get_json()["reason"] == "embedding_unavailable"
+        assert int(refused.headers["Retry-After"]) >= 1
+    finally:
+        stub.close()
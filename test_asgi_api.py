@@ -0,0 +1,125 @@
+"""Test the ASGI app: same routes as flask_api, non-blocking encodes."""
+
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+httpx = pytest.importorskip("httpx")
+
+import asgi_api
+import serving
+from admission import AsyncAdmissionController, ResultCache
+from config import Config
+from embedding_client import Deadline, EmbeddingEndpoint
+from engine_manager import EngineManager
+from rec_engine import MovieRecommendationEngine
+from test_catalog_index import FakeProcessor, make_movies
+from test_embedding_client import StubEmbeddingServer
+
+ENCODE_SECONDS = 0.2
+
+
+def fake_engine(directory=None):
+    processor = FakeProcessor(
+        make_movies(), np.eye(5, 4, dtype=np.float32) + 0.1
+    )
+
+    async def encode_async(texts, client):
+        await asyncio.sleep(ENCODE_SECONDS)  # a slow HF Space round trip
+        return processor.encode(texts)
+
+    processor.encode_async = encode_async
+    return MovieRecommendationEngine(processor, use_imdb=False)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(asgi_api, "engine_manager", EngineManager(fake_engine))
+    # Unlimited admission: these tests are about encodes overlapping
+    monkeypatch.setattr(asgi_api, "admission", AsyncAdmissionController(max_concurrency=0))
+    asgi_api.app.state.http = None
+    transport = httpx.ASGITransport(app=asgi_api.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+def test_query_and_search_routes(client):
+    async def run():
+        async with client:
+            response = await client.post(
+                "/api/recommendations/query",
+                json={"query": "silly comedy", "top_k": 3, "mode": "dense"},
+            )
+            assert response.status_code == 200
+            assert response.json()["count"] == 3
+
+            response = await client.post("/api/search", json={"search_term": "dumb"})
+            assert response.json()["movies"][0]["title"] == "Dumb and Dumber"
+
+            response = await client.get("/api/recommendations/query?query=x&top_k=no")
+            assert response.status_code == 400
+
+    asyncio.run(run())
+
+
+def test_slow_encodes_do_not_block_each_other(client):
+    async def run():
+        async with client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(
+                *[
+                    client.get(f"/api/recommendations/query?query=q{i}&mode=dense")
+                    for i in range(50)
+                ]
+            )
+            elapsed = time.perf_counter() - started
+        assert all(r.status_code == 200 for r in responses)
+        # 50 sequential encodes would take 10s; concurrent ones overlap
+        assert elapsed < 10 * ENCODE_SECONDS
+
+    asyncio.run(run())
+
+
+def test_embedding_outage_gets_cached_then_popular_results(client, monkeypatch):
+    monkeypatch.setattr(Config, "SPARSE_FALLBACK", False)
+    monkeypatch.setattr(Config, "EMBED_BACKOFF", 0.01)
+    monkeypatch.setattr(serving, "engine_manager", asgi_api.engine_manager)
+    monkeypatch.setattr(serving, "recent_results", ResultCache(16))
+    monkeypatch.setattr(asgi_api, "recent_results", serving.recent_results)
+    stub = StubEmbeddingServer()
+    endpoint = EmbeddingEndpoint(f"{stub.url}/embed")
+
+    async def encode_async(texts, http):
+        async with httpx.AsyncClient() as session:
+            result = await endpoint.post_async(session, {"texts": texts}, {}, Deadline(5))
+        return np.asarray(result["embeddings"], dtype=np.float32)
+
+    processor = asgi_api.engine_manager.current().bert_processor
+    monkeypatch.setattr(processor, "encode_async", encode_async)
+    url = "/api/recommendations/query?query=fun&top_k=2&mode=dense"
+
+    async def run():
+        async with client:
+            fresh = await client.get(url)
+            assert fresh.status_code == 200 and "X-Degraded" not in fresh.headers
+
+            stub.close()  # The embedding server goes down
+            cached = await client.get(url)
+            assert cached.status_code == 200 and cached.headers["X-Degraded"] == "cached"
+            assert cached.json() == fresh.json()
+
+            popular = await client.get(
+                "/api/recommendations/query?query=scary&top_k=2&mode=dense&genres=Comedy"
+            )
+            assert popular.status_code == 200 and popular.headers["X-Degraded"] == "popular"
+            titles = [m["title"] for m in popular.json()["recommendations"]]
+            assert titles == ["Groundhog Day", "Dumb and Dumber"]
+
+            monkeypatch.setattr(Config, "ADMISSION_DEGRADED", False)
+            refused = await client.get(url)
+            assert refused.status_code == 503
+            assert refused.json()["reason"] == "embedding_unavailable"
+
+    asyncio.run(run())
@@ -0,0 +1,201 @@
+"""Test blocked top-k scoring over a memory-mapped embedding file"""
+
+import os
+import pickle
+import threading
+
+import numpy as np
+import pytest
+
+import artifacts
+from bert_processor import MovieBERTProcessor
+from blocked_scoring import blocked_top_k, open_unit_embeddings, write_unit_embeddings
+from config import Config
+from dense_index import DenseIndex
+from memory_governor import LoadingPlan
+from rec_engine import MovieRecommendationEngine
+from sharded_index import ShardedScorer
+from test_catalog_index import FakeProcessor, make_movies
+
+
+def test_blocked_top_k_matches_exact_scan(tmp_path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((1000, 32)).astype(np.float32)
+    path = str(tmp_path / "unit.npy")
+    write_unit_embeddings(embeddings, path)
+    matrix = open_unit_embeddings(path)
+    assert isinstance(matrix, np.memmap)
+
+    query = rng.standard_normal(32).astype(np.float32)
+    exact = DenseIndex(embeddings).scores(query)
+    expected = np.argsort(-exact)[:10]
+
+    for block_rows in (1, 7, 128, 5000):
+        positions, scores = blocked_top_k(matrix, query, 10, block_rows=block_rows)
+        assert positions.tolist() == expected.tolist()
+        np.testing.assert_allclose(scores, exact[expected], rtol=1e-5, atol=1e-6)
+
+    candidates = np.arange(3, 1000, 3)
+    positions, _ = blocked_top_k(matrix, query, 5, block_rows=64, candidates=candidates)
+    assert positions.tolist() == np.argsort(-exact[candidates])[:5].tolist()
+
+
+def test_engine_blocked_option(tmp_path):
+    class MappedProcessor(FakeProcessor):
+        def embeddings_memmap(self):
+            path = str(tmp_path / "movies.npy")
+            write_unit_embeddings(self.movie_embeddings, path)
+            return open_unit_embeddings(path)
+
+    movies = make_movies()
+    embeddings = np.random.default_rng(1).standard_normal((5, 8)).astype(np.float32)
+    exact = MovieRecommendationEngine(FakeProcessor(movies, embeddings), use_imdb=False)
+    blocked = MovieRecommendationEngine(
+        MappedProcessor(movies, embeddings), use_imdb=False, dense_scoring="blocked"
+    )
+    for kwargs in ({}, {"filters": {"genres": ["Comedy"]}}, {"mode": "hybrid"}):
+        assert [r["movieId"] for r in exact.recommend_by_query("x", 3, **kwargs)] == [
+            r["movieId"] for r in blocked.recommend_by_query("x", 3, **kwargs)
+        ]
+
+
+def test_sharded_scorer_merges_shard_results(tmp_path):
+    rng = np.random.default_rng(2)
+    embeddings = rng.standard_normal((501, 16)).astype(np.float32)
+    path = str(tmp_path / "unit.npy")
+    write_unit_embeddings(embeddings, path)
+    matrix = open_unit_embeddings(path)
+    query = rng.standard_normal(16).astype(np.float32)
+
+    scorer = ShardedScorer(path, num_shards=3, block_rows=50)
+    try:
+        expected = blocked_top_k(matrix, query, 12)
+        positions, scores = scorer.top_k(query, 12)
+        assert positions.tolist() == expected[0].tolist()
+        np.testing.assert_allclose(scores, expected[1], rtol=1e-6)
+
+        candidates = np.arange(0, 501, 4)
+        expected = blocked_top_k(matrix, query, 6, candidates=candidates)
+        assert scorer.top_k(query, 6, candidates)[0].tolist() == expected[0].tolist()
+    finally:
+        scorer.close()
+
+
+def test_sharded_scorer_survives_a_killed_worker(tmp_path):
+    rng = np.random.default_rng(4)
+    embeddings = rng.standard_normal((300, 8)).astype(np.float32)
+    path = str(tmp_path / "unit.npy")
+    write_unit_embeddings(embeddings, path)
+    matrix = open_unit_embeddings(path)
+    queries = rng.standard_normal((3, 8)).astype(np.float32)
+
+    scorer = ShardedScorer(path, num_shards=3, block_rows=50)
+    try:
+        scorer._processes[1].kill()
+        scorer._processes[1].join()
+        for query in queries:
+            expected = blocked_top_k(matrix, query, 5)[0].tolist()
+            assert scorer.top_k(query, 5)[0].tolist() == expected
+            # Respawned, with no stale replies left in the surviving shards' pipes
+            assert not scorer.broken and all(p.is_alive() for p in scorer._processes)
+    finally:
+        scorer.close()
+
+
+def test_sharded_scorer_serves_concurrent_queries(tmp_path):
+    rng = np.random.default_rng(7)
+    embeddings = rng.standard_normal((400, 8)).astype(np.float32)
+    path = str(tmp_path / "unit.npy")
+    write_unit_embeddings(embeddings, path)
+    matrix = open_unit_embeddings(path)
+    queries = rng.standard_normal((2, 30, 8)).astype(np.float32)
+    candidates = np.arange(0, 400, 3)
+    results = [[], []]
+
+    scorer = ShardedScorer(path, num_shards=3, block_rows=40)
+
+    def run(thread):
+        for i, query in enumerate(queries[thread]):
+            subset = candidates if i % 2 else None
+            results[thread].append(scorer.top_k(query, 5, subset)[0].tolist())
+
+    try:
+        threads = [threading.Thread(target=run, args=(t,)) for t in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        scorer.close()
+    # Each reply reached the request it answers
+    for thread in range(2):
+        for i, query in enumerate(queries[thread]):
+            subset = candidates if i % 2 else None
+            expected = blocked_top_k(matrix, query, 5, candidates=subset)[0].tolist()
+            assert results[thread][i] == expected
+
+
+def test_stale_unit_file_is_rewritten(tmp_path):
+    rng = np.random.default_rng(3)
+    embeddings = rng.standard_normal((5, 8)).astype(np.float32)
+    pickle_path = str(tmp_path / "movie_embeddings.pkl")
+    with open(pickle_path, "wb") as f:
+        pickle.dump({"embeddings": embeddings, "movies_data": make_movies()}, f)
+    unit_path = str(tmp_path / Config.EMBEDDINGS_MMAP_FILE)
+
+    def mapped():
+        processor = MovieBERTProcessor(lazy_load=True)
+        processor.load_embeddings(pickle_path)
+        return processor.embeddings_memmap()
+
+    # Left over from an older, larger catalog
+    write_unit_embeddings(rng.standard_normal((9, 8)), unit_path)
+    matrix = mapped()
+    assert matrix.shape == (5, 8)
+    np.testing.assert_allclose(
+        matrix, embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True), rtol=1e-6
+    )
+
+    # Same shape, but written before the pickle was replaced
+    write_unit_embeddings(rng.standard_normal((5, 8)), unit_path)
+    os.utime(unit_path, (0, 0))
+    unit = embeddings[0] / np.linalg.norm(embeddings[0])
+    np.testing.assert_allclose(mapped()[0], unit, rtol=1e-6)
+
+
+def test_legacy_conversion_drops_the_dense_matrix(tmp_path):
+    embeddings = np.random.default_rng(5).standard_normal((5, 8)).astype(np.float32)
+    pickle_path = str(tmp_path / "movie_embeddings.pkl")
+    with open(pickle_path, "wb") as f:
+        pickle.dump({"embeddings": embeddings, "movies_data": make_movies()}, f)
+    processor = MovieBERTProcessor(lazy_load=True)
+    processor.load_embeddings(pickle_path)
+    assert processor.embeddings_memmap().shape == (5, 8)
+    assert processor.movie_embeddings is None
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ["movie_embeddings.pkl", Config.EMBEDDINGS_MMAP_FILE]
+    )  # No temp files left behind
+
+
+def test_artifact_unit_file_is_written_on_publish(tmp_path):
+    root = str(tmp_path)
+    embeddings = np.random.default_rng(6).standard_normal((5, 4)).astype(np.float32)
+    directory = artifacts.write_artifact(embeddings, make_movies(), root=root, version="v1")
+    unit_path = os.path.join(directory, Config.EMBEDDINGS_MMAP_FILE)
+    plan = LoadingPlan(dense_scoring="blocked")
+
+    # Missing at load: a clear error instead of a conversion while serving
+    os.remove(unit_path)
+    processor = MovieBERTProcessor(lazy_load=True)
+    with pytest.raises(FileNotFoundError, match="re-publish"):
+        processor.load_artifact(directory, planner=lambda *args: plan)
+
+    # Publishing an older version streams the unit file from embeddings.npy
+    artifacts.publish_version("v1", root)
+    processor = MovieBERTProcessor(lazy_load=True)
+    processor.load_artifact(directory, planner=lambda *args: plan)
+    np.testing.assert_allclose(
+        processor.embeddings_memmap(),
+        embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True),
+        rtol=1e-6,
+    )
@@ -0,0 +1,77 @@
+"""Test the sparse BM25 retriever and score fusion"""
+
+import numpy as np
+
+from bm25_index import BM25Index, reciprocal_rank_fusion, tokenize, weighted_fusion
+from rec_engine import MovieRecommendationEngine
+from test_catalog_index import FakeProcessor, make_movies
+
+
+def brute_force_bm25(documents, query, k1=1.2, b=0.75):
+    n = len(documents)
+    avg = sum(len(d) for d in documents) / n
+    scores = np.zeros(n)
+    for term in set(tokenize(query)):
+        df = sum(term in d for d in documents)
+        if not df:
+            continue
+        idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(documents):
+            tf = doc.count(term)
+            if tf:
+                scores[i] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg))
+    return scores
+
+
+def test_csr_scores_match_reference():
+    documents = [
+        ["haunted", "hotel", "horror"],
+        ["time", "loop", "comedy", "comedy"],
+        ["space", "horror", "alien", "ship", "crew"],
+        [],
+    ]
+    index = BM25Index(documents)
+    for query in ("horror", "comedy time", "haunted space horror", "unknown"):
+        np.testing.assert_allclose(
+            index.scores(query), brute_force_bm25(documents, query), rtol=1e-5
+        )
+    np.testing.assert_allclose(
+        index.scores("horror", np.array([2, 0])), index.scores("horror")[[2, 0]]
+    )
+
+
+def test_from_movies_indexes_titles_genres_and_tags():
+    index = BM25Index.from_movies(make_movies())
+    assert np.argmax(index.scores("haunted hotel")) == 3
+    assert np.argmax(index.scores("time loop")) == 2
+    assert index.scores("the a of").sum() == 0
+
+
+def test_fusion():
+    dense = np.array([0.9, 0.5, 0.1, 0.0], dtype=np.float32)
+    sparse = np.array([0.0, 3.0, 2.0, 0.0], dtype=np.float32)
+    fused = reciprocal_rank_fusion([dense, sparse], k=60)
+    assert np.argmax(fused) == 1
+    assert fused[3] < fused[2]
+    np.testing.assert_allclose(
+        weighted_fusion(dense, sparse, 0.5), [0.5, 0.7777778, 0.38888887, 0.0]
+    )
+
+
+def test_engine_falls_back_to_sparse_when_encoding_fails():
+    class OfflineProcessor(FakeProcessor):
+        def encode(self, texts, force_semantic=False):
+            raise RuntimeError("External embeddings failed after retries")
+
+    movies = make_movies()
+    engine = MovieRecommendationEngine(
+        OfflineProcessor(movies, np.eye(5, 4, dtype=np.float32)), use_imdb=False
+    )
+    recs = engine.recommend_by_query("haunted hotel horror", top_k=3)
+    assert [r["title"] for r in recs] == ["The Shining", "Scream"]
+
+    hybrid = MovieRecommendationEngine(
+        FakeProcessor(movies, np.eye(5, 4, dtype=np.float32) + 0.01), use_imdb=False
+    )
+    recs = hybrid.recommend_by_query("time loop", top_k=2, mode="hybrid")
+    assert recs[0]["title"] == "Groundhog Day"
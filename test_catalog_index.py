@@ -0,0 +1,113 @@
+"""Test genre/year/rating filter pushdown"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog_index import CatalogIndex, parse_filters
+from rec_engine import MovieRecommendationEngine
+
+
+def make_movies():
+    return pd.DataFrame(
+        {
+            "movieId": [1, 2, 3, 4, 5],
+            "clean_title": [
+                "Dumb and Dumber",
+                "Scream",
+                "Groundhog Day",
+                "The Shining",
+                "Toy Story",
+            ],
+            "year": ["1994", "1996", "1993", "1980", None],
+            "genres_list": [
+                ["Comedy"],
+                ["Horror", "Mystery"],
+                ["Comedy", "Romance"],
+                ["Horror"],
+                ["Animation", "Comedy"],
+            ],
+            "avg_rating": np.array([3.1, 3.4, 3.9, 4.1, 3.9], dtype=np.float32),
+            "rating_count": np.array([120, 80, 300, 900, 50], dtype=np.int32),
+            "combined_tags": [
+                ["stupid", "road trip"],
+                ["slasher", "meta"],
+                ["time loop", "bill murray"],
+                ["stephen king", "haunted hotel"],
+                ["pixar", "toys"],
+            ],
+        }
+    )
+
+
+class FakeProcessor:
+    """Minimal stand-in exposing the attributes the engine reads"""
+
+    def __init__(self, movies, embeddings):
+        self.movies_data = movies
+        self.movie_embeddings = embeddings
+        self.catalog_index = None
+        self.encoded = []
+
+    def encode(self, texts, force_semantic=False):
+        self.encoded.extend(texts)
+        return np.ones((len(texts), self.movie_embeddings.shape[1]), dtype=np.float32)
+
+    def _get_embeddings(self):
+        return self.movie_embeddings
+
+
+def test_parse_filters_normalizes_and_validates():
+    assert parse_filters(None) == {}
+    assert parse_filters({"genres": "Comedy, Horror", "year_min": "1990"}) == {
+        "genres": ["Comedy", "Horror"],
+        "genre_match": "any",
+        "year_min": 1990,
+    }
+    with pytest.raises(ValueError):
+        parse_filters({"year_min": "nineties"})
+    with pytest.raises(ValueError):
+        parse_filters({"genres": "Comedy", "genre_match": "some"})
+
+
+def test_mask_combines_genres_years_and_ratings():
+    index = CatalogIndex(make_movies())
+    nineties_comedies = {"genres": ["comedy"], "year_min": 1990, "year_max": 1999}
+    assert index.candidate_rows(nineties_comedies).tolist() == [0, 2]
+    assert index.candidate_rows({"genres": ["Horror"], "min_rating": 4}).tolist() == [3]
+    assert index.candidate_rows(
+        {"genres": ["Comedy", "Romance"], "genre_match": "all"}
+    ).tolist() == [2]
+    assert index.candidate_rows({"exclude_genres": ["Comedy"]}).tolist() == [1, 3]
+    assert index.candidate_rows({"min_votes": 100}).tolist() == [0, 2, 3]
+    assert index.candidate_rows({"min_votes": 250}).tolist() == [2, 3]
+    assert index.candidate_rows({}) is None
+    with pytest.raises(ValueError):
+        index.mask({"genres": ["Western"]})
+
+
+def test_facet_counts_use_filters():
+    index = CatalogIndex(make_movies())
+    facets = index.facet_counts()
+    assert facets["total"] == 5
+    assert facets["genres"]["Comedy"] == 3
+    assert facets["decades"] == {"1980s": 1, "1990s": 3}
+
+    horror = index.facet_counts({"genres": ["Horror"]})
+    assert horror["total"] == 2
+    assert horror["genres"] == {"Horror": 2, "Mystery": 1}
+
+
+def test_recommend_by_query_scores_only_filtered_rows():
+    movies = make_movies()
+    embeddings = np.eye(5, 4, dtype=np.float32) + 0.01
+    engine = MovieRecommendationEngine(FakeProcessor(movies, embeddings), use_imdb=False)
+
+    recs = engine.recommend_by_query("scary", top_k=5, filters={"genres": ["Horror"]})
+    assert sorted(r["title"] for r in recs) == ["Scream", "The Shining"]
+
+    assert engine.recommend_by_query("x", filters={"year_min": 2020}) == []
+    assert [m["title"] for m in engine.search_movies("d", filters={"min_votes": 100})] == [
+        "Groundhog Day",
+        "Dumb and Dumber",
+    ]
@@ -0,0 +1,60 @@
+"""Test exact and coarse-to-fine cosine scoring"""
+
+import numpy as np
+
+from dense_index import DenseIndex
+from rec_engine import MovieRecommendationEngine
+from test_catalog_index import FakeProcessor, make_movies
+
+
+def pca_like(n, dims=32, seed=0):
+    """Random rows whose per-dimension variance decays like PCA output."""
+    rng = np.random.default_rng(seed)
+    scale = 1.0 / np.sqrt(np.arange(1, dims + 1))
+    return (rng.standard_normal((n, dims)) * scale).astype(np.float32)
+
+
+def test_exact_scores_are_cosine_similarity():
+    embeddings = pca_like(200)
+    query = pca_like(1, seed=1)[0]
+    index = DenseIndex(embeddings, lead_dims=8)
+    expected = embeddings @ query / (
+        np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query)
+    )
+    np.testing.assert_allclose(index.scores(query), expected, rtol=1e-5, atol=1e-6)
+    rows = np.array([5, 3, 150])
+    np.testing.assert_allclose(index.scores(query, rows), expected[rows], rtol=1e-5)
+    assert index.lead.flags["C_CONTIGUOUS"] and index.lead.shape == (200, 8)
+
+
+def test_cascade_rescores_shortlist_exactly():
+    embeddings = pca_like(5000)
+    index = DenseIndex(embeddings, lead_dims=8)
+    query = embeddings[42] + 0.05 * pca_like(1, seed=2)[0]
+
+    exact = index.scores(query)
+    cascade = index.cascade_scores(query, top_k=10, multiplier=20, minimum=0)
+    kept = np.isfinite(cascade)
+    assert kept.sum() == 200
+    np.testing.assert_allclose(cascade[kept], exact[kept], rtol=1e-5, atol=1e-6)
+
+    top_exact = set(np.argsort(-exact)[:10])
+    top_cascade = set(np.argsort(-cascade)[:10])
+    assert len(top_exact & top_cascade) >= 9
+    assert np.argmax(cascade) == 42
+
+    rows = np.arange(0, 5000, 2)
+    restricted = index.cascade_scores(query, top_k=5, candidates=rows, minimum=50)
+    assert len(restricted) == len(rows) and np.isfinite(restricted).sum() == 50
+
+
+def test_engine_cascade_option():
+    movies = make_movies()
+    embeddings = pca_like(5, dims=16)
+    exact = MovieRecommendationEngine(FakeProcessor(movies, embeddings), use_imdb=False)
+    cascade = MovieRecommendationEngine(
+        FakeProcessor(movies, embeddings), use_imdb=False, dense_scoring="cascade"
+    )
+    assert [r["movieId"] for r in exact.recommend_by_query("q", top_k=3)] == [
+        r["movieId"] for r in cascade.recommend_by_query("q", top_k=3)
+    ]
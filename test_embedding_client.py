@@ -0,0 +1,349 @@
+"""Test circuit breakers, deadlines, hedging and replica pools against local stub endpoints."""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+import embedding_client
+from bert_processor import MovieBERTProcessor
+from config import Config
+from embedding_client import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    Deadline,
+    EmbeddingEndpoint,
+    EmbeddingUnavailable,
+    EndpointPool,
+    space_pool,
+)
+from rec_engine import MovieRecommendationEngine
+from test_catalog_index import make_movies
+
+
+class StubEmbeddingServer:
+    """
+    Local /embed and /health endpoints on a free port. status and delay
+    apply to every /embed request; delays (a list) overrides delay for the
+    next requests in order. vector(text) gives each text's embedding.
+    """
+
+    def __init__(self, dims=4, status=200, delay=0.0):
+        self.dims = dims
+        self.status = status
+        self.delay = delay
+        self.delays = []
+        self.requests = 0
+        self.healthy = True
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200 if stub.healthy else 503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests += 1
+                    delay = stub.delays.pop(0) if stub.delays else stub.delay
+                time.sleep(delay)
+                texts = body.get("texts", [])
+                payload = {"embeddings": [stub.vector(text) for text in texts]}
+                data = json.dumps(payload if stub.status == 200 else {}).encode()
+                try:
+                    self.send_response(stub.status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    pass  # Client gave up (timeout)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+
+    def vector(self, text):
+        return [1.0] * self.dims
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubEmbeddingServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(Config, "EMBED_BACKOFF", 0.01)
+    monkeypatch.setattr(Config, "EMBED_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(Config, "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(Config, "BREAKER_RESET_TIMEOUT", 30)
+    monkeypatch.setattr(Config, "POOL_HEALTH_INTERVAL", 0)
+    monkeypatch.setattr(embedding_client, "_endpoints", {})
+    monkeypatch.setattr(embedding_client, "_pools", {})
+
+
+def test_breaker_states(monkeypatch):
+    breaker = CircuitBreaker("stub", failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+    time.sleep(0.06)
+    # One probe goes through half-open; concurrent callers are still refused
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+def test_open_breaker_fails_fast(stub):
+    stub.status = 503
+    endpoint = EmbeddingEndpoint(f"{stub.url}/embed")
+    session = requests.Session()
+    with pytest.raises(EmbeddingUnavailable):
+        endpoint.post(session, {"texts": ["a"]}, {}, Deadline(5))
+    assert stub.requests == 3 and endpoint.breaker.state == OPEN
+
+    started = time.perf_counter()
+    with pytest.raises(EmbeddingUnavailable, match="Circuit open"):
+        endpoint.post(session, {"texts": ["a"]}, {}, Deadline(5))
+    assert time.perf_counter() - started < 0.01
+    assert stub.requests == 3  # Nothing sent while open
+
+
+def test_client_errors_do_not_trip_the_breaker(stub):
+    stub.status = 400
+    endpoint = EmbeddingEndpoint(f"{stub.url}/embed")
+    for _ in range(5):
+        with pytest.raises(embedding_client.EndpointError):
+            endpoint.post(requests.Session(), {"texts": ["a"]}, {}, Deadline(5))
+    assert stub.requests == 5 and endpoint.breaker.state == CLOSED
+
+
+def test_deadline_caps_total_time_across_retries(stub, monkeypatch):
+    monkeypatch.setattr(Config, "EMBED_ATTEMPT_TIMEOUT", 30)
+    stub.delay = 1.0
+    endpoint = EmbeddingEndpoint(f"{stub.url}/embed")
+    started = time.perf_counter()
+    with pytest.raises(EmbeddingUnavailable):
+        endpoint.post(requests.Session(), {"texts": ["a"]}, {}, Deadline(0.3))
+    assert time.perf_counter() - started < 0.6
+    assert stub.requests == 1
+
+
+def test_hedged_request_beats_a_slow_first_attempt(stub, monkeypatch):
+    monkeypatch.setattr(Config, "EMBED_HEDGE", True)
+    monkeypatch.setattr(Config, "EMBED_HEDGE_MIN_MS", 10)
+    endpoint = EmbeddingEndpoint(f"{stub.url}/embed")
+    for _ in range(20):
+        endpoint.latency.observe(0.02)
+    assert endpoint.hedge_delay() == pytest.approx(0.02)
+
+    stub.delays = [1.0]  # Only the first request is slow
+    before = embedding_client.EMBED_HEDGES.value("hedge")
+    started = time.perf_counter()
+    result = endpoint.post(requests.Session(), {"texts": ["a"]}, {}, Deadline(5))
+    assert time.perf_counter() - started < 0.5
+    assert result["embeddings"] == [[1.0] * 4]
+    assert stub.requests == 2
+    assert embedding_client.EMBED_HEDGES.value("hedge") == before + 1
+
+
+class FakeAsyncClient:
+    """httpx.AsyncClient stand-in: post() answers with the given statuses"""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    async def post(self, url, json=None, headers=None, timeout=None):
+        self.calls += 1
+        status = self.statuses.pop(0)
+
+        class Response:
+            status_code = status
+
+            def json(self):
+                return {"embeddings": [[0.5] * 4 for _ in json["texts"]]}
+
+        return Response()
+
+
+def test_async_post_shares_the_breaker():
+    endpoint = EmbeddingEndpoint("http://space/embed")
+    client = FakeAsyncClient([500, 500, 500, 200])
+
+    async def scenario():
+        with pytest.raises(EmbeddingUnavailable):
+            await endpoint.post_async(client, {"texts": ["a"]}, {}, Deadline(5))
+        with pytest.raises(EmbeddingUnavailable, match="Circuit open"):
+            await endpoint.post_async(client, {"texts": ["a"]}, {}, Deadline(5))
+
+    asyncio.run(scenario())
+    assert client.calls == 3 and endpoint.breaker.state == OPEN
+
+
+def test_engine_fails_over_to_bm25_while_open(stub, monkeypatch):
+    stub.status = 502
+    monkeypatch.setattr(Config, "HF_SPACE_ENDPOINT", stub.url)
+    monkeypatch.setattr(Config, "SPARSE_FALLBACK", True)
+    processor = MovieBERTProcessor(lazy_load=True)
+    processor.movies_data = make_movies()
+    processor.movie_embeddings = np.eye(5, 4, dtype=np.float32)
+    engine = MovieRecommendationEngine(processor, use_imdb=False)
+
+    results = engine.recommend_by_query("stephen king", 3, mode="dense")
+    assert [m["title"] for m in results] == ["The Shining"]
+    assert stub.requests == 3
+
+    started = time.perf_counter()
+    results = engine.recommend_by_query("time loop", 3, mode="dense")
+    assert [m["title"] for m in results] == ["Groundhog Day"]
+    assert time.perf_counter() - started < 0.05
+    assert stub.requests == 3  # Breaker open: no call, no backoff sleep
+
+
+@pytest.fixture
+def stubs():
+    servers = [StubEmbeddingServer() for _ in range(3)]
+    yield servers
+    for server in servers:
+        server.close()
+
+
+def post_many(pool, count, workers):
+    session = requests.Session()
+    threads = [
+        threading.Thread(
+            target=lambda: [
+                pool.post(session, {"texts": ["a"]}, {}, Deadline(5)) for _ in range(count)
+            ]
+        )
+        for _ in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_pool_spreads_concurrent_requests(stubs):
+    for server in stubs:
+        server.delay = 0.02
+    pool = space_pool([server.url for server in stubs])
+    assert space_pool([server.url + "/" for server in stubs]) is pool
+    post_many(pool, 5, workers=3)
+    assert sum(server.requests for server in stubs) == 15
+    # Three requests in flight, least outstanding first: one on each replica
+    assert all(server.requests >= 3 for server in stubs)
+    assert all(member.outstanding == 0 for member in pool.members)
+
+
+def test_pool_fails_over_then_probe_readmits(stubs, monkeypatch):
+    monkeypatch.setattr(Config, "BREAKER_FAILURE_THRESHOLD", 2)
+    stubs[0].status = 500
+    stubs[0].healthy = False
+    pool = space_pool([server.url for server in stubs])
+    session = requests.Session()
+    for _ in range(6):
+        # Each failure moves straight to another replica: every call succeeds
+        started = time.perf_counter()
+        pool.post(session, {"texts": ["a"]}, {}, Deadline(5))
+        assert time.perf_counter() - started < 0.5
+    assert stubs[0].requests == 2
+    assert pool.members[0].breaker.state == OPEN
+    assert len(pool.healthy()) == 2
+
+    stubs[0].status = 200
+    pool.probe()  # /health still failing: stays out
+    assert len(pool.healthy()) == 2
+    stubs[0].healthy = True
+    pool.probe()
+    assert pool.members[0].breaker.state == CLOSED and len(pool.healthy()) == 3
+
+    # A healthy replica failing its probe counts toward its breaker
+    stubs[1].healthy = False
+    pool.probe()
+    pool.probe()
+    assert pool.members[1].breaker.state == OPEN
+
+
+def test_pool_ejects_slow_replica(stubs, monkeypatch):
+    monkeypatch.setattr(Config, "POOL_SLOW_FACTOR", 3)
+    monkeypatch.setattr(Config, "POOL_EJECT_SECONDS", 0.3)
+    pool = space_pool([server.url for server in stubs[:2]])
+    fast, slow = pool.members
+    session = requests.Session()
+    post_many(pool, 2, workers=2)  # Warm connections
+    for member in pool.members:
+        member.latency.reset()
+        for _ in range(embedding_client.MIN_LATENCY_SAMPLES):
+            member.latency.observe(0.01)
+    stubs[1].delay = 0.2
+    # Two callers at once, so the slow replica gets traffic too
+    post_many(pool, 2, workers=2)
+    assert slow.ejected_until and pool.healthy() == [fast]
+    before = stubs[1].requests
+    for _ in range(3):
+        pool.post(session, {"texts": ["a"]}, {}, Deadline(5))
+    assert stubs[1].requests == before  # No traffic while ejected
+
+    time.sleep(0.35)
+    assert pool.healthy() == [fast, slow]
+    assert len(slow.latency) == 0  # Readmitted with a clean latency record
+
+
+def test_ewma_routing_prefers_the_faster_replica(stubs):
+    pool = EndpointPool(
+        [EmbeddingEndpoint(f"{server.url}/embed") for server in stubs[:2]], routing="ewma"
+    )
+    pool.members[0].latency.observe(0.2)
+    pool.members[1].latency.observe(0.01)
+    for _ in range(5):
+        pool.post(requests.Session(), {"texts": ["a"]}, {}, Deadline(5))
+    assert stubs[0].requests == 0 and stubs[1].requests == 5
+
+
+def test_generate_embeddings_spreads_batches(stubs, monkeypatch):
+    rng = np.random.default_rng(0)
+    for server in stubs:
+        server.dims = 40
+        server.delay = 0.02
+        server.vector = lambda text: rng.random(40).tolist()
+    monkeypatch.setattr(Config, "HF_SPACE_ENDPOINT", ",".join(s.url for s in stubs))
+    monkeypatch.setattr(Config, "ENCODING_BATCH_SIZE", 4)
+    movies = pd.concat([make_movies()] * 9, ignore_index=True)
+    movies["movieId"] = np.arange(1, len(movies) + 1)
+    processor = MovieBERTProcessor(lazy_load=True)
+    embeddings = processor.generate_embeddings(movies)
+    assert embeddings.shape == (45, 32)
+    assert sum(server.requests for server in stubs) == 12
+    assert all(server.requests >= 2 for server in stubs)
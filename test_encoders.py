@@ -0,0 +1,154 @@
+"""Test encoder backend selection, the fallback chain and the ONNX export."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+import encoders
+from bert_processor import MovieBERTProcessor
+from config import Config
+from encoders import FallbackEncoder, RemoteEncoder, build_encoder
+from projection import PCAProjection
+
+
+class FakeBackend:
+    def __init__(self, name, vector=None):
+        self.name = name
+        self.vector = vector
+        self.calls = 0
+
+    def encode(self, texts, deadline=None):
+        self.calls += 1
+        if self.vector is None:
+            raise RuntimeError(f"{self.name} down")
+        return np.tile(self.vector, (len(texts), 1))
+
+    async def encode_async(self, texts, client, deadline=None):
+        return self.encode(texts, deadline)
+
+
+def test_fallback_chain_moves_on():
+    local = FakeBackend("local")
+    remote = FakeBackend("remote", np.ones(4, dtype=np.float32))
+    chain = FallbackEncoder([local, remote])
+    before = encoders.ENCODER_FALLBACKS.value("local")
+    assert chain.encode(["a", "b"]).shape == (2, 4)
+    assert asyncio.run(chain.encode_async(["a"], None)).shape == (1, 4)
+    assert local.calls == 2 and remote.calls == 2
+    assert encoders.ENCODER_FALLBACKS.value("local") == before + 2
+
+    # The last backend's error is the caller's
+    with pytest.raises(RuntimeError, match="remote down"):
+        FallbackEncoder([local, FakeBackend("remote")]).encode(["a"])
+
+
+def test_build_skips_unavailable_backends(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "LOCAL_ENCODER_PATH", str(tmp_path / "missing"))
+    processor = MovieBERTProcessor(lazy_load=True)
+    assert isinstance(processor.encoder, RemoteEncoder)  # Default: remote only
+
+    # No export (or no onnxruntime): the chain keeps the remote backend
+    assert isinstance(build_encoder(processor, ["local", "remote"]), RemoteEncoder)
+    with pytest.raises(RuntimeError, match="No encoder backend"):
+        build_encoder(processor, ["local"])
+    with pytest.raises(RuntimeError):
+        build_encoder(processor, ["gpu"])
+
+
+def test_encoder_is_rebuilt_for_a_new_pca(monkeypatch):
+    built = []
+
+    def fake_build(processor):
+        built.append(processor.pca)
+        return FakeBackend("local", np.zeros(2, dtype=np.float32))
+
+    monkeypatch.setattr("bert_processor.build_encoder", fake_build)
+    processor = MovieBERTProcessor(lazy_load=True)
+    processor.encode(["a"])
+    processor.encode(["b"])
+    assert built == [None]
+    processor.pca = PCAProjection(np.zeros(4), np.eye(2, 4))
+    processor.encode(["c"])
+    assert built == [None, processor.pca]
+
+
+def tiny_model(tmp_path):
+    """Randomly initialized 2-layer BERT and a word-piece tokenizer over a tiny vocab"""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    torch.manual_seed(0)
+    words = "time loop comedy horror movie about a with the haunted hotel toys pixar".split()
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words
+    vocab_file = tmp_path / "vocab.txt"
+    vocab_file.write_text("\n".join(vocab))
+    tokenizer = transformers.BertTokenizerFast(str(vocab_file))
+    config = transformers.BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=64,
+    )
+    return transformers.BertModel(config).eval(), tokenizer
+
+
+def reference(model, tokenizer, texts, projection=None):
+    """Mean pooled, normalized (and projected) embeddings computed in torch"""
+    import torch
+
+    batch = tokenizer(texts, padding=True, return_tensors="pt")
+    with torch.no_grad():
+        hidden = model(**batch)[0]
+    mask = batch["attention_mask"].unsqueeze(-1).float()
+    pooled = torch.nn.functional.normalize((hidden * mask).sum(1) / mask.sum(1), dim=1).numpy()
+    return pooled if projection is None else projection.transform(pooled)
+
+
+def test_onnx_encoder_matches_torch(tmp_path, monkeypatch):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")  # Quantization
+    pytest.importorskip("tokenizers")
+    model, tokenizer = tiny_model(tmp_path)
+    rng = np.random.default_rng(0)
+    components = np.linalg.qr(rng.normal(size=(32, 8)))[0].T
+    projection = PCAProjection(rng.normal(size=32) * 0.01, components)
+    texts = ["time loop comedy", "a haunted hotel horror movie with the toys", "pixar"]
+    expected = reference(model, tokenizer, texts, projection)
+
+    fused_dir = str(tmp_path / "fused")
+    manifest = encoders.export_onnx(model, tokenizer, fused_dir, projection)
+    assert manifest["dims"] == 8 and manifest["pca_fingerprint"] == projection.fingerprint()
+    fused = encoders.OnnxEncoder(fused_dir, projection, quantized=False, threads=1)
+    assert fused.projection is None  # Applied inside the graph
+    np.testing.assert_allclose(fused.encode(texts), expected, atol=1e-4)
+
+    quantized = encoders.OnnxEncoder(fused_dir, projection, quantized=True, threads=1)
+    vectors = quantized.encode(texts)
+    cosine = np.sum(vectors * expected, 1) / (
+        np.linalg.norm(vectors, axis=1) * np.linalg.norm(expected, axis=1)
+    )
+    assert cosine.min() > 0.95
+
+    # The fused PCA must be the artifact's
+    other = PCAProjection(np.zeros(32), np.eye(8, 32))
+    with pytest.raises(ValueError, match="different PCA"):
+        encoders.OnnxEncoder(fused_dir, other, quantized=False)
+
+    # Unfused exports apply whatever PCA the processor has
+    plain_dir = str(tmp_path / "plain")
+    encoders.export_onnx(model, tokenizer, plain_dir, quantize=False)
+    plain = encoders.OnnxEncoder(plain_dir, other, quantized=False)
+    np.testing.assert_allclose(
+        plain.encode(texts), reference(model, tokenizer, texts, other), atol=1e-4
+    )
+
+    # Through the processor, ahead of a remote backend that is not configured
+    monkeypatch.setattr(Config, "ENCODER_BACKENDS", "local,remote")
+    monkeypatch.setattr(Config, "LOCAL_ENCODER_PATH", fused_dir)
+    monkeypatch.setattr(Config, "LOCAL_ENCODER_INT8", False)
+    monkeypatch.setattr(Config, "HF_SPACE_ENDPOINT", None)
+    processor = MovieBERTProcessor(lazy_load=True)
+    processor.pca = projection
+    np.testing.assert_allclose(processor.encode(["pixar"])[0], expected[2], atol=1e-4)
@@ -0,0 +1,141 @@
+"""Test versioned artifacts and hot engine reloads."""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import artifacts
+from engine_manager import EngineManager
+from test_catalog_index import make_movies
+
+
+class FakeEngine:
+    def __init__(self, directory):
+        self.directory = directory
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+def publish(root, version, rows=5):
+    embeddings = np.random.default_rng(0).standard_normal((rows, 4)).astype(np.float32)
+    return artifacts.write_artifact(embeddings, make_movies(), root=root, version=version)
+
+
+def test_artifact_round_trip(tmp_path):
+    directory = publish(str(tmp_path), "v1")
+    assert artifacts.current_version(str(tmp_path)) == "v1"
+    data = artifacts.read_artifact(directory)
+    assert data["manifest"]["rows"] == 5 and data["manifest"]["dims"] == 4
+    assert data["embeddings"].shape == (5, 4)
+    assert len(data["movies_data"]) == 5
+    assert data["pca"] is None
+
+
+def test_artifact_checksum_mismatch(tmp_path):
+    directory = publish(str(tmp_path), "v1")
+    with open(os.path.join(directory, artifacts.MOVIES), "ab") as f:
+        f.write(b"corrupt")
+    with pytest.raises(ValueError, match="checksum"):
+        artifacts.read_artifact(directory)
+
+
+def test_reload_pins_in_flight_requests(tmp_path):
+    root = str(tmp_path)
+    publish(root, "v1")
+    manager = EngineManager(FakeEngine, artifact_root=root)
+    assert manager.current().directory.endswith("v1")
+
+    with manager.acquire() as old:
+        publish(root, "v2")
+        assert manager.reload(wait=True)
+        # The request keeps the engine it started on; new requests see v2
+        assert old.directory.endswith("v1") and old.closed == 0
+        assert manager.current().directory.endswith("v2")
+        assert manager.status()["retired"] == [{"version": "v1", "in_flight": 1}]
+    assert old.closed == 1
+    assert manager.status()["retired"] == []
+
+
+def test_failed_reload_keeps_live_engine(tmp_path):
+    root = str(tmp_path)
+    publish(root, "v1")
+    calls = []
+
+    def factory(directory):
+        calls.append(directory)
+        if len(calls) > 1:
+            raise RuntimeError("bad artifact")
+        return FakeEngine(directory)
+
+    manager = EngineManager(factory, artifact_root=root)
+    live = manager.current()
+    publish(root, "v2")
+    manager.reload(wait=True)
+    assert manager.current() is live
+    status = manager.status()
+    assert status["live_version"] == "v1" and "bad artifact" in status["last_error"]
+
+
+def test_concurrent_first_use_builds_once(tmp_path):
+    root = str(tmp_path)
+    publish(root, "v1")
+    built = []
+
+    def factory(directory):
+        built.append(directory)
+        return FakeEngine(directory)
+
+    manager = EngineManager(factory, artifact_root=root)
+    threads = [threading.Thread(target=manager.current) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+
+
+def test_publish_moves_current_for_other_workers(tmp_path):
+    root = str(tmp_path)
+    publish(root, "v1")
+    publish(root, "v2")
+    manager = EngineManager(FakeEngine, artifact_root=root)
+    other = EngineManager(FakeEngine, artifact_root=root, watch_interval=0.01)
+    assert manager.current().directory.endswith("v2")
+    assert other.current().directory.endswith("v2")
+
+    assert manager.publish("v1", wait=True)
+    assert artifacts.current_version(root) == "v1"
+    assert manager.current().directory.endswith("v1")
+    for _ in range(200):  # The other worker's watcher follows CURRENT
+        if other.status()["live_version"] == "v1":
+            break
+        time.sleep(0.01)
+    assert other.status()["live_version"] == "v1"
+    with pytest.raises(ValueError, match="Unknown artifact version"):
+        manager.publish("v9")
+
+
+def test_status_does_not_wait_for_the_first_build(tmp_path):
+    root = str(tmp_path)
+    publish(root, "v1")
+    building = threading.Event()
+    release = threading.Event()
+
+    def factory(directory):
+        building.set()
+        release.wait(5)
+        return FakeEngine(directory)
+
+    manager = EngineManager(factory, artifact_root=root)
+    thread = threading.Thread(target=manager.current)
+    thread.start()
+    assert building.wait(5)
+    assert manager.status()["live_version"] is None  # Answered mid-build
+    release.set()
+    thread.join()
+    assert manager.status()["live_version"] == "v1"
@@ -0,0 +1,19 @@
+"""Test that the serving import path stays free of offline-only libraries."""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_flask_api_does_not_import_offline_libraries():
+    code = (
+        "import sys, flask_api\n"
+        "heavy = ('torch', 'transformers', 'sentence_transformers', 'sklearn', 'psutil')\n"
+        "print(sorted(m for m in sys.modules if m.split('.')[0] in heavy))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
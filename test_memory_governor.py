@@ -0,0 +1,105 @@
+"""Test the memory budget's loading plans and runtime cache eviction."""
+
+import numpy as np
+import pytest
+
+import memory_governor
+from bert_processor import MovieBERTProcessor
+from config import Config
+from embedding_cache import EmbeddingCache
+from memory_governor import LoadingPlan, MemoryGovernor, estimate_mb
+from rec_engine import MovieRecommendationEngine
+from test_engine_manager import publish
+
+ROWS, DIMS = 1_000_000, 64  # 244MB float32 matrix
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    monkeypatch.setattr(Config, "DENSE_SCORING", "exact")
+    monkeypatch.setattr(Config, "QUERY_CACHE_SIZE", 1024)
+    monkeypatch.setattr(memory_governor, "process_rss_mb", lambda: 100.0)
+    return MemoryGovernor(interval=0)
+
+
+def plan_for(governor, monkeypatch, budget_mb):
+    monkeypatch.setattr(Config, "MEMORY_BUDGET_MB", budget_mb)
+    return governor.plan(ROWS, DIMS)
+
+
+def test_plan_keeps_everything_when_it_fits(governor, monkeypatch):
+    plan = plan_for(governor, monkeypatch, 4096)
+    assert plan.dense_scoring == "exact" and plan.embeddings_in_memory
+    assert plan.fuzzy_index and plan.sparse_index
+    assert plan.query_cache_size == 1024
+    assert plan.expected_mb["embeddings"] == pytest.approx(2 * ROWS * DIMS * 4 / 2**20)
+    assert plan.total_mb <= 4096 and governor.last_plan is plan
+
+
+def test_plan_degrades_in_order(governor, monkeypatch):
+    full = estimate_mb(ROWS, DIMS, LoadingPlan(), baseline_mb=100.0)
+    total = sum(full.values())
+
+    # Just over: only the in-RAM matrix has to go
+    plan = plan_for(governor, monkeypatch, total - 1)
+    assert plan.query_cache_size == 128
+    assert plan.dense_scoring == "blocked" and not plan.embeddings_in_memory
+    assert plan.fuzzy_index and plan.sparse_index
+
+    # Without the matrix, the optional indexes go next
+    mapped = estimate_mb(ROWS, DIMS, plan, baseline_mb=100.0)
+    plan = plan_for(governor, monkeypatch, sum(mapped.values()) - 1)
+    assert not plan.fuzzy_index and plan.sparse_index
+
+    # Nothing fits: fully degraded, still returns a plan
+    plan = plan_for(governor, monkeypatch, 50)
+    assert plan.dense_scoring == "blocked"
+    assert not plan.fuzzy_index and not plan.sparse_index
+    assert plan.query_cache_size == 0
+    assert plan.total_mb > 50
+
+
+def test_memory_mapped_plan_when_loading_artifact(tmp_path, monkeypatch):
+    directory = publish(str(tmp_path), "v1")
+    plan = LoadingPlan(dense_scoring="blocked", fuzzy_index=False, sparse_index=False)
+    seen = []
+
+    def planner(rows, dims, movies_bytes):
+        seen.append((rows, dims, movies_bytes > 0))
+        return plan
+
+    processor = MovieBERTProcessor(lazy_load=True)
+    processor.load_artifact(directory, planner=planner)
+    assert seen == [(5, 4, True)]
+    assert isinstance(processor.movie_embeddings, np.memmap)
+    assert processor.fuzzy_index is None and processor.sparse_index is None
+
+    engine = MovieRecommendationEngine(processor, use_imdb=False)
+    assert engine.dense_scoring == "blocked"
+    assert engine.sparse_index is None and engine.fuzzy_index is None
+    # Fuzzy search degrades to substring matching; sparse retrieval is refused
+    assert [m["title"] for m in engine.search_movies("groundhog", mode="fuzzy")] == [
+        "Groundhog Day"
+    ]
+    assert engine.search_movies("grundhog", mode="auto") == []
+    with pytest.raises(ValueError):
+        engine.recommend_by_query("funny", mode="sparse")
+
+    # Hybrid ranks on dense scores alone
+    processor.encode = lambda texts, force_semantic=False: np.ones((1, 4), np.float32)
+    assert len(engine.recommend_by_query("funny", top_k=3, mode="hybrid")) == 3
+
+
+def test_check_evicts_caches_under_pressure(governor, monkeypatch):
+    cache = EmbeddingCache(100)
+    for i in range(40):
+        cache.put(f"query {i}", np.zeros(4, np.float32))
+    governor.register(cache)
+
+    monkeypatch.setattr(Config, "MEMORY_BUDGET_MB", 1000)
+    assert governor.check() == 0  # 100MB RSS is well under the watermark
+    monkeypatch.setattr(Config, "MEMORY_BUDGET_MB", 105)
+    assert governor.check() == 20
+    assert len(cache) == 20
+    # Least recently used entries go first
+    assert cache.get("query 0") is None and cache.get("query 39") is not None
@@ -0,0 +1,90 @@
+"""Test latency histograms, Server-Timing and the /metrics endpoint."""
+
+import numpy as np
+
+import flask_api
+import metrics
+from config import Config
+from embedding_cache import EmbeddingCache
+from engine_manager import EngineManager
+from metrics import Counter, Histogram
+from rec_engine import MovieRecommendationEngine
+from test_catalog_index import FakeProcessor, make_movies
+
+
+def test_histogram_render_is_cumulative():
+    histogram = Histogram("t_seconds", "Test", ("stage",), buckets=(0.01, 0.1))
+    histogram.observe(0.005, "encode")
+    histogram.observe(0.05, "encode")
+    histogram.observe(3.0, "encode")
+    lines = histogram.render()
+    assert lines[1] == "# TYPE t_seconds histogram"
+    assert 't_seconds_bucket{stage="encode",le="0.01"} 1' in lines
+    assert 't_seconds_bucket{stage="encode",le="0.1"} 2' in lines
+    assert 't_seconds_bucket{stage="encode",le="+Inf"} 3' in lines
+    assert 't_seconds_count{stage="encode"} 3' in lines
+    assert histogram.count("encode") == 3
+
+    counter = Counter("t_total", "Test", ("route", "status"))
+    counter.inc("/a", "200")
+    counter.inc("/a", "200", amount=2)
+    assert 't_total{route="/a",status="200"} 3' in counter.render()
+
+
+def test_stage_timings_and_server_timing(monkeypatch):
+    monkeypatch.setattr(Config, "METRICS_ENABLED", True)
+    timings = metrics.start_request()
+    metrics.record("scoring", 0.002)
+    metrics.record("scoring", 0.001)
+    with metrics.stage("topk"):
+        pass
+    assert [name for name, _ in timings] == ["scoring", "scoring", "topk"]
+    assert metrics.server_timing(timings).startswith("scoring;dur=3.00, topk;dur=")
+
+    monkeypatch.setattr(Config, "METRICS_ENABLED", False)
+    timings = metrics.start_request()
+    metrics.record("scoring", 0.002)
+    assert timings == []
+
+
+def test_embedding_cache_counts_hits_and_evicts():
+    hits = metrics.CACHE_REQUESTS.value("hit")
+    misses = metrics.CACHE_REQUESTS.value("miss")
+    cache = EmbeddingCache(2)
+    assert cache.get("Space Movies") is None
+    cache.put("Space Movies", np.ones(4, np.float32))
+    assert cache.get("  space   movies ") is not None
+    cache.put("b", np.zeros(4, np.float32))
+    cache.put("c", np.zeros(4, np.float32))
+    assert cache.get("space movies") is None  # Least recently used evicted
+    assert len(cache) == 2
+    assert metrics.CACHE_REQUESTS.value("hit") == hits + 1
+    assert metrics.CACHE_REQUESTS.value("miss") == misses + 2
+
+
+def test_flask_server_timing_and_metrics_endpoint(monkeypatch):
+    monkeypatch.setattr(Config, "METRICS_ENABLED", True)
+
+    def factory(directory=None):
+        processor = FakeProcessor(make_movies(), np.eye(5, 4, dtype=np.float32) + 0.1)
+        return MovieRecommendationEngine(processor, use_imdb=False)
+
+    monkeypatch.setattr(flask_api, "engine_manager", EngineManager(factory))
+    client = flask_api.app.test_client()
+
+    response = client.get("/api/recommendations/query?query=fun&top_k=3&mode=dense")
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    for name in ("parse", "scoring", "topk", "assembly", "serialization", "total"):
+        assert f"{name};dur=" in timing
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert 'recommender_stage_seconds_bucket{stage="scoring",le="+Inf"}' in body
+    assert (
+        'recommender_requests_total{route="/api/recommendations/query",status="200"}'
+        in body
+    )
+    assert "# TYPE recommender_singleflight_executed gauge" in body
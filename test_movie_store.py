@@ -0,0 +1,109 @@
+"""Test the compact movie metadata store against the DataFrame it replaces."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bert_processor import MovieBERTProcessor
+from config import Config
+from movie_store import MovieStore
+from rec_engine import MovieRecommendationEngine
+from results import ResultStore, encode_results
+from test_catalog_index import FakeProcessor, make_movies
+from test_engine_manager import publish
+
+
+def test_round_trip_and_row_lookup():
+    movies = make_movies()
+    store = MovieStore(movies)
+    assert len(store) == 5 and store.columns == list(movies.columns)
+    assert store.genres.masks.dtype == np.uint32
+    assert store.tags.ids.dtype == np.int16
+    frame = store.to_frame()
+    pd.testing.assert_frame_equal(
+        frame.drop(columns="year"), movies.drop(columns="year"), check_dtype=False
+    )
+    assert frame["year"].tolist() == ["1994", "1996", "1993", "1980", None]
+    assert store.row(4) == {
+        "movieId": 5,
+        "clean_title": "Toy Story",
+        "year": None,
+        "genres_list": ["Animation", "Comedy"],
+        "avg_rating": pytest.approx(3.9),
+        "rating_count": 50,
+        "combined_tags": movies.loc[4, "combined_tags"],
+    }
+    assert store.genres.combination_ids is None
+    # Non-ASCII titles slice the UTF-8 buffer on character boundaries
+    movies.loc[1, "clean_title"] = "Amélie"
+    assert MovieStore(movies).row(1)["clean_title"] == "Amélie"
+    # Same genre set listed in another order keeps each row's order
+    movies.at[0, "genres_list"] = ["Romance", "Comedy"]
+    genres = MovieStore(movies).genres
+    assert genres.combination_ids is not None
+    assert genres.tolist() == movies["genres_list"].tolist()
+    assert genres.masks[0] == genres.masks[2]
+
+
+def test_results_match_result_store():
+    movies = make_movies()
+    movies.loc[1, "avg_rating"] = np.nan
+    rows, scores = [4, 1, 0], np.array([0.9, 0.5, 0.1], np.float32)
+    expected = ResultStore(movies).take(rows, scores)
+    actual = MovieStore(movies).take(rows, scores)
+    assert actual.columns == expected.columns
+    assert encode_results(actual, "recommendations") == encode_results(
+        expected, "recommendations"
+    )
+    fields = ("movieId", "title", "year")
+    assert MovieStore(movies).take(rows, fields=fields).to_records() == (
+        ResultStore(movies).take(rows, fields=fields).to_records()
+    )
+    # Numeric years (older artifacts) come back as the same floats
+    movies["year"] = pd.to_numeric(movies["year"]).astype(np.float32)
+    assert MovieStore(movies).take([0, 4]).columns["year"] == [1994.0, None]
+
+
+def test_unrepresentable_years_are_refused():
+    movies = make_movies()
+    movies.loc[0, "year"] = "1994-95"
+    with pytest.raises(ValueError):
+        MovieStore(movies)
+
+
+def test_engine_serves_from_store():
+    movies = make_movies()
+    embeddings = np.eye(5, 4, dtype=np.float32) + 0.1
+    engines = [
+        MovieRecommendationEngine(FakeProcessor(data, embeddings), use_imdb=False)
+        for data in (movies, MovieStore(movies))
+    ]
+    for call in (
+        lambda e: e.recommend_by_query("fun", 3, mode="dense", filters={"genres": ["Comedy"]}),
+        lambda e: e.recommend_by_query("stephen king", 3, mode="sparse"),
+        lambda e: e.search_movies("grundhog", mode="auto"),
+        lambda e: e.autocomplete("sc"),
+    ):
+        frame_result, store_result = (call(engine) for engine in engines)
+        assert json.dumps(store_result) == json.dumps(frame_result)
+    assert engines[1].result_store is engines[1].movies
+
+
+def test_processor_compacts_loaded_artifact(tmp_path, monkeypatch):
+    directory = publish(str(tmp_path), "v1")
+    processor = MovieBERTProcessor(lazy_load=True)
+    processor.load_artifact(directory)
+    assert isinstance(processor.movies_data, MovieStore)
+    assert processor.result_store is processor.movies_data
+    # Republishing converts back to the DataFrame layout
+    republished = processor.save_artifact(str(tmp_path), "v2")
+    processor = MovieBERTProcessor(lazy_load=True)
+    processor.load_artifact(republished)
+    assert processor.movies_data.row(2)["clean_title"] == "Groundhog Day"
+
+    monkeypatch.setattr(Config, "COMPACT_METADATA", False)
+    processor = MovieBERTProcessor(lazy_load=True)
+    processor.load_artifact(directory)
+    assert isinstance(processor.movies_data, pd.DataFrame)
@@ -0,0 +1,119 @@
+"""Test the sampling profiler, profile rotation and tracemalloc diffs."""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+import flask_api
+import profiling
+import serving
+from config import Config
+from engine_manager import EngineManager
+from memory_governor import LoadingPlan
+from profiling import ProfileStore, SamplingProfiler, memory_diff
+from rec_engine import MovieRecommendationEngine
+from test_catalog_index import FakeProcessor, make_movies
+
+
+def busy_scoring_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def test_sampling_profiler_collapses_stacks():
+    with SamplingProfiler([threading.get_ident()], interval=0.001) as profiler:
+        busy_scoring_loop(0.1)
+    assert profiler.samples > 0
+    top_stack, count = profiler.collapsed()[0].rsplit(" ", 1)
+    assert int(count) > 0
+    names = [frame.split(" ")[0] for frame in top_stack.split(";")]
+    # Root first, leaf last
+    assert names.index("test_sampling_profiler_collapses_stacks") < names.index(
+        "busy_scoring_loop"
+    )
+
+
+def test_profile_store_rotates(tmp_path):
+    store = ProfileStore(str(tmp_path), keep=2)
+    profiler = SamplingProfiler(interval=0.001).start().stop()
+    paths = []
+    for i in range(4):
+        paths.append(store.write(f"/api/search #{i}", profiler))
+        os.utime(paths[-1], (i, i))
+    remaining = sorted(os.listdir(tmp_path))
+    assert len(remaining) == 2
+    assert all(name.endswith(".collapsed") and "api_search" in name for name in remaining)
+    assert open(paths[-1]).readline().startswith("# samples=")
+
+
+def test_should_profile_every_nth(monkeypatch):
+    monkeypatch.setattr(Config, "PROFILE_EVERY_N", 0)
+    assert not any(profiling.should_profile() for _ in range(10))
+    assert profiling.should_profile(forced=True)
+    monkeypatch.setattr(Config, "PROFILE_EVERY_N", 3)
+    assert sum(profiling.should_profile() for _ in range(30)) == 10
+
+
+def test_memory_diff_finds_allocation_site():
+    kept = []
+
+    def allocate():
+        kept.append(np.ones(1 << 18))  # 2 MiB
+
+    report = memory_diff(allocate, limit=5)
+    assert report["net_bytes"] >= 2 << 20
+    assert report["peak_bytes"] >= 2 << 20
+    # Attributed through NumPy back to the calling code, oldest frame first
+    assert any("test_profiling.py" in frame for frame in report["top"][0]["traceback"])
+
+
+def test_flask_profile_header_and_memory_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(Config, "PROFILE_DIR", str(tmp_path))
+
+    def factory(directory=None):
+        processor = FakeProcessor(make_movies(), np.eye(5, 4, dtype=np.float32) + 0.1)
+        return MovieRecommendationEngine(processor, use_imdb=False)
+
+    manager = EngineManager(factory)
+    monkeypatch.setattr(flask_api, "engine_manager", manager)
+    monkeypatch.setattr(serving, "engine_manager", manager)
+    client = flask_api.app.test_client()
+
+    url = "/api/recommendations/query?query=fun&top_k=3&mode=dense"
+    response = client.get(url, headers={"X-Profile": "1"})
+    assert "X-Profile-File" not in response.headers  # Needs the admin token
+    response = client.get(url, headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert os.listdir(tmp_path) == [response.headers["X-Profile-File"]]
+
+    assert client.post("/api/admin/memory-diff", json={}).status_code == 403
+    response = client.post(
+        "/api/admin/memory-diff",
+        json={"query": "fun", "mode": "dense", "limit": 3},
+        headers={"X-Admin-Token": "secret"},
+    )
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["target"] == "query"
+    assert len(report["top"]) <= 3
+    response = client.post(
+        "/api/admin/memory-diff", json={"target": "disk"}, headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 400
+
+    # A second engine that cannot fit next to the live one is refused
+    manager.current().bert_processor.plan = LoadingPlan(
+        expected_mb={"baseline": 100.0, "embeddings": 400.0}
+    )
+    monkeypatch.setattr(serving.memory_governor, "headroom_mb", lambda: 50.0)
+    response = client.post(
+        "/api/admin/memory-diff", json={"target": "load"}, headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 400
+    assert "memory budget" in response.get_json()["error"]
@@ -0,0 +1,47 @@
+"""Test the array-based PCA projection against sklearn's PCA.transform."""
+
+import numpy as np
+import pytest
+
+import artifacts
+from projection import PCAProjection
+from test_catalog_index import make_movies
+
+
+def sentence_like(n, dims=384, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n, dims)).astype(np.float32) + 0.3
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("whiten", [False, True])
+def test_projection_matches_sklearn_transform(whiten):
+    decomposition = pytest.importorskip("sklearn.decomposition")
+    pca = decomposition.PCA(n_components=32, whiten=whiten).fit(sentence_like(500))
+    projection = PCAProjection.from_sklearn(pca)
+    queries = sentence_like(20, seed=1)
+
+    expected = pca.transform(queries)
+    actual = projection.transform(queries)
+    assert actual.dtype == np.float32 and actual.shape == (20, 32)
+    np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-5)
+    np.testing.assert_allclose(projection.transform(queries[0]), expected[:1], atol=1e-5)
+
+
+def test_projection_round_trips_through_artifact(tmp_path):
+    rng = np.random.default_rng(0)
+    projection = PCAProjection(rng.standard_normal(16), rng.standard_normal((4, 16)))
+    embeddings = rng.standard_normal((5, 4)).astype(np.float32)
+    directory = artifacts.write_artifact(
+        embeddings, make_movies(), projection, root=str(tmp_path), version="v1"
+    )
+    loaded = artifacts.read_artifact(directory)["pca"]
+    query = rng.standard_normal((2, 16))
+    np.testing.assert_array_equal(loaded.transform(query), projection.transform(query))
+    files = artifacts.read_manifest(directory)["files"]
+    assert "pca_mean.npy" in files and "pca_scale.npy" not in files
+
+
+def test_projection_rejects_mismatched_shapes():
+    with pytest.raises(ValueError):
+        PCAProjection(np.zeros(8), np.zeros((4, 16)))
@@ -0,0 +1,100 @@
+"""Test columnar results and response encoding."""
+
+import json
+
+import numpy as np
+import pytest
+
+import flask_api
+import results
+import serving
+from config import Config
+from engine_manager import EngineManager
+from rec_engine import MovieRecommendationEngine
+from results import ResultStore, encode_results
+from test_catalog_index import FakeProcessor, make_movies
+
+
+def test_result_columns_are_json_native():
+    movies = make_movies()
+    movies.loc[1, "avg_rating"] = np.nan
+    columns = ResultStore(movies).take([4, 1], np.array([0.9, 0.5], np.float32))
+    records = columns.to_records()
+    assert records[0] == {
+        "movieId": 5,
+        "title": "Toy Story",
+        "year": None,
+        "genres": ["Animation", "Comedy"],
+        "avg_rating": pytest.approx(3.9),
+        "score": pytest.approx(0.9),
+    }
+    assert records[1]["avg_rating"] is None
+    assert type(records[0]["movieId"]) is int
+    # Missing columns fall back to the old per-row defaults
+    no_year = ResultStore(movies.drop(columns=["year"])).take([0])
+    assert no_year.to_records()[0]["year"] == "Unknown"
+
+
+def test_encode_results_formats():
+    columns = ResultStore(make_movies()).take([0, 2], [0.5, 0.25])
+    body, content_type = encode_results(columns, "recommendations")
+    payload = json.loads(body)
+    assert content_type == "application/json"
+    assert payload["count"] == 2
+    assert [r["title"] for r in payload["recommendations"]] == [
+        "Dumb and Dumber",
+        "Groundhog Day",
+    ]
+
+    body, _ = encode_results(columns, "recommendations", "columns")
+    assert json.loads(body)["columns"]["score"] == [0.5, 0.25]
+    with pytest.raises(ValueError):
+        encode_results(columns, "recommendations", "xml")
+    if results.msgpack is not None:
+        body, content_type = encode_results(columns, "recommendations", "msgpack")
+        assert content_type == "application/msgpack"
+        assert results.msgpack.unpackb(body)["columns"]["movieId"] == [1, 3]
+
+
+def test_flask_query_route_formats(monkeypatch):
+    def factory(directory=None):
+        processor = FakeProcessor(make_movies(), np.eye(5, 4, dtype=np.float32) + 0.1)
+        return MovieRecommendationEngine(processor, use_imdb=False)
+
+    monkeypatch.setattr(flask_api, "engine_manager", EngineManager(factory))
+    client = flask_api.app.test_client()
+
+    response = client.post(
+        "/api/recommendations/query", json={"query": "fun", "top_k": 3, "mode": "dense"}
+    )
+    assert response.status_code == 200
+    assert len(response.get_json()["recommendations"]) == 3
+
+    response = client.get("/api/recommendations/query?query=fun&top_k=3&format=columns")
+    assert len(response.get_json()["columns"]["title"]) == 3
+
+    response = client.get("/api/recommendations/query?query=fun&format=xml")
+    assert response.status_code == 400
+
+    # Accept only picks MessagePack when it is installed and preferred to JSON
+    accept = "application/json, application/msgpack;q=0.1"
+    response = client.get(
+        "/api/recommendations/query?query=fun&top_k=3", headers={"Accept": accept}
+    )
+    assert response.status_code == 200 and response.mimetype == "application/json"
+
+
+def test_response_format_negotiation(monkeypatch):
+    monkeypatch.setattr(serving, "msgpack", None)
+    assert serving.response_format(accept="application/msgpack") == Config.RESPONSE_FORMAT
+    with pytest.raises(ValueError, match="msgpack"):
+        serving.response_format("msgpack")
+
+    monkeypatch.setattr(serving, "msgpack", object())
+    assert serving.response_format(accept="application/msgpack") == "msgpack"
+    assert serving.response_format(accept="application/msgpack, */*;q=0.5") == "msgpack"
+    assert serving.response_format(accept="application/json, application/msgpack;q=0.1") == (
+        Config.RESPONSE_FORMAT
+    )
+    assert serving.response_format(accept="application/msgpack;q=0") == Config.RESPONSE_FORMAT
+    assert serving.response_format("columns", accept="application/msgpack") == "columns"
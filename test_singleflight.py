@@ -0,0 +1,70 @@
+"""Test single-flight deduplication of concurrent identical requests."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight, flight_key
+
+
+def test_flight_key_normalizes_query_and_filters():
+    a = flight_key("  Dark   Knight ", 8, {"year_min": 2000, "genres": ["Action"]}, "dense")
+    b = flight_key("dark knight", 8, {"genres": ["Action"], "year_min": 2000}, "dense")
+    assert a == b
+    assert a != flight_key("dark knight", 9, {"genres": ["Action"], "year_min": 2000}, "dense")
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return ["result"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flights.do("k", compute)))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    while flights.executed + flights.shared < 10:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [["result"]] * 10
+    assert flights.stats() == {"executed": 1, "shared": 9}
+    # Once finished, the next caller computes again
+    flights.do("k", compute)
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_waiter():
+    flights = SingleFlight()
+    with pytest.raises(RuntimeError):
+        flights.do("k", lambda: (_ for _ in ()).throw(RuntimeError("upstream down")))
+    assert flights.do("k", lambda: 1) == 1
+
+
+def test_async_single_flight():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*[flights.do("k", compute) for _ in range(20)])
+
+    assert asyncio.run(run()) == ["result"] * 20
+    assert len(calls) == 1 and flights.stats() == {"executed": 1, "shared": 19}
@@ -0,0 +1,65 @@
+"""Test trigram/prefix title search"""
+
+import numpy as np
+
+from fuzzy_index import FuzzyTitleIndex, edit_distance
+from title_index import TitleIndex, normalize_text
+
+
+TITLES = [
+    "The Dark Knight",
+    "Dark City",
+    "Spider-Man",
+    "Amélie",
+    "Knight and Day",
+    "Star Wars: Episode IV - A New Hope",
+    "The Darkest Hour",
+]
+POPULARITY = [900, 120, 500, 300, 40, 1000, 60]
+
+
+def test_normalize_text():
+    assert normalize_text("Star Wars: Episode IV - A New Hope") == (
+        "star wars episode iv a new hope"
+    )
+    assert normalize_text("Amélie") == "amelie"
+    assert normalize_text(None) == ""
+
+
+def test_substring_is_literal_and_ranked_by_popularity():
+    index = TitleIndex(TITLES, POPULARITY)
+    assert index.substring("dark").tolist() == [0, 1, 6]
+    assert index.substring("DARK", limit=2).tolist() == [0, 1]
+    assert index.substring("spider man").tolist() == [2]
+    assert index.substring("amelie").tolist() == [3]
+    # Regex metacharacters are matched literally (and here, not at all)
+    assert index.substring("d.rk").tolist() == []
+    assert index.substring("ar").tolist() == [5, 0, 1, 6]
+
+    mask = np.array([False, True, True, True, True, True, True])
+    assert index.substring("dark", mask=mask).tolist() == [1, 6]
+
+
+def test_prefix_matches_word_starts():
+    index = TitleIndex(TITLES, POPULARITY, cached_prefix_len=2, cache_size=3)
+    assert index.prefix("dark kn").tolist() == [0]
+    assert index.prefix("kni").tolist() == [0, 4]
+    assert index.prefix("d", limit=10).tolist() == [0, 1, 6, 4]
+    assert index.prefix("d", limit=2).tolist() == [0, 1]
+    assert index.prefix("new h").tolist() == [5]
+    assert index.prefix("").tolist() == []
+
+
+def test_fuzzy_search_tolerates_typos():
+    titles = ["Inception", "The Godfather", "The Godfather: Part II", "Interception"]
+    index = FuzzyTitleIndex(titles, [900, 800, 500, 10])
+    assert index.search("Incepton").tolist()[0] == 0
+    assert index.search("Godfathr").tolist() == [1, 2]
+    assert index.search("godfathr part ii").tolist()[0] == 2
+    assert index.search("xyzzy").tolist() == []
+
+
+def test_edit_distance():
+    assert edit_distance("incepton", "inception", 2) == 1
+    assert edit_distance("godfahter", "godfather", 2) == 1  # transposition
+    assert edit_distance("abc", "xyz123", 2) == 3
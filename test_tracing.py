@@ -0,0 +1,113 @@
+"""Test request tracing spans, sampling and export."""
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import flask_api
+import tracing
+from config import Config
+from engine_manager import EngineManager
+from metrics import stage
+from rec_engine import MovieRecommendationEngine
+from test_catalog_index import FakeProcessor, make_movies
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(Config, "TRACE_EXPORT", str(path))
+    monkeypatch.setattr(Config, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(Config, "TRACE_SLOW_MS", 0)
+    yield path
+    monkeypatch.setattr(Config, "TRACE_EXPORT", "")
+    tracing.get_exporter()  # Close the file exporter
+
+
+def read_traces(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_nested_spans_are_exported(trace_file):
+    @tracing.traced("encode")
+    def encode():
+        with tracing.span("encode_attempt", attempt=1):
+            pass
+
+    root = tracing.start_trace("request", route="/q")
+    encode()
+    with stage("scoring"):
+        pass
+    with pytest.raises(ValueError):
+        with tracing.span("imdb_search"):
+            raise ValueError("boom")
+    assert tracing.finish_trace(root, status=200)
+
+    (trace,) = read_traces(trace_file)
+    spans = {span["name"]: span for span in trace["spans"]}
+    assert spans["request"]["parent_id"] is None
+    assert spans["request"]["attributes"] == {"route": "/q", "status": 200}
+    assert spans["encode"]["parent_id"] == spans["request"]["span_id"]
+    assert spans["encode_attempt"]["parent_id"] == spans["encode"]["span_id"]
+    assert spans["encode_attempt"]["attributes"] == {"attempt": 1}
+    assert spans["scoring"]["parent_id"] == spans["request"]["span_id"]
+    assert spans["imdb_search"]["error"] == "ValueError: boom"
+
+
+def test_sampling_and_slow_requests(trace_file, monkeypatch):
+    monkeypatch.setattr(Config, "TRACE_SAMPLE_RATE", 0.0)
+    assert tracing.start_trace("request") is None
+    # Outside a trace spans are shared no-ops
+    assert tracing.span("scoring") is tracing.span("encode")
+
+    # A caller-supplied trace ID is always traced
+    root = tracing.start_trace("request", trace_id="abc-123")
+    assert tracing.finish_trace(root)
+    assert tracing.start_trace("request", trace_id="bad id!") is None
+
+    # Unsampled requests still record, and export only when slow
+    monkeypatch.setattr(Config, "TRACE_SLOW_MS", 50)
+    fast = tracing.start_trace("request")
+    assert not tracing.finish_trace(fast)
+    slow = tracing.start_trace("request")
+    slow.start -= 0.1
+    assert tracing.finish_trace(slow)
+    assert [t["trace_id"] for t in read_traces(trace_file)] == ["abc-123", slow.trace.trace_id]
+
+
+def test_async_spans_follow_tasks(trace_file):
+    @tracing.traced("encode")
+    async def encode():
+        await asyncio.sleep(0)
+
+    async def handle():
+        root = tracing.start_trace("request")
+        await asyncio.gather(encode(), encode())
+        tracing.finish_trace(root)
+
+    asyncio.run(handle())
+    (trace,) = read_traces(trace_file)
+    assert [s["parent_id"] for s in trace["spans"]] == [None, 1, 1]
+
+
+def test_flask_request_trace(trace_file, monkeypatch):
+    def factory(directory=None):
+        processor = FakeProcessor(make_movies(), np.eye(5, 4, dtype=np.float32) + 0.1)
+        return MovieRecommendationEngine(processor, use_imdb=False)
+
+    monkeypatch.setattr(flask_api, "engine_manager", EngineManager(factory))
+    client = flask_api.app.test_client()
+    response = client.get(
+        "/api/recommendations/query?query=fun&top_k=3&mode=dense",
+        headers={"X-Trace-Id": "req-42"},
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Trace-Id"] == "req-42"
+
+    (trace,) = read_traces(trace_file)
+    names = [span["name"] for span in trace["spans"]]
+    assert names[0] == "request"
+    assert {"scoring", "topk", "assembly", "serialization"} <= set(names)
+    assert trace["spans"][0]["attributes"]["route"] == "/api/recommendations/query"
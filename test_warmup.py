@@ -0,0 +1,65 @@
+"""Test the boot warm-up and readiness state."""
+
+import numpy as np
+
+import serving
+from config import Config
+from engine_manager import EngineManager
+from warmup import Warmup, touch_pages
+
+
+def test_warmup_ready_with_failed_optional_step():
+    calls = []
+
+    def probe():
+        raise ConnectionError("space asleep")
+
+    warmup = Warmup([("load", lambda: calls.append("load"), True), ("probe", probe, False)])
+    assert warmup.start()
+    assert warmup.wait(5)
+    status = warmup.status()
+    assert calls == ["load"]
+    assert status["stages"]["load"]["status"] == "ok"
+    assert status["stages"]["probe"]["status"].startswith("failed: ConnectionError")
+    assert status["time_to_ready_seconds"] >= status["warmup_seconds"] >= 0
+    assert not warmup.start()  # already ready
+
+
+def test_warmup_required_failure_retries():
+    attempts = []
+
+    def load():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise FileNotFoundError("embeddings")
+
+    warmup = Warmup([("load", load, True)])
+    warmup.start()
+    assert not warmup.wait(5)
+    assert warmup.status()["error"] == "load: embeddings"
+    assert warmup.start()
+    assert warmup.wait(5)
+    assert warmup.status()["error"] is None
+
+
+def test_touch_pages_reads_one_value_per_page():
+    matrix = np.ones((4096, 8), dtype=np.float32)
+    assert touch_pages(matrix) == matrix.nbytes // 4096
+    assert touch_pages(np.ones((3, 2), dtype=np.float32)[:, :1]) == 1
+    assert touch_pages(None) == 0
+
+
+def test_preload_starts_no_threads(monkeypatch):
+    manager = EngineManager(lambda directory: object(), watch_interval=60)
+    started = []
+    monkeypatch.setattr(serving, "engine_manager", manager)
+    monkeypatch.setattr(serving.memory_governor, "start", lambda: started.append("governor"))
+    monkeypatch.setattr(Config, "WARMUP_ON_START", False)
+
+    # The gunicorn master: engine built, no watcher or governor thread
+    serving.preload_engine()
+    assert manager.loaded and started == [] and manager._watcher_pid is None
+
+    # The forked worker starts them
+    serving.start_warmup()
+    assert started == ["governor"] and manager._watcher_pid is not None
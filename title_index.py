@@ -0,0 +1,155 @@
+"""Prebuilt trigram and prefix index over normalized movie titles."""
+
+import logging
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_text(text):
+    """Lowercase, strip accents and collapse punctuation to single spaces."""
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def _trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """
+    Substring and prefix lookup over titles, ranked by popularity.
+
+    Rows are renumbered by popularity rank (rating_count, descending), so every
+    posting list is already in ranking order: intersecting trigram postings
+    yields candidates best-first and a lookup can stop after top_k hits.
+    Prefix lookup bisects a sorted list of word-start suffixes ("dark kn"
+    finds "the dark knight"); one- and two-character prefixes are answered
+    from a precomputed table.
+    """
+
+    def __init__(self, titles, popularity=None, cached_prefix_len=2, cache_size=20):
+        titles = [normalize_text(t) for t in titles]
+        n = len(titles)
+        if popularity is None:
+            popularity = np.zeros(n)
+        popularity = np.nan_to_num(np.asarray(popularity, dtype=np.float64))
+
+        # rank -> row, and normalized titles stored in rank order
+        self.rows_by_rank = np.argsort(-popularity, kind="stable").astype(np.int32)
+        self.titles = [titles[row] for row in self.rows_by_rank]
+        self.size = n
+
+        postings = defaultdict(list)
+        suffixes = []
+        for rank, title in enumerate(self.titles):
+            for gram in _trigrams(title):
+                postings[gram].append(rank)
+            start = 0
+            for word in title.split(" "):
+                suffixes.append((title[start:], rank))
+                start += len(word) + 1
+        self.postings = {
+            gram: np.asarray(ranks, dtype=np.int32) for gram, ranks in postings.items()
+        }
+
+        suffixes.sort()
+        self._suffix_keys = [key for key, _ in suffixes]
+        self._suffix_ranks = np.asarray([rank for _, rank in suffixes], dtype=np.int32)
+
+        self.cache_size = cache_size
+        self._prefix_cache = {}
+        for length in range(1, cached_prefix_len + 1):
+            for prefix in {key[:length] for key in self._suffix_keys if len(key) >= length}:
+                self._prefix_cache[prefix] = self._prefix_ranks(prefix, cache_size)
+
+        logger.info(
+            f"Title index built: {n} titles, {len(self.postings)} trigrams, "
+            f"{len(self._suffix_keys)} prefix keys"
+        )
+
+    @classmethod
+    def from_movies(cls, movies_df):
+        """Index clean_title, ranked by rating_count when available"""
+        popularity = (
+            movies_df["rating_count"] if "rating_count" in movies_df.columns else None
+        )
+        return cls(movies_df["clean_title"].tolist(), popularity)
+
+    def _prefix_ranks(self, prefix, limit):
+        lo = bisect_left(self._suffix_keys, prefix)
+        hi = bisect_left(self._suffix_keys, prefix + "\uffff", lo)
+        ranks = self._suffix_ranks[lo:hi]
+        # A title can match through several of its words, hence the unique.
+        # For wide ranges only the smallest ranks need sorting.
+        window = limit * 4
+        if len(ranks) > window:
+            best = np.unique(np.partition(ranks, window)[: window + 1])
+            if len(best) >= limit:
+                return best[:limit]
+        return np.unique(ranks)[:limit]
+
+    def popular(self, limit=10, mask=None):
+        """The limit most-rated rows (restricted to mask), most popular first"""
+        rows = self.rows_by_rank
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return rows[:limit]
+
+    def prefix(self, text, limit=10):
+        """Row indices of titles with a word starting with text, most popular first."""
+        prefix = normalize_text(text)
+        if not prefix:
+            return np.empty(0, dtype=np.int32)
+        ranks = self._prefix_cache.get(prefix)
+        if ranks is None or limit > self.cache_size:
+            ranks = self._prefix_ranks(prefix, limit)
+        return self.rows_by_rank[ranks[:limit]]
+
+    def substring(self, text, limit=20, mask=None):
+        """
+        Row indices of titles containing text, most popular first.
+
+        mask is an optional boolean array over rows (e.g. from CatalogIndex);
+        rows where it is False are skipped.
+        """
+        term = normalize_text(text)
+        if not term:
+            return np.empty(0, dtype=np.int32)
+
+        if len(term) < 3:
+            candidates = range(self.size)
+        else:
+            grams = sorted(_trigrams(term), key=lambda g: len(self.postings.get(g, ())))
+            candidates = self.postings.get(grams[0])
+            if candidates is None:
+                return np.empty(0, dtype=np.int32)
+            for gram in grams[1:]:
+                other = self.postings.get(gram)
+                if other is None:
+                    return np.empty(0, dtype=np.int32)
+                candidates = np.intersect1d(candidates, other, assume_unique=True)
+                if len(candidates) == 0:
+                    return np.empty(0, dtype=np.int32)
+
+        rows = []
+        for rank in candidates:
+            if term not in self.titles[rank]:
+                continue
+            row = self.rows_by_rank[rank]
+            if mask is not None and not mask[row]:
+                continue
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+        return np.asarray(rows, dtype=np.int32)
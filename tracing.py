@@ -0,0 +1,228 @@
+"""Lightweight request tracing: one trace ID per request, nested spans."""
+
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Innermost open span of the current request (None when not traced)
+_current = ContextVar("current_span", default=None)
+_NOOP = nullcontext()
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attributes", "error")
+
+    def __init__(self, trace, span_id, parent_id, name, attributes):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration_ms(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """Spans of one request; exported as a single JSON line when it ends."""
+
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled  # Head decision; slow traces are exported anyway
+        self.started_at = time.time()
+        self.spans = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def open(self, name, parent_id, attributes):
+        with self._lock:
+            self._next_id += 1
+            span = Span(self, self._next_id, parent_id, name, attributes)
+            self.spans.append(span)
+        return span
+
+    def to_dict(self):
+        root = self.spans[0]
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name,
+            "start": self.started_at,
+            "duration_ms": round(root.duration_ms, 3),
+            "spans": [
+                {
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    "offset_ms": round((span.start - root.start) * 1000, 3),
+                    "duration_ms": round(span.duration_ms, 3),
+                    "attributes": span.attributes,
+                    "error": span.error,
+                }
+                for span in self.spans
+            ],
+        }
+
+
+class _SpanContext:
+    __slots__ = ("parent", "name", "attributes", "span", "token")
+
+    def __init__(self, parent, name, attributes):
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.span = self.parent.trace.open(self.name, self.parent.span_id, self.attributes)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end = time.perf_counter()
+        if exc_type is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self.token)
+        return False
+
+
+def span(name, **attributes):
+    """Context manager for a child span; a no-op outside a recorded trace."""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return _SpanContext(parent, name, attributes)
+
+
+def traced(name):
+    """Decorator wrapping every call of a function (sync or async) in a span."""
+
+    def decorate(fn):
+        if iscoroutinefunction(fn):
+
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+# ------------------------------------------------------------------ export
+
+
+class StreamExporter:
+    """Writes one JSON line per trace to a stream (stdout) or an appended file."""
+
+    def __init__(self, stream, close=False):
+        self._stream = stream
+        self._close = close
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(trace.to_dict(), default=str, separators=(",", ":"))
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+    def close(self):
+        if self._close:
+            self._stream.close()
+
+
+_exporter = None
+_exporter_target = None
+
+
+def get_exporter():
+    """Exporter for Config.TRACE_EXPORT ("stdout" or a file path); None when off."""
+    global _exporter, _exporter_target
+    target = Config.TRACE_EXPORT
+    if target != _exporter_target:
+        if _exporter is not None:
+            _exporter.close()
+        _exporter = None
+        if target == "stdout":
+            _exporter = StreamExporter(sys.stdout)
+        elif target:
+            _exporter = StreamExporter(open(target, "a", encoding="utf-8"), close=True)
+        _exporter_target = target
+    return _exporter
+
+
+def start_trace(name, trace_id=None, **attributes):
+    """
+    Open the root span of a request and make it current. Returns None (and
+    records nothing) when tracing is off or the request is not sampled.
+
+    A caller-supplied trace_id always records. Otherwise a request is
+    sampled with probability Config.TRACE_SAMPLE_RATE; when
+    Config.TRACE_SLOW_MS is set every request records spans so slower ones
+    can be exported after the fact.
+    """
+    _current.set(None)
+    if get_exporter() is None:
+        return None
+    if trace_id and not _TRACE_ID.match(trace_id):
+        trace_id = None
+    sampled = bool(trace_id) or random.random() < Config.TRACE_SAMPLE_RATE
+    if not sampled and not Config.TRACE_SLOW_MS:
+        return None
+    trace = Trace(trace_id or uuid.uuid4().hex, sampled)
+    root = trace.open(name, None, attributes)
+    _current.set(root)
+    return root
+
+
+def finish_trace(root, **attributes):
+    """Close the root span and export the trace if sampled or slow; True if exported."""
+    if root is None:
+        return False
+    root.end = time.perf_counter()
+    root.set(**attributes)
+    if _current.get() is root:
+        _current.set(None)
+    trace = root.trace
+    slow = Config.TRACE_SLOW_MS and root.duration_ms >= Config.TRACE_SLOW_MS
+    if not (trace.sampled or slow):
+        return False
+    exporter = get_exporter()
+    if exporter is None:
+        return False
+    try:
+        exporter.export(trace)
+    except Exception as e:
+        logger.warning(f"Trace export failed: {e}")
+        return False
+    return True
@@ -0,0 +1,117 @@
+"""Background warm-up at boot and the readiness state behind /api/ready."""
+
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def process_start_time():
+    """Wall-clock start of this process (falls back to now without psutil)."""
+    try:
+        import psutil
+
+        return psutil.Process(os.getpid()).create_time()
+    except Exception:
+        return time.time()
+
+
+def touch_pages(array, page_bytes=4096):
+    """
+    Read one value per page of array so a memory-mapped or freshly unpickled
+    matrix is resident before the first query scores it.
+    """
+    if array is None or array.size == 0:
+        return 0
+    flat = array.reshape(-1) if array.flags.c_contiguous else np.ravel(array)
+    stride = max(1, page_bytes // flat.itemsize)
+    touched = flat[::stride]
+    float(np.add.reduce(touched, dtype=np.float64))
+    return len(touched)
+
+
+class Warmup:
+    """
+    Runs named warm-up steps once per process in a background thread and
+    records per-step timings and the time from process start to ready.
+
+    A step is a (name, fn, required) tuple. A failing required step leaves
+    the process not ready (start() retries it); a failing optional step, e.g.
+    the probe encode when the embedding Space is down, is recorded and
+    skipped since requests can still fall back.
+    """
+
+    def __init__(self, steps):
+        self._steps = steps
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self.ready = False
+        self.error = None
+        self.stages = {}
+        self.started_at = None
+        self.ready_at = None
+
+    def start(self):
+        """Start warming (idempotent per process; restarts after a failure)."""
+        with self._lock:
+            forked = self._pid != os.getpid()
+            running = self._thread is not None and self._thread.is_alive()
+            if not forked and (self.ready or running):
+                return False
+            self._reset()
+            self._pid = os.getpid()
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.ready
+
+    def _run(self):
+        for name, fn, required in self._steps:
+            started = time.perf_counter()
+            try:
+                fn()
+                status = "ok"
+            except Exception as e:
+                status = f"failed: {type(e).__name__}: {e}"
+                if required:
+                    self._record(name, started, status)
+                    self.error = f"{name}: {e}"
+                    logger.error(f"Warm-up step {name} failed: {e}")
+                    return
+                logger.warning(f"Optional warm-up step {name} failed: {e}")
+            self._record(name, started, status)
+        self.ready_at = time.time()
+        self.ready = True
+        logger.info(
+            f"Ready in {self.ready_at - self.started_at:.2f}s of warm-up, "
+            f"{self.ready_at - process_start_time():.2f}s after process start"
+        )
+
+    def _record(self, name, started, status):
+        self.stages[name] = {
+            "status": status,
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+
+    def status(self):
+        status = {"ready": self.ready, "stages": dict(self.stages), "error": self.error}
+        if self.ready:
+            status["warmup_seconds"] = round(self.ready_at - self.started_at, 3)
+            status["time_to_ready_seconds"] = round(
+                self.ready_at - process_start_time(), 3
+            )
+        return status